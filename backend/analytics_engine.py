@@ -0,0 +1,558 @@
+# backend/analytics_engine.py
+
+import asyncio
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, SQLAlchemyError
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from analytics_service import ANALYTICS_REGISTRY
+from core.rollups import has_rollups, load_section_rows
+from core.redis_client import generate_cache_keys, cache_tags
+from core.cache_flight import get_or_compute_many
+
+TOP_N = 5
+
+# Threads shared by all requests for running metric jobs, how many of them one request
+# may use at a time, and the seconds a request may spend computing its metrics
+METRICS_POOL_SIZE = int(os.environ.get("METRICS_POOL_SIZE", 8))
+METRICS_MAX_CONCURRENCY = int(os.environ.get("METRICS_MAX_CONCURRENCY", 4))
+METRICS_DEADLINE = float(os.environ.get("METRICS_DEADLINE", 30))
+
+# Prefix of the cache entry each metric of an upload is stored in
+METRIC_CACHE_PREFIX = "analytics:metric"
+
+# Metrics computed across all of the user's uploads: cached once per user
+# (upload_id None in the key), so they follow the user's cache generation
+USER_SCOPED_METRICS = {"cohort_retention"}
+
+# SQLSTATE of query_canceled, raised when statement_timeout expires
+QUERY_CANCELED = "57014"
+
+_metrics_pool = ThreadPoolExecutor(max_workers=METRICS_POOL_SIZE, thread_name_prefix="metrics")
+
+class MetricsDeadlineExceeded(Exception):
+    """
+    Raised when a request's metrics aren't all computed before its deadline.
+    """
+
+# Values the registry handlers treat as "no city" / "no discount code"
+BLANK_VALUES = (None, "", "nan")
+
+# One row of the fused query. Every section reuses the same columns:
+#   key_ts / key_text / key_int  the group key (day or hour, city/code/product name, day of week)
+#   n                            orders in the group; unique customers for "customers";
+#                                total quantity for "product"
+#   amount, amount_rows          sum(total) over orders with a non-zero total (line revenue for
+#                                "product") and how many rows contributed; repeat customers
+#                                are reported in amount_rows for "customers"
+#   discount, discount_rows      sum(discount_amount) over orders with a positive discount
+SectionRow = namedtuple(
+    "SectionRow",
+    ["section", "key_ts", "key_text", "key_int", "n", "amount", "amount_rows", "discount", "discount_rows"],
+)
+
+# Order-level sections and the column of the materialized "o" CTE they group by
+ORDER_GROUPINGS = {
+    "day": "day",
+    "hour": "hour",
+    "dow": "dow",
+    "city": "shipping_city",
+    "discount_code": "discount_code",
+}
+
+# Which key column each grouped section reports its key in
+KEY_COLUMNS = {
+    "day": "key_ts",
+    "hour": "key_ts",
+    "city": "key_text",
+    "discount_code": "key_text",
+    "dow": "key_int",
+}
+
+ORDERS_CTE = """
+    o AS MATERIALIZED (
+        SELECT id, email, total, discount_amount, shipping_city, discount_code,
+               date_trunc('day', created_at) AS day,
+               date_trunc('hour', created_at) AS hour,
+               extract(dow FROM created_at)::int AS dow
+        FROM orders
+        WHERE user_id = :user_id AND upload_id = :upload_id
+    )"""
+
+CUSTOMERS_CTE = """
+    customers AS (
+        SELECT email, count(*) AS order_count
+        FROM o
+        WHERE email IS NOT NULL
+        GROUP BY email
+    )"""
+
+CUSTOMERS_SELECT = """
+    SELECT 'customers', NULL::timestamp, NULL::text, NULL::int,
+           count(email), NULL::numeric, count(*) FILTER (WHERE order_count >= 2),
+           NULL::numeric, NULL::bigint
+    FROM customers"""
+
+PRODUCTS_SELECT = """
+    SELECT 'product', NULL::timestamp, li.lineitem_name, NULL::int,
+           sum(li.lineitem_quantity),
+           sum(li.lineitem_quantity * li.lineitem_price) FILTER (WHERE li.lineitem_price > 0),
+           count(*) FILTER (WHERE li.lineitem_price > 0),
+           NULL::numeric, NULL::bigint
+    FROM line_items li
+    JOIN o ON li.order_id = o.id
+    WHERE li.upload_id = :upload_id
+    GROUP BY li.lineitem_name"""
+
+def _key_case(sections, key_column, sql_type):
+    """
+    CASE expression picking the grouped column of whichever grouping set produced the row.
+    """
+    branches = [
+        f"WHEN GROUPING({ORDER_GROUPINGS[s]}) = 0 THEN {ORDER_GROUPINGS[s]}"
+        for s in sections if KEY_COLUMNS[s] == key_column
+    ]
+    if not branches:
+        return f"NULL::{sql_type}"
+    return f"CASE {' '.join(branches)} END"
+
+def _orders_select(sections):
+    """
+    One pass over the upload's orders computing every order-level section with GROUPING SETS.
+    The grand total set () is always included and backs "total".
+    """
+    grouped = [s for s in ORDER_GROUPINGS if s in sections]
+    section_case = (
+        "CASE " + " ".join(f"WHEN GROUPING({ORDER_GROUPINGS[s]}) = 0 THEN '{s}'" for s in grouped) + " ELSE 'total' END"
+        if grouped else "'total'"
+    )
+    grouping_sets = ", ".join(["()"] + [f"({ORDER_GROUPINGS[s]})" for s in grouped])
+    return f"""
+    SELECT {section_case},
+           {_key_case(grouped, "key_ts", "timestamp")},
+           {_key_case(grouped, "key_text", "text")},
+           {_key_case(grouped, "key_int", "int")},
+           count(id),
+           sum(total) FILTER (WHERE total <> 0),
+           count(*) FILTER (WHERE total <> 0),
+           sum(discount_amount) FILTER (WHERE discount_amount > 0),
+           count(*) FILTER (WHERE discount_amount > 0)
+    FROM o
+    GROUP BY GROUPING SETS ({grouping_sets})"""
+
+def build_fused_query(sections) -> str:
+    """
+    Compiles the sections needed by a set of metrics into a single SQL statement.
+    orders is read once into a materialized CTE; line_items (if needed) is read once
+    and joined against it.
+
+    Args:
+        sections: Section names, see METRIC_SECTIONS
+
+    Returns:
+        str: SQL with :user_id and :upload_id parameters, producing SectionRow rows
+    """
+    ctes = [ORDERS_CTE]
+    selects = []
+    if sections & ({"total"} | set(ORDER_GROUPINGS)):
+        selects.append(_orders_select(sections))
+    if "customers" in sections:
+        ctes.append(CUSTOMERS_CTE)
+        selects.append(CUSTOMERS_SELECT)
+    if "product" in sections:
+        selects.append(PRODUCTS_SELECT)
+    return "WITH" + ",".join(ctes) + "\n" + "\n    UNION ALL".join(selects)
+
+def _top(rows, value, limit=TOP_N):
+    """
+    Highest `value` first, like ORDER BY ... DESC LIMIT n in Postgres (NULLs sort first).
+    """
+    return sorted(rows, key=lambda r: (value(r) is not None, -(value(r) or 0)))[:limit]
+
+def _chronological(rows, key):
+    """
+    Ascending by key with NULLs last, like ORDER BY ... ASC in Postgres.
+    """
+    return sorted(rows, key=lambda r: (getattr(r, key) is None, getattr(r, key) or 0))
+
+def _orders_summary(sections):
+    row = sections["total"][0]
+    total_orders = row.n or 0
+    total_revenue = float(row.amount or 0)
+    return {
+        "total_orders": total_orders,
+        "total_revenue": total_revenue,
+        "average_order_value": total_revenue / total_orders if total_orders > 0 else 0.0,
+    }
+
+def _time_series(sections):
+    return [
+        {"date": row.key_ts.strftime("%Y-%m-%d") if row.key_ts else None, "orderCount": row.n}
+        for row in _chronological(sections["day"], "key_ts")
+    ]
+
+def _orders_by_hour(sections):
+    return [
+        {"hour_block": row.key_ts.strftime("%Y-%m-%d %H:00") if row.key_ts else None, "count_orders": row.n}
+        for row in _chronological(sections["hour"], "key_ts")
+    ]
+
+def _orders_by_day_of_week(sections):
+    return [
+        {"dow": int(row.key_int), "count_orders": row.n}
+        for row in _chronological(sections["dow"], "key_int")
+        if row.key_int is not None
+    ]
+
+def _top_cities_by_orders(sections):
+    rows = [r for r in sections["city"] if r.key_text not in BLANK_VALUES]
+    return [
+        {"city": row.key_text or "Unknown", "order_count": row.n}
+        for row in _top(rows, lambda r: r.n)
+    ]
+
+def _top_cities_by_revenue(sections):
+    rows = [r for r in sections["city"] if r.key_text not in BLANK_VALUES and r.amount_rows]
+    return [
+        {"city": row.key_text or "Unknown", "revenue": float(row.amount or 0)}
+        for row in _top(rows, lambda r: r.amount)
+    ]
+
+def _top_products_by_quantity(sections):
+    return [
+        {"product_name": row.key_text or "Unnamed Product", "total_quantity": int(row.n or 0)}
+        for row in _top(sections["product"], lambda r: r.n)
+    ]
+
+def _top_products_by_revenue(sections):
+    rows = [r for r in sections["product"] if r.amount_rows]
+    return [
+        {"product_name": row.key_text or "Unnamed Product", "product_revenue": float(row.amount or 0)}
+        for row in _top(rows, lambda r: r.amount)
+    ]
+
+def _repeat_customers(sections):
+    row = sections["customers"][0]
+    unique_count, repeat_count = row.n or 0, row.amount_rows or 0
+    return {
+        "unique_count": unique_count,
+        "repeat_count": repeat_count,
+        "repeat_rate_percent": float(repeat_count) / float(unique_count) * 100.0 if unique_count > 0 else 0.0,
+    }
+
+def _top_discount_codes(sections):
+    rows = [r for r in sections["discount_code"] if r.key_text not in BLANK_VALUES]
+    return [
+        {"discount_code": row.key_text, "code_usage": row.n}
+        for row in _top(rows, lambda r: r.n)
+    ]
+
+def _top_discount_codes_by_savings(sections):
+    rows = [r for r in sections["discount_code"] if r.key_text not in BLANK_VALUES and r.discount_rows]
+    return [
+        {"discount_code": row.key_text, "total_discount": float(row.discount or 0)}
+        for row in _top(rows, lambda r: r.discount)
+    ]
+
+# Registry key -> (section of the fused query it reads, builder producing the handler's JSON shape)
+METRIC_SECTIONS = {
+    "orders_summary": ("total", _orders_summary),
+    "time_series": ("day", _time_series),
+    "top_cities_by_orders": ("city", _top_cities_by_orders),
+    "top_cities_by_revenue": ("city", _top_cities_by_revenue),
+    "top_products_by_quantity": ("product", _top_products_by_quantity),
+    "top_products_by_revenue": ("product", _top_products_by_revenue),
+    "repeat_customers": ("customers", _repeat_customers),
+    "orders_by_hour": ("hour", _orders_by_hour),
+    "orders_by_day_of_week": ("dow", _orders_by_day_of_week),
+    "top_discount_codes": ("discount_code", _top_discount_codes),
+    "top_discount_codes_by_savings": ("discount_code", _top_discount_codes_by_savings),
+}
+
+def assemble_metrics(rows, metric_keys) -> dict:
+    """
+    Splits fused query rows by section and builds each metric's result from them.
+    """
+    sections = {METRIC_SECTIONS[key][0]: [] for key in metric_keys}
+    for row in rows:
+        row = SectionRow(*row)
+        sections.setdefault(row.section, []).append(row)
+    return {key: METRIC_SECTIONS[key][1](sections) for key in metric_keys}
+
+def fused_metrics(db: Session, user_id: int, upload_id: int, metric_keys) -> dict:
+    """
+    Computes the given fused metrics from the upload's rollups when they exist, or else
+    with a single fused statement on Postgres. Returns {} when neither is available
+    (SQLite, or the fused statement failed), leaving the metrics to their handlers.
+    """
+    if has_rollups(db, user_id, upload_id):
+        # Completed uploads have every section precomputed in the rollup tables
+        return assemble_metrics(load_section_rows(db, user_id, upload_id), metric_keys)
+    if db.get_bind().dialect.name != "postgresql":
+        return {}
+    sections = {METRIC_SECTIONS[key][0] for key in metric_keys}
+    try:
+        rows = db.execute(
+            text(build_fused_query(sections)),
+            {"user_id": user_id, "upload_id": upload_id},
+        ).all()
+    except SQLAlchemyError as e:
+        print(f"Fused analytics query failed, falling back to handlers: {e}")
+        db.rollback()
+        return {}
+    return assemble_metrics(rows, metric_keys)
+
+def handler_job(key: str, user_id: int, upload_id: int):
+    """
+    Job computing a single metric with its registry handler.
+    """
+    return lambda db: {key: ANALYTICS_REGISTRY[key]["handler"](db, user_id, upload_id)}
+
+def handler_jobs(user_id: int, upload_id: int, metric_keys) -> list:
+    """
+    Jobs computing metrics with their registry handlers: one per group of metrics
+    sharing an intermediate (their registry "requires"), so that the group runs on
+    one session and the intermediate is computed once for all of it. Metrics with
+    nothing in common stay separate jobs and can run in parallel.
+    """
+    groups = []  # [(intermediates, keys)]
+    for key in metric_keys:
+        requires = set(ANALYTICS_REGISTRY[key].get("requires", ()))
+        keys = [key]
+        for group in [group for group in groups if group[0] & requires]:
+            groups.remove(group)
+            requires |= group[0]
+            keys = group[1] + keys
+        groups.append((requires, keys))
+    return [
+        handler_job(keys[0], user_id, upload_id) if len(keys) == 1
+        else (lambda db, keys=keys: run_handlers(db, user_id, upload_id, keys))
+        for _, keys in groups
+    ]
+
+def run_handlers(db: Session, user_id: int, upload_id: int, metric_keys) -> dict:
+    """
+    Computes metrics one by one with their registry handlers.
+    """
+    results = {}
+    for key in metric_keys:
+        results.update(handler_job(key, user_id, upload_id)(db))
+    return results
+
+def run_metrics(db: Session, user_id: int, upload_id: int, metric_keys,
+                max_concurrency: int = None, deadline: float = None) -> dict:
+    """
+    Computes registry metrics for an upload.
+
+    Metrics the engine supports are computed together by fused_metrics (rollups, or
+    a single fused statement). Every other metric, and fused ones that couldn't be
+    computed that way, go through their handlers. Independent jobs run in parallel
+    on the metrics thread pool (see run_concurrently).
+
+    Args:
+        db: SQLAlchemy database session
+        user_id: Owner of the upload
+        upload_id: The upload to aggregate
+        metric_keys: Registry keys; all must exist in ANALYTICS_REGISTRY
+        max_concurrency: Jobs of this request running at once (METRICS_MAX_CONCURRENCY)
+        deadline: Seconds allowed for the whole computation (METRICS_DEADLINE)
+
+    Returns:
+        dict mapping each key to the same JSON its handler returns
+
+    Raises:
+        MetricsDeadlineExceeded: if the metrics aren't all computed within the deadline
+    """
+    metric_keys = list(dict.fromkeys(metric_keys))
+    deadline_at = time.monotonic() + (deadline or METRICS_DEADLINE)
+    max_concurrency = max_concurrency or METRICS_MAX_CONCURRENCY
+
+    results = run_concurrently(db, plan_jobs(user_id, upload_id, metric_keys), max_concurrency, deadline_at)
+
+    # Fused metrics the fast path couldn't serve fall back to their handlers
+    pending = [key for key in metric_keys if key not in results]
+    if pending:
+        results.update(run_concurrently(db, handler_jobs(user_id, upload_id, pending), max_concurrency, deadline_at))
+    return {key: results[key] for key in metric_keys}
+
+async def run_metrics_async(adb: AsyncSession, user_id: int, upload_id: int, metric_keys,
+                            max_concurrency: int = None, deadline: float = None) -> dict:
+    """
+    Async variant of run_metrics for AsyncSession callers. Jobs run concurrently on
+    their own AsyncSessions instead of the metrics thread pool, so waiting on the
+    database doesn't hold any thread.
+
+    Raises:
+        MetricsDeadlineExceeded: if the metrics aren't all computed within the deadline
+    """
+    metric_keys = list(dict.fromkeys(metric_keys))
+    deadline_at = time.monotonic() + (deadline or METRICS_DEADLINE)
+    max_concurrency = max_concurrency or METRICS_MAX_CONCURRENCY
+
+    results = await run_concurrently_async(adb, plan_jobs(user_id, upload_id, metric_keys), max_concurrency, deadline_at)
+
+    pending = [key for key in metric_keys if key not in results]
+    if pending:
+        jobs = handler_jobs(user_id, upload_id, pending)
+        results.update(await run_concurrently_async(adb, jobs, max_concurrency, deadline_at))
+    return {key: results[key] for key in metric_keys}
+
+def _metric_cache_keys(user_id: int, upload_id: int, names) -> dict:
+    """
+    name -> cache key of each metric; USER_SCOPED_METRICS are keyed on the user alone.
+    """
+    keys = generate_cache_keys(
+        METRIC_CACHE_PREFIX, user_id, upload_id, [name for name in names if name not in USER_SCOPED_METRICS]
+    )
+    user_scoped = [name for name in names if name in USER_SCOPED_METRICS]
+    if user_scoped:
+        keys.update(generate_cache_keys(METRIC_CACHE_PREFIX, user_id, None, user_scoped))
+    return keys
+
+async def cached_metrics(user_id: int, upload_id: int, metric_keys, compute, refresh: bool = False,
+                         revalidate: bool = False) -> dict:
+    """
+    Registry metrics of an upload from their per-metric cache entries, read in one
+    MGET; only the metrics missing from the cache are computed. Any combination of
+    metrics (custom selections, the full set) shares the same entries, and the
+    USER_SCOPED_METRICS entries are shared by all of the user's uploads.
+
+    Args:
+        user_id: Owner of the upload
+        upload_id: The upload to aggregate
+        metric_keys: Registry keys
+        compute: Coroutine function computing a list of metric keys, e.g. a
+            run_metrics_async call
+        refresh: Recompute every metric (refresh_cache=true)
+        revalidate: Serve metrics past their soft expiry and recompute them in
+            the background (see get_or_compute)
+
+    Returns:
+        dict mapping each key to the same JSON its handler returns
+    """
+    keys = await asyncio.to_thread(_metric_cache_keys, user_id, upload_id, list(dict.fromkeys(metric_keys)))
+    return await get_or_compute_many(
+        keys, compute, tags=cache_tags(user_id, upload_id), refresh=refresh,
+        revalidate=(METRIC_CACHE_PREFIX, user_id, upload_id) if revalidate else None
+    )
+
+def plan_jobs(user_id: int, upload_id: int, metric_keys) -> list:
+    """
+    One job computing every fused metric together, plus the handler jobs of the others.
+    """
+    fused_keys = [key for key in metric_keys if key in METRIC_SECTIONS]
+    jobs = handler_jobs(user_id, upload_id, [key for key in metric_keys if key not in METRIC_SECTIONS])
+    if fused_keys:
+        jobs.insert(0, lambda session: fused_metrics(session, user_id, upload_id, fused_keys))
+    return jobs
+
+def _with_statement_timeout(job, deadline_at: float):
+    """
+    Wraps a job so that, on Postgres, none of its queries outlives the request's
+    deadline. SET LOCAL ends with the session's transaction; the timeout is also
+    put back once the job is done, as serial jobs run on the caller's session.
+
+    Raises:
+        MetricsDeadlineExceeded: if a query is cancelled by the timeout
+    """
+    def run(session):
+        if session.get_bind().dialect.name != "postgresql":
+            return job(session)
+        remaining_ms = max(int((deadline_at - time.monotonic()) * 1000), 1)
+        session.execute(text(f"SET LOCAL statement_timeout = {remaining_ms}"))
+        try:
+            result = job(session)
+        except DBAPIError as e:
+            if getattr(e.orig, "pgcode", None) == QUERY_CANCELED:
+                raise MetricsDeadlineExceeded() from e
+            raise
+        session.execute(text("SET LOCAL statement_timeout TO DEFAULT"))
+        return result
+    return run
+
+def _run_job(bind, job, deadline_at: float) -> dict:
+    """
+    Runs one job in its own session, so it gets its own pooled connection.
+    """
+    session = Session(bind=bind, autoflush=False)
+    try:
+        return _with_statement_timeout(job, deadline_at)(session)
+    finally:
+        session.close()
+
+def run_concurrently(db: Session, jobs, max_concurrency: int, deadline_at: float) -> dict:
+    """
+    Runs jobs (callables taking a session and returning a dict of results) and merges
+    their results. At most max_concurrency jobs of this call run at once on the shared
+    metrics pool, each with its own session. On SQLite, or with a single job, they run
+    in order on the caller's session instead (on Postgres still under the deadline's
+    statement_timeout).
+
+    Raises:
+        MetricsDeadlineExceeded: if deadline_at (time.monotonic()) passes first
+    """
+    results = {}
+    if len(jobs) <= 1 or max_concurrency <= 1 or db.get_bind().dialect.name == "sqlite":
+        for job in jobs:
+            if time.monotonic() > deadline_at:
+                raise MetricsDeadlineExceeded()
+            results.update(_with_statement_timeout(job, deadline_at)(db))
+        return results
+
+    bind = db.get_bind()
+    queued = list(jobs)
+    running = set()
+    try:
+        while queued or running:
+            # Keep up to max_concurrency of this request's jobs in flight
+            while queued and len(running) < max_concurrency:
+                running.add(_metrics_pool.submit(_run_job, bind, queued.pop(0), deadline_at))
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                raise MetricsDeadlineExceeded()
+            done, running = wait(running, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                results.update(future.result())
+    finally:
+        # Jobs that haven't started are dropped; running ones end at their statement_timeout
+        for future in running:
+            future.cancel()
+    return results
+
+async def run_concurrently_async(adb: AsyncSession, jobs, max_concurrency: int, deadline_at: float) -> dict:
+    """
+    Async variant of run_concurrently: each job runs on its own AsyncSession
+    (through run_sync, so the sync handlers are reused as is), at most
+    max_concurrency at once.
+
+    Raises:
+        MetricsDeadlineExceeded: if deadline_at (time.monotonic()) passes first
+    """
+    results = {}
+    try:
+        if len(jobs) <= 1 or max_concurrency <= 1 or adb.bind.dialect.name == "sqlite":
+            for job in jobs:
+                results.update(await asyncio.wait_for(
+                    adb.run_sync(_with_statement_timeout(job, deadline_at)), deadline_at - time.monotonic()
+                ))
+            return results
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run(job):
+            async with semaphore:
+                async with AsyncSession(bind=adb.bind, autoflush=False) as session:
+                    return await session.run_sync(_with_statement_timeout(job, deadline_at))
+
+        parts = await asyncio.wait_for(
+            asyncio.gather(*(run(job) for job in jobs)), deadline_at - time.monotonic()
+        )
+    except asyncio.TimeoutError:
+        raise MetricsDeadlineExceeded()
+    for part in parts:
+        results.update(part)
+    return results
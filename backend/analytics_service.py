@@ -1,24 +1,124 @@
 # backend/analytics_service.py
+import numpy as np
 import sqlalchemy as sa
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import func
 from db import models
+from db.async_database import run_blocking
+from core.rollups import has_rollups, rollup_query
+from core.sketch_store import quantile_summary
+from core.cohorts import cohort_retention
+from core.basket import frequently_bought_together
+
+# Rollup rows are read with the same labels as the raw queries, so results are formatted once
+Rollup = models.UploadRollup
+
+# RFM segments by recency (r) and frequency (f) quintile score; the first match wins
+RFM_SEGMENTS = [
+    ("champions", lambda r, f: (r >= 4) & (f >= 4)),
+    ("loyal_customers", lambda r, f: (r >= 3) & (f >= 3)),
+    ("potential_loyalists", lambda r, f: (r >= 4) & (f >= 2)),
+    ("new_customers", lambda r, f: r >= 4),
+    ("promising", lambda r, f: r == 3),
+    ("cant_lose_them", lambda r, f: (r == 1) & (f >= 4)),
+    ("at_risk", lambda r, f: (r <= 2) & (f >= 3)),
+    ("hibernating", lambda r, f: r == 2),
+    ("lost", lambda r, f: r == 1),
+]
+
+def _valid_text(column):
+    """
+    Filters out empty, null, or 'nan' values of a text column.
+    """
+    return [column.isnot(None), column != "", column != "nan"]
+
+def get_daily_series(db: Session, user_id: int, upload_id: int):
+    """
+    Intermediate: (day, order_count, revenue) per order day, chronologically.
+    Orders without created_at form a final row with day None.
+    """
+    if has_rollups(db, user_id, upload_id):
+        return (
+            rollup_query(
+                db, user_id, upload_id, "day",
+                Rollup.key_ts, Rollup.order_count, func.coalesce(Rollup.revenue, 0)
+            )
+            .order_by(Rollup.key_ts)
+            .all()
+        )
+
+    day = func.date_trunc('day', models.Order.created_at)
+    return (
+        db.query(day, func.count(models.Order.id), func.coalesce(func.sum(models.Order.total), 0))
+        .filter(models.Order.user_id == user_id, models.Order.upload_id == upload_id)
+        .group_by(day)
+        .order_by(day)
+        .all()
+    )
+
+def get_customer_order_counts(db: Session, user_id: int, upload_id: int):
+    """
+    Intermediate: how many customers (distinct emails) placed each number of orders,
+    as {order_count: customers}.
+    """
+    if has_rollups(db, user_id, upload_id):
+        c = models.CustomerRollup
+        per_customer = (
+            db.query(c.order_count.label("order_count"))
+            .filter(c.user_id == user_id, c.upload_id == upload_id, c.email.isnot(None))
+            .subquery()
+        )
+    else:
+        per_customer = (
+            db.query(func.count(models.Order.id).label("order_count"))
+            .filter(
+                models.Order.user_id == user_id,
+                models.Order.upload_id == upload_id,
+                models.Order.email.isnot(None)
+            )
+            .group_by(models.Order.email)
+            .subquery()
+        )
+    rows = (
+        db.query(per_customer.c.order_count, func.count())
+        .group_by(per_customer.c.order_count)
+        .all()
+    )
+    return {order_count: customers for order_count, customers in rows}
+
+# Results shared by several metrics; a registry entry lists the ones it uses under "requires"
+INTERMEDIATES = {
+    "daily_series": get_daily_series,
+    "customer_order_counts": get_customer_order_counts,
+}
+
+def get_intermediate(db: Session, name: str, user_id: int, upload_id: int):
+    """
+    Returns an intermediate, computing it at most once per session: every metric of
+    a request computed on the same session gets the same result.
+    """
+    cache = db.info.setdefault("analytics_intermediates", {})
+    if (name, user_id, upload_id) not in cache:
+        cache[(name, user_id, upload_id)] = INTERMEDIATES[name](db, user_id, upload_id)
+    return cache[(name, user_id, upload_id)]
 
 def get_orders_summary(db: Session, user_id: int, upload_id: int):
     """
     Returns a dictionary with total_orders, total_revenue, and average_order_value
     for the specified user & upload.
     """
-    total_orders = db.query(func.count(models.Order.id)).filter(
-        models.Order.user_id == user_id,
-        models.Order.upload_id == upload_id
-    ).scalar() or 0
+    if has_rollups(db, user_id, upload_id):
+        total_orders, total_revenue = rollup_query(
+            db, user_id, upload_id, "total",
+            Rollup.order_count, func.coalesce(Rollup.revenue, 0)
+        ).one()
+        return _summary(total_orders or 0, total_revenue)
 
-    total_revenue = db.query(func.coalesce(func.sum(models.Order.total), 0)).filter(
-        models.Order.user_id == user_id,
-        models.Order.upload_id == upload_id
-    ).scalar()
+    daily = get_intermediate(db, "daily_series", user_id, upload_id)
+    return _summary(sum(row[1] for row in daily), sum(row[2] for row in daily))
 
+def _summary(total_orders, total_revenue):
     # Avoid dividing by zero
     if total_orders > 0:
         avg_order_value = float(total_revenue) / float(total_orders)
@@ -35,18 +135,9 @@ def get_orders_time_series(db: Session, user_id: int, upload_id: int):
     """
     Groups orders by day and returns the number of orders per day.
     """
-    results = db.query(
-        func.date_trunc('day', models.Order.created_at).label('day'),
-        func.count(models.Order.id)
-    ).filter(
-        models.Order.user_id == user_id,
-        models.Order.upload_id == upload_id
-    ).group_by(
-        func.date_trunc('day', models.Order.created_at)
-    ).order_by(
-        func.date_trunc('day', models.Order.created_at)
-    ).all()
+    return _format_time_series(get_intermediate(db, "daily_series", user_id, upload_id))
 
+def _format_time_series(results):
     time_series = []
     for row in results:
         day_str = row[0].strftime("%Y-%m-%d") if row[0] else None
@@ -68,6 +159,19 @@ def get_top_cities_by_orders(db: Session, user_id: int, upload_id: int, limit: i
     Return the top N cities by count of orders, using the shipping_city field.
     Filter out empty, null, or 'nan' values.
     """
+    if has_rollups(db, user_id, upload_id):
+        results = (
+            rollup_query(
+                db, user_id, upload_id, "city",
+                Rollup.key_text.label("city"), Rollup.order_count.label("order_count")
+            )
+            .filter(*_valid_text(Rollup.key_text))
+            .order_by(Rollup.order_count.desc())
+            .limit(limit)
+            .all()
+        )
+        return _format_cities_by_orders(results)
+
     results = (
         db.query(
             models.Order.shipping_city.label("city"),
@@ -87,6 +191,9 @@ def get_top_cities_by_orders(db: Session, user_id: int, upload_id: int, limit: i
         .all()
     )
 
+    return _format_cities_by_orders(results)
+
+def _format_cities_by_orders(results):
     # Convert query rows to a list of dictionaries for easy JSON serialization
     return [
         {
@@ -101,6 +208,19 @@ def get_top_cities_by_revenue(db: Session, user_id: int, upload_id: int, limit:
     Return the top N cities by sum of Order.total (revenue).
     Filter out empty, null, or 'nan' values.
     """
+    if has_rollups(db, user_id, upload_id):
+        results = (
+            rollup_query(
+                db, user_id, upload_id, "city",
+                Rollup.key_text.label("city"), Rollup.revenue.label("revenue")
+            )
+            .filter(*_valid_text(Rollup.key_text), Rollup.revenue_rows > 0)
+            .order_by(Rollup.revenue.desc())
+            .limit(limit)
+            .all()
+        )
+        return _format_cities_by_revenue(results)
+
     results = (
         db.query(
             models.Order.shipping_city.label("city"),
@@ -123,6 +243,9 @@ def get_top_cities_by_revenue(db: Session, user_id: int, upload_id: int, limit:
         .all()
     )
 
+    return _format_cities_by_revenue(results)
+
+def _format_cities_by_revenue(results):
     return [
         {
             "city": row.city or "Unknown",
@@ -135,12 +258,28 @@ def get_top_products_by_quantity(db: Session, user_id: int, upload_id: int, limi
     """
     Return the top N products by total quantity sold.
     """
+    if has_rollups(db, user_id, upload_id):
+        results = (
+            rollup_query(
+                db, user_id, upload_id, "product",
+                Rollup.key_text.label("product_name"), Rollup.order_count.label("total_quantity")
+            )
+            .order_by(Rollup.order_count.desc())
+            .limit(limit)
+            .all()
+        )
+        return _format_products_by_quantity(results)
+
     results = (
         db.query(
             models.LineItem.lineitem_name.label("product_name"),
             func.sum(models.LineItem.lineitem_quantity).label("total_quantity")
         )
-        .join(models.Order, models.LineItem.order_id == models.Order.id)
+        # Joining on upload_id as well lets Postgres prune line_items to the upload's partition
+        .join(models.Order, sa.and_(
+            models.LineItem.order_id == models.Order.id,
+            models.LineItem.upload_id == models.Order.upload_id
+        ))
         .filter(
             models.Order.user_id == user_id,
             models.Order.upload_id == upload_id
@@ -151,6 +290,9 @@ def get_top_products_by_quantity(db: Session, user_id: int, upload_id: int, limi
         .all()
     )
 
+    return _format_products_by_quantity(results)
+
+def _format_products_by_quantity(results):
     return [
         {
             "product_name": row.product_name or "Unnamed Product",
@@ -164,6 +306,19 @@ def get_top_products_by_revenue(db: Session, user_id: int, upload_id: int, limit
     Return the top N products by total revenue (sum of lineitem_price * lineitem_quantity).
     Make sure lineitem_price is also stored as numeric for accurate aggregation.
     """
+    if has_rollups(db, user_id, upload_id):
+        results = (
+            rollup_query(
+                db, user_id, upload_id, "product",
+                Rollup.key_text.label("product_name"), Rollup.revenue.label("product_revenue")
+            )
+            .filter(Rollup.revenue_rows > 0)
+            .order_by(Rollup.revenue.desc())
+            .limit(limit)
+            .all()
+        )
+        return _format_products_by_revenue(results)
+
     # Use a simpler approach that avoids casting empty strings to numeric
     results = (
         db.query(
@@ -172,7 +327,11 @@ def get_top_products_by_revenue(db: Session, user_id: int, upload_id: int, limit
                 models.LineItem.lineitem_quantity * models.LineItem.lineitem_price
             ).label("product_revenue")
         )
-        .join(models.Order, models.LineItem.order_id == models.Order.id)
+        # Joining on upload_id as well lets Postgres prune line_items to the upload's partition
+        .join(models.Order, sa.and_(
+            models.LineItem.order_id == models.Order.id,
+            models.LineItem.upload_id == models.Order.upload_id
+        ))
         .filter(
             models.Order.user_id == user_id,
             models.Order.upload_id == upload_id,
@@ -191,7 +350,9 @@ def get_top_products_by_revenue(db: Session, user_id: int, upload_id: int, limit
         .all()
     )
 
+    return _format_products_by_revenue(results)
 
+def _format_products_by_revenue(results):
     return [
         {
             "product_name": row.product_name or "Unnamed Product",
@@ -204,45 +365,30 @@ def get_unique_customer_count(db: Session, user_id: int, upload_id: int):
     """
     Count distinct email addresses for this user & upload.
     """
-    return (
-        db.query(func.count(func.distinct(models.Order.email)))
-        .filter(
-            models.Order.user_id == user_id,
-            models.Order.upload_id == upload_id
-        )
-        .scalar()
-    )
+    return sum(get_intermediate(db, "customer_order_counts", user_id, upload_id).values())
 
 def get_repeat_customer_count(db: Session, user_id: int, upload_id: int):
     """
     Count how many customers (by email) have 2+ orders.
     """
-    # 1) Subquery to group orders by email
-    subq = (
-        db.query(
-            models.Order.email.label("customer_email"),
-            func.count(models.Order.id).label("order_count")
-        )
-        .filter(
-            models.Order.user_id == user_id,
-            models.Order.upload_id == upload_id
-        )
-        .group_by(models.Order.email)
-        .subquery()
-    )
-
-    # 2) Count how many have >= 2 orders
-    return (
-        db.query(func.count("*"))
-        .select_from(subq)
-        .filter(subq.c.order_count >= 2)
-        .scalar()
-    )
+    order_counts = get_intermediate(db, "customer_order_counts", user_id, upload_id)
+    return sum(customers for order_count, customers in order_counts.items() if order_count >= 2)
 
 def get_orders_by_hour(db: Session, user_id: int, upload_id: int):
     """
     Groups orders by hour, returning a list of { "hour_block": "YYYY-MM-DD HH:00", "count_orders": N }
     """
+    if has_rollups(db, user_id, upload_id):
+        results = (
+            rollup_query(
+                db, user_id, upload_id, "hour",
+                Rollup.key_ts.label("hour_block"), Rollup.order_count.label("count_orders")
+            )
+            .order_by(Rollup.key_ts)
+            .all()
+        )
+        return _format_orders_by_hour(results)
+
     results = (
         db.query(
             func.date_trunc('hour', models.Order.created_at).label('hour_block'),
@@ -254,6 +400,9 @@ def get_orders_by_hour(db: Session, user_id: int, upload_id: int):
         .all()
     )
 
+    return _format_orders_by_hour(results)
+
+def _format_orders_by_hour(results):
     return [
         {
             "hour_block": row.hour_block.strftime("%Y-%m-%d %H:00") if row.hour_block else None,
@@ -265,32 +414,34 @@ def get_orders_by_hour(db: Session, user_id: int, upload_id: int):
 def get_orders_by_day_of_week(db: Session, user_id: int, upload_id: int):
     """
     Summarizes number of orders by day of week (0=Sunday, 1=Monday, ...6=Saturday).
+    Derived from the daily series, so it shares that scan with the day-level metrics.
     """
-    results = (
-        db.query(
-            func.extract('DOW', models.Order.created_at).label('dow'),
-            func.count(models.Order.id).label('count_orders')
-        )
-        .filter(models.Order.user_id == user_id, models.Order.upload_id == upload_id)
-        .group_by(func.extract('DOW', models.Order.created_at))
-        .order_by(func.extract('DOW', models.Order.created_at))
-        .all()
-    )
-
-    # Convert to e.g. { "dow": 1, "count_orders": 15 } meaning Monday had 15 orders
-    return [
-        {
-            "dow": int(row.dow),
-            "count_orders": row.count_orders
-        }
-        for row in results
-    ]
+    counts = {}
+    for day, order_count, _ in get_intermediate(db, "daily_series", user_id, upload_id):
+        if day is not None:
+            # weekday() counts from Monday=0; Postgres DOW from Sunday=0
+            dow = (day.weekday() + 1) % 7
+            counts[dow] = counts.get(dow, 0) + order_count
+    return [{"dow": dow, "count_orders": counts[dow]} for dow in sorted(counts)]
 
 def get_top_discount_codes(db: Session, user_id: int, upload_id: int, limit: int = 5):
     """
     Return the top discount codes by how many orders used them.
     Filter out empty, null, or 'nan' values.
     """
+    if has_rollups(db, user_id, upload_id):
+        results = (
+            rollup_query(
+                db, user_id, upload_id, "discount_code",
+                Rollup.key_text.label("discount_code"), Rollup.order_count.label("code_usage")
+            )
+            .filter(*_valid_text(Rollup.key_text))
+            .order_by(Rollup.order_count.desc())
+            .limit(limit)
+            .all()
+        )
+        return _format_discount_codes(results)
+
     results = (
         db.query(
             models.Order.discount_code.label("discount_code"),
@@ -310,6 +461,9 @@ def get_top_discount_codes(db: Session, user_id: int, upload_id: int, limit: int
         .all()
     )
 
+    return _format_discount_codes(results)
+
+def _format_discount_codes(results):
     return [
         {
             "discount_code": row.discount_code,
@@ -323,6 +477,19 @@ def get_top_discount_codes_by_savings(db: Session, user_id: int, upload_id: int,
     Return top discount codes by total discount_amount across orders.
     Filter out empty, null, or 'nan' values.
     """
+    if has_rollups(db, user_id, upload_id):
+        results = (
+            rollup_query(
+                db, user_id, upload_id, "discount_code",
+                Rollup.key_text.label("discount_code"), Rollup.discount_amount.label("total_discount")
+            )
+            .filter(*_valid_text(Rollup.key_text), Rollup.discount_rows > 0)
+            .order_by(Rollup.discount_amount.desc())
+            .limit(limit)
+            .all()
+        )
+        return _format_discount_codes_by_savings(results)
+
     results = (
         db.query(
             models.Order.discount_code.label("discount_code"),
@@ -345,6 +512,9 @@ def get_top_discount_codes_by_savings(db: Session, user_id: int, upload_id: int,
         .all()
     )
 
+    return _format_discount_codes_by_savings(results)
+
+def _format_discount_codes_by_savings(results):
     return [
         {
             "discount_code": row.discount_code,
@@ -372,18 +542,141 @@ def get_repeat_customer_metrics(db: Session, user_id: int, upload_id: int):
         "repeat_rate_percent": repeat_rate
     }
 
+def _quintile_scores(values):
+    """
+    Scores 1-5 by quintile of rank, higher values scoring higher; equal values share
+    the score of the lowest rank among them. Only the four quintile boundaries are
+    selected (np.partition, linear time), so nothing is fully sorted.
+    """
+    n = len(values)
+    # A value scores above k when at least ceil(k*n/5) values are below it
+    kth = -(-np.arange(1, 5) * n // 5) - 1
+    boundaries = np.partition(values, kth)[kth]
+    return 1 + np.searchsorted(boundaries, values, side="left")
+
+def get_rfm_segments(db: Session, user_id: int, upload_id: int):
+    """
+    RFM segmentation: each customer (email) gets recency, frequency and monetary
+    quintile scores, recency measured back from the upload's latest order, and a
+    segment from RFM_SEGMENTS. Customers are aggregated by one grouped query
+    (customer_rollups when built); scoring and labeling are array operations.
+
+    Returns:
+        dict: reference_date, customers, and per segment its customers, share,
+        revenue and average recency (days), orders, spend and monetary score
+    """
+    if has_rollups(db, user_id, upload_id):
+        c = models.CustomerRollup
+        rows = (
+            db.query(c.last_order_at, c.order_count, func.coalesce(c.revenue, 0))
+            .filter(
+                c.user_id == user_id,
+                c.upload_id == upload_id,
+                c.email.isnot(None),
+                c.last_order_at.isnot(None)
+            )
+            .all()
+        )
+    else:
+        o = models.Order
+        rows = (
+            db.query(func.max(o.created_at), func.count(o.id), func.coalesce(func.sum(o.total), 0))
+            .filter(o.user_id == user_id, o.upload_id == upload_id, o.email.isnot(None))
+            .group_by(o.email)
+            # Customers whose orders all lack a date have no recency
+            .having(func.max(o.created_at).isnot(None))
+            .all()
+        )
 
-# A central registry that maps "keys" to aggregator functions and descriptive info
+    # Scoring is CPU work; off the event loop when called on an AsyncSession
+    return run_blocking(_rfm_segments, rows)
+
+def _rfm_segments(rows):
+    """
+    Scores and labels customers from (last order, orders, spend) rows.
+    """
+    result = {"reference_date": None, "customers": len(rows), "segments": []}
+    if not rows:
+        return result
+
+    last_order_at, frequency, monetary = zip(*rows)
+    last_order_at = np.array(last_order_at, dtype="datetime64[s]")
+    frequency = np.array(frequency, dtype=np.int64)
+    monetary = np.array(monetary, dtype=np.float64)
+    reference = last_order_at.max()
+    recency_days = (reference - last_order_at) / np.timedelta64(1, "D")
+
+    r = _quintile_scores(-recency_days)
+    f = _quintile_scores(frequency)
+    m = _quintile_scores(monetary)
+    labels = np.select(
+        [condition(r, f) for _, condition in RFM_SEGMENTS],
+        np.arange(len(RFM_SEGMENTS)),
+        default=len(RFM_SEGMENTS) - 1,
+    )
+
+    size = len(RFM_SEGMENTS)
+    customers = np.bincount(labels, minlength=size)
+    divisor = np.maximum(customers, 1)
+    revenue = np.bincount(labels, weights=monetary, minlength=size)
+    avg_recency = np.bincount(labels, weights=recency_days, minlength=size) / divisor
+    avg_orders = np.bincount(labels, weights=frequency, minlength=size) / divisor
+    avg_m_score = np.bincount(labels, weights=m, minlength=size) / divisor
+
+    result["reference_date"] = str(reference.astype("datetime64[D]"))
+    result["segments"] = [
+        {
+            "segment": name,
+            "customers": int(customers[i]),
+            "share": round(float(customers[i]) / len(rows), 4),
+            "revenue": round(float(revenue[i]), 2),
+            "avg_recency_days": round(float(avg_recency[i]), 1),
+            "avg_orders": round(float(avg_orders[i]), 2),
+            "avg_spend": round(float(revenue[i] / divisor[i]), 2),
+            "avg_monetary_score": round(float(avg_m_score[i]), 2),
+        }
+        for i, (name, _) in enumerate(RFM_SEGMENTS)
+    ]
+    return result
+
+def get_order_value_quantiles(db: Session, user_id: int, upload_id: int):
+    """
+    p50/p90/p99 and histograms of order totals and basket sizes, merged from the
+    upload's per-day quantile sketches (empty for uploads ingested before them).
+    """
+    return quantile_summary(db, user_id, [upload_id])
+
+def get_cohort_retention(db: Session, user_id: int, upload_id: int):
+    """
+    Customers grouped by first-order month with how many ordered again in each later
+    month. Cohorts span all of the user's uploads, so upload_id only selects the
+    user; the grid is kept up to date at ingestion (core/cohorts.py).
+    """
+    return cohort_retention(db, user_id)
+
+def get_frequently_bought_together(db: Session, user_id: int, upload_id: int):
+    """
+    The product pairs most often bought in the same order, with support,
+    confidence and lift (core/basket.py).
+    """
+    return frequently_bought_together(db, user_id, upload_id)
+
+
+# A central registry that maps "keys" to aggregator functions and descriptive info.
+# "requires" names the INTERMEDIATES a handler reads, so the executor can compute
+# each of them once for all the metrics of a request.
 ANALYTICS_REGISTRY = {
     "orders_summary": {
         "label": "Orders Summary",
         "description": "Returns total orders, total revenue, and average order value (AOV).",
         "handler": get_orders_summary,
+        "requires": ["daily_series"],
     },
     "time_series": {
         "label": "Daily Time Series",
         "description": "Groups orders by day, returning the number of orders each day.",
         "handler": get_orders_time_series,
+        "requires": ["daily_series"],
     },
     "top_cities_by_orders": {
         "label": "Top Cities (by Order Count)",
@@ -409,6 +702,7 @@ ANALYTICS_REGISTRY = {
         "label": "Repeat Customer Metrics",
         "description": "Combines repeat & unique customers, plus the repeat purchase rate.",
         "handler": get_repeat_customer_metrics,
+        "requires": ["customer_order_counts"],
     },
     "orders_by_hour": {
         "label": "Hourly Orders",
@@ -419,6 +713,7 @@ ANALYTICS_REGISTRY = {
         "label": "Orders by Day of Week",
         "description": "Groups orders by day of week (0=Sunday, 1=Monday, ...).",
         "handler": get_orders_by_day_of_week,
+        "requires": ["daily_series"],
     },
     "top_discount_codes": {
         "label": "Top Discount Codes (by usage)",
@@ -430,4 +725,31 @@ ANALYTICS_REGISTRY = {
         "description": "Shows which discount codes created the greatest total discount_amount.",
         "handler": get_top_discount_codes_by_savings,
     },
+    "order_value_quantiles": {
+        "label": "Order Value Distribution",
+        "description": "p50/p90/p99 and histograms of order totals and basket sizes, from quantile sketches (about 1.65% rank error).",
+        "handler": get_order_value_quantiles,
+    },
+    "rfm_segments": {
+        "label": "RFM Segments",
+        "description": "Customers scored by recency, frequency and monetary quintiles and grouped into segments (champions, at risk, lost, ...).",
+        "handler": get_rfm_segments,
+    },
+    "cohort_retention": {
+        "label": "Cohort Retention",
+        "description": "Customers grouped by first-order month, with the number who ordered again in each later month (across all uploads).",
+        "handler": get_cohort_retention,
+    },
+    "frequently_bought_together": {
+        "label": "Frequently Bought Together",
+        "description": "Product pairs most often bought in the same order, with support, confidence and lift.",
+        "handler": get_frequently_bought_together,
+    },
 }
+
+async def run_handler_async(adb: AsyncSession, key: str, user_id: int, upload_id: int):
+    """
+    Async version of a registry handler: runs the same query code on an AsyncSession,
+    awaiting the database instead of blocking a thread.
+    """
+    return await adb.run_sync(ANALYTICS_REGISTRY[key]["handler"], user_id, upload_id)
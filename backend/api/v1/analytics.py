@@ -1,12 +1,20 @@
 # api/v1/analytics.py
 
 from fastapi import APIRouter, Depends, HTTPException, Body, Query
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Optional
-from sqlalchemy.orm import Session
+from datetime import date
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.deps import get_db, get_current_user
+from core.deps import get_async_db, get_current_user
 from analytics_service import ANALYTICS_REGISTRY
-from core.redis_client import cache_get, cache_set, generate_cache_key, cache_clear_pattern
+from analytics_engine import run_metrics_async, cached_metrics, MetricsDeadlineExceeded
+from core.sketch_store import distinct_customers, top_k, quantile_summary, TOPK_DIMENSIONS
+from core.basket import frequently_bought_together
+from core.cache_flight import get_or_compute
+from core.redis_client import (
+    cache_get, cache_set, generate_cache_key, cache_tag, cache_tags, cache_clear_tag, cache_clear_pattern
+)
 
 
 router = APIRouter()
@@ -36,45 +44,29 @@ def list_available_analytics():
     return all_metrics
 
 @router.get("/full")
-def analytics_full(
+async def analytics_full(
     upload_id: int,
     refresh_cache: Optional[bool] = Query(False, description="Force refresh the cache"),
-    db: Session = Depends(get_db),
+    adb: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
     """
     Returns ALL analytics from the registry in one shot.
     """
-    # Generate a cache key based on the user and upload
-    cache_key = generate_cache_key("analytics:full", current_user.id, upload_id)
-    
-    # Check if we have cached data and refresh_cache is not True
-    if not refresh_cache:
-        cached_data = cache_get(cache_key)
-        if cached_data:
-            return cached_data
-    
-    # We'll iterate over every key in the registry
-    result = {}
-    for key, info in ANALYTICS_REGISTRY.items():
-        handler_func = info["handler"]
-        if not handler_func:
-            # If there's no function for some reason, skip or set an empty value
-            result[key] = None
-            continue
-        # Call the aggregator function
-        result[key] = handler_func(db, current_user.id, upload_id)
-    
-    # Cache the result
-    cache_set(cache_key, result)
+    # Every registry metric, each served from its own cache entry (shared with
+    # /custom) and the missing ones computed in as few scans as the engine can
+    # manage (a metric without a handler function is left as an empty value)
+    result = {key: None for key in ANALYTICS_REGISTRY}
+    metric_keys = [key for key, info in ANALYTICS_REGISTRY.items() if info["handler"]]
+    result.update(await _cached_metrics(adb, current_user.id, upload_id, metric_keys, refresh_cache))
     return result
 
 @router.post("/custom")
-def analytics_custom(
+async def analytics_custom(
     upload_id: int,
     selected_metrics: List[str] = Body(...),
     refresh_cache: Optional[bool] = Query(False, description="Force refresh the cache"),
-    db: Session = Depends(get_db),
+    adb: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
     """
@@ -82,17 +74,8 @@ def analytics_custom(
     Example JSON body:
       ["orders_summary", "time_series", "top_cities_by_orders"]
     """
-    # Generate a cache key based on the user, upload, and selected metrics
-    metrics_key = "-".join(sorted(selected_metrics))  # Sort to ensure consistent key
-    cache_key = generate_cache_key("analytics:custom", current_user.id, upload_id, metrics_key)
-    
-    # Check if we have cached data and refresh_cache is not True
-    if not refresh_cache:
-        cached_data = cache_get(cache_key)
-        if cached_data:
-            return cached_data
-    
     response_data = {}
+    valid_metrics = []
     for metric_key in selected_metrics:
         info = ANALYTICS_REGISTRY.get(metric_key)
         if not info:
@@ -105,13 +88,132 @@ def analytics_custom(
             response_data[metric_key] = {"error": "No handler function available"}
             continue
 
-        # Call aggregator
-        response_data[metric_key] = handler_func(db, current_user.id, upload_id)
+        response_data[metric_key] = None
+        valid_metrics.append(metric_key)
 
-    # Cache the result
-    cache_set(cache_key, response_data)
+    # Cached metrics are reused whatever they were first requested with; the
+    # others are computed together so they can share scans
+    if valid_metrics:
+        response_data.update(await _cached_metrics(adb, current_user.id, upload_id, valid_metrics, refresh_cache))
     return response_data
 
+async def _cached_metrics(adb: AsyncSession, user_id: int, upload_id: int, metric_keys, refresh: bool) -> dict:
+    async def compute(missing):
+        try:
+            return await run_metrics_async(adb, user_id, upload_id, missing)
+        except MetricsDeadlineExceeded:
+            raise HTTPException(status_code=504, detail="Analytics took too long to compute, please retry")
+
+    # Stale metrics are served as they are and recomputed by a background job
+    return await cached_metrics(user_id, upload_id, metric_keys, compute, refresh=refresh, revalidate=True)
+
+def _check_window(start_date: Optional[date], end_date: Optional[date]):
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+
+def _with_window(result: dict, upload_ids, start_date, end_date) -> dict:
+    """
+    Echoes the window a sketch-based result covers.
+    """
+    result.update({
+        "upload_ids": upload_ids,
+        "start_date": start_date.isoformat() if start_date else None,
+        "end_date": end_date.isoformat() if end_date else None,
+    })
+    return result
+
+@router.get("/distinct-customers")
+async def analytics_distinct_customers(
+    upload_ids: Optional[List[int]] = Query(None, description="Uploads to include (default: all of your uploads)"),
+    start_date: Optional[date] = Query(None, description="First order day to include"),
+    end_date: Optional[date] = Query(None, description="Last order day to include"),
+    exact: Optional[bool] = Query(False, description="Count from raw orders instead of merging sketches"),
+    adb: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user)
+):
+    """
+    Distinct customers across any set of uploads and date range. By default this
+    merges the per-day HyperLogLog sketches built at ingest (no order scan) and
+    reports the estimate's relative standard error; exact=true counts instead.
+    """
+    _check_window(start_date, end_date)
+    result = await adb.run_sync(
+        lambda db: distinct_customers(db, current_user.id, upload_ids, start_date, end_date, exact)
+    )
+    return _with_window(result, upload_ids, start_date, end_date)
+
+@router.get("/top-k")
+async def analytics_top_k(
+    dimension: str = Query(..., description="One of: " + ", ".join(TOPK_DIMENSIONS)),
+    limit: int = Query(5, ge=1, le=50, description="Number of items to return"),
+    upload_ids: Optional[List[int]] = Query(None, description="Uploads to include (default: all of your uploads)"),
+    start_date: Optional[date] = Query(None, description="First order day to include"),
+    end_date: Optional[date] = Query(None, description="Last order day to include"),
+    adb: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user)
+):
+    """
+    Top products (units sold), cities or discount codes (orders) across any set of
+    uploads and date range, merged from the per-day top-K summaries built at ingest.
+    Each item's true count lies in [count - error, count]; no unlisted item can
+    exceed max_untracked_count.
+    """
+    if dimension not in TOPK_DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown dimension '{dimension}'")
+    _check_window(start_date, end_date)
+    result = await adb.run_sync(
+        lambda db: top_k(db, current_user.id, dimension, limit, upload_ids, start_date, end_date)
+    )
+    result["dimension"] = dimension
+    return _with_window(result, upload_ids, start_date, end_date)
+
+@router.get("/quantiles")
+async def analytics_quantiles(
+    bins: int = Query(10, ge=1, le=100, description="Histogram bins per distribution"),
+    upload_ids: Optional[List[int]] = Query(None, description="Uploads to include (default: all of your uploads)"),
+    start_date: Optional[date] = Query(None, description="First order day to include"),
+    end_date: Optional[date] = Query(None, description="Last order day to include"),
+    adb: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user)
+):
+    """
+    p50/p90/p99 and histograms of order totals and basket sizes across any set of
+    uploads and date range, merged from the per-day KLL sketches built at ingest.
+    Values are within rank_error (normalized rank, 99% confidence) of exact.
+    """
+    _check_window(start_date, end_date)
+    result = await adb.run_sync(
+        lambda db: quantile_summary(db, current_user.id, upload_ids, start_date, end_date, bins)
+    )
+    return _with_window(result, upload_ids, start_date, end_date)
+
+@router.get("/frequently-bought-together")
+async def analytics_frequently_bought_together(
+    upload_id: int,
+    limit: int = Query(10, ge=1, le=50, description="Number of product pairs to return"),
+    min_orders: int = Query(2, ge=1, description="Orders a pair must share to be listed"),
+    refresh_cache: Optional[bool] = Query(False, description="Force refresh the cache"),
+    adb: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user)
+):
+    """
+    Product pairs most often bought in the same order, with support, confidence and
+    lift. An upload's line items don't change, so results are cached per upload.
+    """
+    # Redis is sync: keep its round trips off the event loop
+    cache_key = await run_in_threadpool(
+        generate_cache_key, "analytics:basket", current_user.id, upload_id, limit, min_orders
+    )
+
+    async def compute():
+        return await adb.run_sync(
+            lambda db: frequently_bought_together(db, current_user.id, upload_id, limit, min_orders)
+        )
+
+    return await get_or_compute(
+        cache_key, compute, tags=cache_tags(current_user.id, upload_id), refresh=refresh_cache
+    )
+
 @router.post("/clear-cache")
 def clear_analytics_cache(
     upload_id: Optional[int] = Query(None, description="Clear cache for specific upload, or all if not provided"),
@@ -120,12 +222,16 @@ def clear_analytics_cache(
     """
     Clears the analytics cache for the current user.
     If upload_id is provided, only clears cache for that upload.
+
+    Deletes the keys registered in the user's (or upload's) tag set; entries
+    cached before tag sets existed are found with a SCAN over analytics keys.
     """
+    if cache_clear_tag(cache_tag(current_user.id, upload_id)) is None:
+        if upload_id:
+            cache_clear_pattern(f"analytics:*:{current_user.id}:{upload_id}:*")
+        else:
+            cache_clear_pattern(f"analytics:*:{current_user.id}:*")
+
     if upload_id:
-        pattern = f"analytics:*:{current_user.id}:{upload_id}:*"
-        cache_clear_pattern(pattern)
         return {"message": f"Cache cleared for upload {upload_id}"}
-    else:
-        pattern = f"analytics:*:{current_user.id}:*"
-        cache_clear_pattern(pattern)
-        return {"message": "All analytics cache cleared for current user"}
+    return {"message": "All analytics cache cleared for current user"}
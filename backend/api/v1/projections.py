@@ -1,24 +1,27 @@
 # backend/api/v1/projections.py
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 from datetime import datetime
 
-from core.deps import get_db, get_current_user
+from core.deps import get_async_db, get_current_user
 from db import models
 from ml import TimeSeriesForecaster, StyleForecaster
-from core.redis_client import cache_get, cache_set, generate_cache_key
+from core.redis_client import generate_cache_key, cache_tags
+from core.cache_flight import get_or_compute
 
 router = APIRouter(tags=["projections"])
 
 @router.get("/forecast")
-def get_sales_forecast(
+async def get_sales_forecast(
     upload_id: int,
     days: Optional[int] = Query(30, description="Number of days to forecast"),
     model: Optional[str] = Query("naive", description="Forecasting model to use (naive, arima)"),
     refresh_cache: Optional[bool] = Query(False, description="Force refresh the cache"),
-    db: Session = Depends(get_db),
+    adb: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_user)
 ):
     """
@@ -41,16 +44,19 @@ def get_sales_forecast(
         raise HTTPException(status_code=400, detail="Model must be 'naive' or 'arima'")
     
     # Check if the upload exists and belongs to the user
-    upload = db.query(models.Upload).filter(
-        models.Upload.id == upload_id,
-        models.Upload.user_id == current_user.id
-    ).first()
+    upload = (await adb.execute(
+        select(models.Upload).where(
+            models.Upload.id == upload_id,
+            models.Upload.user_id == current_user.id
+        )
+    )).scalars().first()
     
     if not upload:
         raise HTTPException(status_code=404, detail="Upload not found")
     
-    # Generate cache key
-    cache_key = generate_cache_key(
+    # Generate cache key (Redis is sync: keep its round trips off the event loop)
+    cache_key = await run_in_threadpool(
+        generate_cache_key,
         "projections:forecast", 
         current_user.id, 
         upload_id, 
@@ -58,37 +64,36 @@ def get_sales_forecast(
         model
     )
     
-    # Check cache if refresh_cache is False
-    if not refresh_cache:
-        cached_data = cache_get(cache_key)
-        if cached_data:
-            return cached_data
-    
-    # Create forecaster and generate forecast
-    forecaster = TimeSeriesForecaster(db, current_user.id, upload_id)
-    forecast_data = forecaster.forecast(days=days, model=model)
-    
-    # Add metadata
-    result = {
-        "upload_id": upload_id,
-        "days_forecasted": days,
-        "model": model,
-        "generated_at": datetime.utcnow().isoformat() + "Z",
-        "forecast": forecast_data
-    }
-    
-    # Cache the result
-    cache_set(cache_key, result)
-    
-    return result
+    async def compute():
+        # Create forecaster and generate forecast
+        # The data is loaded asynchronously; the model itself is CPU work, run off the event loop
+        forecaster = TimeSeriesForecaster(None, current_user.id, upload_id)
+        await forecaster.load_data_async(adb)
+        forecast_data = await run_in_threadpool(forecaster.forecast, days=days, model=model)
+
+        # Add metadata
+        return {
+            "upload_id": upload_id,
+            "days_forecasted": days,
+            "model": model,
+            "generated_at": datetime.utcnow().isoformat() + "Z",
+            "forecast": forecast_data
+        }
+
+    # Served from the cache; concurrent requests share one computation, and a stale
+    # forecast is returned at once while a background job recomputes it
+    return await get_or_compute(
+        cache_key, compute, tags=cache_tags(current_user.id, upload_id), refresh=refresh_cache,
+        revalidate=("projections:forecast", current_user.id, upload_id, days, model)
+    )
 
 @router.get("/style-forecast")
-def get_style_forecast(
+async def get_style_forecast(
     upload_id: int,
     days: Optional[int] = Query(30, description="Number of days to forecast"),
     model: Optional[str] = Query("naive", description="Forecasting model to use (naive, arima)"),
     refresh_cache: Optional[bool] = Query(False, description="Force refresh the cache"),
-    db: Session = Depends(get_db),
+    adb: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_user)
 ):
     """
@@ -111,16 +116,19 @@ def get_style_forecast(
         raise HTTPException(status_code=400, detail="Model must be 'naive' or 'arima'")
     
     # Check if the upload exists and belongs to the user
-    upload = db.query(models.Upload).filter(
-        models.Upload.id == upload_id,
-        models.Upload.user_id == current_user.id
-    ).first()
+    upload = (await adb.execute(
+        select(models.Upload).where(
+            models.Upload.id == upload_id,
+            models.Upload.user_id == current_user.id
+        )
+    )).scalars().first()
     
     if not upload:
         raise HTTPException(status_code=404, detail="Upload not found")
     
-    # Generate cache key
-    cache_key = generate_cache_key(
+    # Generate cache key (Redis is sync: keep its round trips off the event loop)
+    cache_key = await run_in_threadpool(
+        generate_cache_key,
         "projections:style-forecast", 
         current_user.id, 
         upload_id, 
@@ -128,29 +136,28 @@ def get_style_forecast(
         model
     )
     
-    # Check cache if refresh_cache is False
-    if not refresh_cache:
-        cached_data = cache_get(cache_key)
-        if cached_data:
-            return cached_data
-    
-    # Create style forecaster and generate forecast
-    forecaster = StyleForecaster(db, current_user.id, upload_id)
-    forecast_data = forecaster.forecast(days=days, model=model)
-    
-    # Add metadata
-    result = {
-        "upload_id": upload_id,
-        "days_forecasted": days,
-        "model": model,
-        "generated_at": datetime.utcnow().isoformat() + "Z",
-        "forecast": forecast_data
-    }
-    
-    # Cache the result
-    cache_set(cache_key, result)
-    
-    return result
+    async def compute():
+        # Create style forecaster and generate forecast
+        # The data is loaded asynchronously; the model itself is CPU work, run off the event loop
+        forecaster = StyleForecaster(None, current_user.id, upload_id)
+        await forecaster.load_data_async(adb)
+        forecast_data = await run_in_threadpool(forecaster.forecast, days=days, model=model)
+
+        # Add metadata
+        return {
+            "upload_id": upload_id,
+            "days_forecasted": days,
+            "model": model,
+            "generated_at": datetime.utcnow().isoformat() + "Z",
+            "forecast": forecast_data
+        }
+
+    # Served from the cache; concurrent requests share one computation, and a stale
+    # forecast is returned at once while a background job recomputes it
+    return await get_or_compute(
+        cache_key, compute, tags=cache_tags(current_user.id, upload_id), refresh=refresh_cache,
+        revalidate=("projections:style-forecast", current_user.id, upload_id, days, model)
+    )
 
 @router.get("/models")
 def list_available_models():
@@ -4,16 +4,20 @@ import os
 import tempfile
 import requests
 import time
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+import uuid
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from rq import Queue
+from rq.job import Job
 from db import crud, schemas, models
 from db.database import SessionLocal
 from core.deps import get_current_user
 from core.redis_client import redis_client
-from core.supabase_client import upload_file_to_storage, get_file_url, get_upload_signed_url, BUCKET_NAME
-from tasks import process_shopify_file_task
-from typing import List
+from core.supabase_client import upload_file_to_storage, get_file_urls, get_upload_signed_url, BUCKET_NAME
+from core.compression import split_codec_extension, preferred_codec, compress_bytes, CODEC_EXTENSIONS, COMPRESSIBLE_EXTENSIONS
+from tasks import process_shopify_file_task, delete_upload_task
+from typing import List, Optional
 
 router = APIRouter(tags=["uploads"])
 
@@ -32,17 +36,30 @@ async def upload_file(
     current_user: models.User = Depends(get_current_user)
 ):
     allowed_extensions = {"zip", "csv", "json", "xls", "xlsx"}
-    ext = file.filename.split(".")[-1].lower()
-    if ext not in allowed_extensions:
+    # Pre-compressed uploads (e.g. orders.csv.gz / orders.csv.zst) are accepted as-is
+    base_filename, client_codec = split_codec_extension(file.filename)
+    ext = base_filename.split(".")[-1].lower()
+    if ext not in allowed_extensions or (client_codec and ext not in COMPRESSIBLE_EXTENSIONS):
         raise HTTPException(status_code=400, detail=f"Invalid file type: {ext}")
 
     contents = await file.read()
     file_size = len(contents)
+
+    # Store text exports compressed; they shrink 8-10x, which cuts storage and worker download time
+    compression = client_codec
+    if compression is None and ext in COMPRESSIBLE_EXTENSIONS:
+        compression = preferred_codec()
+        if compression:
+            # Whole-file compression is CPU work; keep it off the event loop
+            contents = await run_in_threadpool(compress_bytes, contents, compression)
+            print(f"Compressed upload with {compression}: {file_size} -> {len(contents)} bytes")
     
     # Generate a unique storage path with timestamp to avoid conflicts
     timestamp = int(time.time())
-    safe_filename = file.filename.replace(" ", "_")
+    safe_filename = base_filename.replace(" ", "_")
     storage_path = f"{current_user.id}/{timestamp}_{safe_filename}"
+    if compression:
+        storage_path += CODEC_EXTENSIONS[compression]
     
     try:
         # Check Redis connection
@@ -64,7 +81,8 @@ async def upload_file(
             file_path=f"pending://{BUCKET_NAME}/{storage_path}",  # Mark as pending
             file_size=file_size,
             user_id=current_user.id,
-            status="pending"  # Set initial status
+            status="pending",  # Set initial status
+            compression=compression
         )
         db.commit()  # Commit to ensure the record exists
         
@@ -114,6 +132,7 @@ async def upload_file(
             "file_size": db_upload.file_size,
             "uploaded_at": db_upload.uploaded_at,
             "status": db_upload.status,
+            "compression": db_upload.compression,
             "job_id": job_id_str,
             "upload_id": db_upload.id,
             "message": "File upload initiated. Check status endpoint for progress."
@@ -170,6 +189,8 @@ def get_upload_status(upload_id: int, db: Session = Depends(get_db)):
         percent = 100
     elif upload.status == "failed":
         percent = 0
+    elif upload.status in ("deleting", "delete_failed"):
+        percent = 0
     elif upload.status == "pending" or upload.status == "uploaded":
         percent = 10  # Show some progress even at the beginning
     elif upload.total_rows > 0:
@@ -193,6 +214,21 @@ def get_upload_status(upload_id: int, db: Session = Depends(get_db)):
         message = "Processing completed successfully!"
     elif upload.status == "failed":
         message = "Processing failed. Please try again."
+    elif upload.status == "deleting":
+        message = "Deleting upload data..."
+        # The deletion job publishes batch progress on its meta
+        if upload.job_id:
+            try:
+                job = Job.fetch(upload.job_id, connection=redis_client)
+                if job.meta:
+                    message = (
+                        f"Deleting upload data: {job.meta.get('orders_deleted', 0)} orders and "
+                        f"{job.meta.get('line_items_deleted', 0)} line items removed"
+                    )
+            except Exception as job_error:
+                print(f"Could not read deletion progress: {str(job_error)}")
+    elif upload.status == "delete_failed":
+        message = "Deleting the upload failed. Please try again."
 
     return {
         "status": upload.status,
@@ -204,28 +240,48 @@ def get_upload_status(upload_id: int, db: Session = Depends(get_db)):
     }
 
 @router.get("/history")
-async def get_upload_history(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def get_upload_history(
+    limit: int = Query(50, ge=1, le=200, description="Maximum number of uploads to return"),
+    before_id: Optional[int] = Query(None, description="Return uploads older than this upload ID (keyset cursor)"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Returns the current user's uploads, newest first, one page at a time.
+    Pass the returned next_cursor as before_id to fetch the next page.
+    """
     try:
-        # Query uploads for the current user
-        uploads = db.query(models.Upload).filter(models.Upload.user_id == current_user.id).all()
-        
-        # Generate signed URLs for any Supabase paths
+        # Keyset pagination: seek past the cursor instead of OFFSET scanning
+        query = db.query(models.Upload).filter(models.Upload.user_id == current_user.id)
+        if before_id is not None:
+            query = query.filter(models.Upload.id < before_id)
+        uploads = query.order_by(models.Upload.id.desc()).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(uploads) > limit:
+            uploads = uploads[:limit]
+            next_cursor = uploads[-1].id
+
+        # Sign every Supabase path in one batched (and cached) storage call
+        bucket_prefix = f"supabase://{os.environ.get('BUCKET_NAME', 'uploads')}/"
+        storage_paths = {
+            upload.id: upload.file_path.replace(bucket_prefix, "")
+            for upload in uploads
+            if upload.file_path and upload.file_path.startswith("supabase://")
+        }
+        signed_urls = get_file_urls(storage_paths.values(), use_admin=True) if storage_paths else {}
+
         for upload in uploads:
-            if upload.file_path and upload.file_path.startswith("supabase://"):
-                # Extract the storage path from the URL
-                storage_path = upload.file_path.replace(f"supabase://{os.environ.get('BUCKET_NAME', 'uploads')}/", "")
-                # Generate a signed URL with admin key for downloads
-                upload.download_url = get_file_url(storage_path, use_admin=True)
-            else:
-                upload.download_url = None
-                
-        return {"uploads": uploads}
+            storage_path = storage_paths.get(upload.id)
+            upload.download_url = signed_urls.get(storage_path) if storage_path else None
+
+        return {"uploads": uploads, "next_cursor": next_cursor}
     except Exception as e:
         print(f"Error occurred: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
-@router.delete("/{upload_id}", response_model=dict, summary="Delete an upload")
-async def delete_upload(
+@router.delete("/{upload_id}", response_model=dict, status_code=202, summary="Delete an upload")
+def delete_upload(
     upload_id: int,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
@@ -233,15 +289,15 @@ async def delete_upload(
     """
     Delete an upload and its associated data.
     
-    This endpoint removes the upload record from the database and attempts to delete
-    the associated file from storage. It also removes any related data such as
-    orders and line items associated with this upload.
+    The upload is marked as "deleting" and a background job removes the stored
+    file, its orders and line items (in bounded batches) and finally the upload
+    record, so this endpoint responds immediately regardless of upload size.
     
     Parameters:
     - upload_id: The ID of the upload to delete
     
     Returns:
-    - A success message if the upload was deleted successfully
+    - The deletion job ID; poll /uploads/status/{upload_id} for progress
     """
     try:
         # Get the upload
@@ -252,42 +308,49 @@ async def delete_upload(
         
         if not upload:
             raise HTTPException(status_code=404, detail="Upload not found or you don't have permission to delete it")
-        
-        # Try to delete the file from storage if it's in Supabase
-        if upload.file_path and upload.file_path.startswith("supabase://"):
-            try:
-                # Extract the storage path from the URL
-                bucket_name = os.environ.get('BUCKET_NAME', 'uploads')
-                storage_path = upload.file_path.replace(f"supabase://{bucket_name}/", "")
-                
-                # Import the delete function from supabase_client
-                from core.supabase_client import delete_file_from_storage
-                
-                # Delete the file
-                delete_result = delete_file_from_storage(storage_path, use_admin=True)
-                print(f"Storage delete result: {delete_result}")
-            except Exception as storage_error:
-                # Log the error but continue with database deletion
-                print(f"Error deleting file from storage: {str(storage_error)}")
-                # We don't want to fail the whole operation if just the storage delete fails
-        
-        # Delete related data (orders, line items, etc.)
-        try:
-            # Delete orders associated with this upload
-            # This should cascade to line items if foreign key constraints are set up properly
-            db.query(models.Order).filter(models.Order.upload_id == upload_id).delete()
-            db.flush()  # Flush changes to ensure orders are deleted before the upload
-        except Exception as related_error:
-            print(f"Error deleting related data: {str(related_error)}")
-            # Continue with upload deletion even if related data deletion fails
-        
-        # Delete the upload record
-        db.delete(upload)
+
+        # Read before the commits below expire the row, which the deletion task
+        # may have removed by the time the response is built
+        file_name = upload.file_name
+
+        # A deletion is already under way; don't enqueue a second one
+        if upload.status == "deleting":
+            return {
+                "success": True,
+                "status": upload.status,
+                "job_id": upload.job_id,
+                "message": f"Upload '{file_name}' is already being deleted"
+            }
+
+        # Recorded before enqueueing: once the job is queued the worker may delete
+        # the row at any moment, so nothing is written to it afterwards
+        job_id_str = str(uuid.uuid4())
+        upload.status = "deleting"
+        upload.job_id = job_id_str
         db.commit()
-        
+
+        try:
+            q = Queue(connection=redis_client, default_timeout=3600)
+            q.enqueue(delete_upload_task, upload_id, current_user.id, job_id=job_id_str)
+            print(f"Deletion job enqueued with ID: {job_id_str} for upload_id: {upload_id}")
+        except Exception as redis_error:
+            # Without a queue, fall back to deleting in-process (still batched)
+            print(f"Failed to enqueue deletion job, deleting inline: {str(redis_error)}")
+            upload.job_id = None
+            db.commit()
+            delete_upload_task(upload_id, current_user.id)
+            return {
+                "success": True,
+                "status": "deleted",
+                "job_id": None,
+                "message": f"Upload '{file_name}' and associated data deleted successfully"
+            }
+
         return {
             "success": True,
-            "message": f"Upload '{upload.file_name}' and associated data deleted successfully"
+            "status": "deleting",
+            "job_id": job_id_str,
+            "message": f"Upload '{file_name}' is being deleted in the background"
         }
     except HTTPException as http_error:
         # Re-raise HTTP exceptions
@@ -0,0 +1,379 @@
+# backend/benchmarks/analytics_benchmark.py
+"""
+Latency and query-plan benchmark for the analytics workload.
+
+Seeds a Postgres database with generated uploads (10k, 100k and 1M orders by
+default), then for every ANALYTICS_REGISTRY handler and the dashboard,
+projections, analytics and upload-history endpoints records p50/p95 latency,
+rows scanned and the EXPLAIN (ANALYZE, BUFFERS) plan of every query issued.
+Results are written as JSON; pass a previous run as --baseline to flag
+regressions before an index or query change ships.
+
+The target must be a migrated (alembic upgrade head) scratch database: the
+seeded uploads belong to a "benchmark" user and are reused across runs.
+Caching is bypassed, so Redis isn't needed.
+
+Usage (from backend/):
+    python -m benchmarks.analytics_benchmark --database-url postgresql://... \\
+        --sizes 10000 100000 --output bench.json [--baseline previous.json]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+from contextlib import ExitStack
+from unittest.mock import patch
+
+import numpy as np
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+
+# Endpoints timed besides the registry handlers; refresh_cache skips the cache read
+ENDPOINTS = (
+    "/analytics/full?upload_id={upload_id}&refresh_cache=true",
+    "/dashboard/orders-summary?upload_id={upload_id}&refresh_cache=true",
+    "/projections/forecast?upload_id={upload_id}&days=30&refresh_cache=true",
+    "/uploads/history?limit=50",
+)
+
+# Router modules whose cache writes are disabled while benchmarking
+CACHED_MODULES = ("api.v1.analytics", "api.v1.dashboard", "api.v1.projections")
+
+# Plan nodes that read rows from a table or index
+SCAN_NODES = {
+    "Seq Scan", "Index Scan", "Index Only Scan", "Bitmap Heap Scan", "Tid Scan", "Sample Scan",
+}
+
+SEED_ORDERS_SQL = """
+INSERT INTO orders (
+    user_id, upload_id, order_id, name, email, financial_status, currency,
+    subtotal, total, discount_code, discount_amount, shipping_city, created_at
+)
+SELECT
+    :user_id, :upload_id, 'bench-' || g, '#' || (1000 + g),
+    'customer' || floor(r_customer * :customers)::int || '@example.com',
+    'paid', 'USD', total, total,
+    code, CASE WHEN code IS NOT NULL THEN round(total * 0.1, 2) END,
+    (ARRAY['New York', 'Los Angeles', 'Chicago', 'Houston', 'Phoenix',
+           'Dallas', 'Austin', 'Seattle', 'Denver', 'Boston'])[1 + floor(r_city * 10)::int],
+    timestamp '2024-01-01' + r_time * interval '365 days'
+FROM (
+    SELECT
+        g,
+        round((5 + random() * 295)::numeric, 2) AS total,
+        CASE WHEN random() < 0.2
+             THEN (ARRAY['SAVE10', 'WELCOME', 'VIP20', 'SPRING'])[1 + floor(random() * 4)::int]
+        END AS code,
+        random() AS r_customer, random() AS r_city, random() AS r_time
+    FROM generate_series(1, :orders) AS g
+) AS s
+"""
+
+SEED_LINE_ITEMS_SQL = """
+INSERT INTO line_items (order_id, upload_id, lineitem_name, lineitem_quantity, lineitem_price, lineitem_sku)
+SELECT o.id, o.upload_id, p.name, 1 + floor(random() * 3)::int, p.price, p.sku
+FROM orders AS o
+CROSS JOIN LATERAL generate_series(1, 1 + o.id % 3) AS n
+JOIN (VALUES
+    (0, 'Red Shirt', 25.00, 'RS-1'), (1, 'Blue Shirt', 25.00, 'BS-1'),
+    (2, 'Green Hat', 18.00, 'GH-1'), (3, 'Black Shoes', 80.00, 'SH-1'),
+    (4, 'Denim Jacket', 95.00, 'DJ-1'), (5, 'Wool Scarf', 30.00, 'WS-1'),
+    (6, 'Canvas Tote', 22.00, 'CT-1'), (7, 'Leather Belt', 40.00, 'LB-1')
+) AS p (idx, name, price, sku) ON p.idx = (o.id * 7 + n) % 8
+WHERE o.upload_id = :upload_id
+"""
+
+def percentile_ms(samples, q) -> float:
+    return round(float(np.percentile(samples, q)) * 1000.0, 3)
+
+def plan_stats(plan: dict) -> dict:
+    """
+    Totals of one EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) plan: rows read by scan
+    nodes (rows returned plus rows filtered out, across loops) and buffer usage.
+    """
+    rows_scanned = 0
+    stack = [plan["Plan"]]
+    while stack:
+        node = stack.pop()
+        if node.get("Node Type") in SCAN_NODES:
+            loops = node.get("Actual Loops", 1)
+            read = node.get("Actual Rows", 0) + node.get("Rows Removed by Filter", 0)
+            rows_scanned += int(read * loops)
+        stack.extend(node.get("Plans", []))
+    top = plan["Plan"]
+    return {
+        "rows_scanned": rows_scanned,
+        "shared_hit_blocks": top.get("Shared Hit Blocks", 0),
+        "shared_read_blocks": top.get("Shared Read Blocks", 0),
+        "execution_ms": plan.get("Execution Time"),
+    }
+
+def compare_to_baseline(results: dict, baseline: dict, threshold: float, min_delta_ms: float) -> list:
+    """
+    Targets whose p95 grew by more than `threshold` (and by at least min_delta_ms,
+    to ignore noise on fast queries) or that now scan more rows than in the baseline.
+
+    Returns:
+        list of human-readable regression descriptions
+    """
+    regressions = []
+    for size, run in results["sizes"].items():
+        base_targets = baseline.get("sizes", {}).get(size, {}).get("targets", {})
+        for target, stats in run["targets"].items():
+            base = base_targets.get(target)
+            if not base or "p95_ms" not in stats or "p95_ms" not in base:
+                continue
+            delta = stats["p95_ms"] - base["p95_ms"]
+            if delta > min_delta_ms and stats["p95_ms"] > base["p95_ms"] * (1 + threshold):
+                regressions.append(
+                    f"{size} {target}: p95 {base['p95_ms']:.1f} -> {stats['p95_ms']:.1f} ms"
+                )
+            if stats.get("rows_scanned", 0) > base.get("rows_scanned", 0):
+                regressions.append(
+                    f"{size} {target}: rows scanned {base.get('rows_scanned', 0)} -> {stats['rows_scanned']}"
+                )
+    return regressions
+
+class Recorder:
+    """
+    Collects the statements run on an engine (sync or the sync side of an async
+    engine) as (SQLAlchemy statement, parameters) pairs, so they can be EXPLAINed
+    on the benchmark's own psycopg2 connection whatever driver issued them.
+    """
+
+    def __init__(self, *engines):
+        from sqlalchemy import event
+        self.statements = []
+        self.active = False
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if not self.active or not context or not context.compiled:
+            return
+        if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            return
+        self.statements.append((context.compiled.statement, dict(context.compiled_parameters[0])))
+
+    def capture(self, fn):
+        self.statements = []
+        self.active = True
+        try:
+            fn()
+        finally:
+            self.active = False
+        return self.statements
+
+def explain(engine, statements) -> dict:
+    """
+    Runs EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) on each captured statement.
+
+    Returns:
+        dict: summed plan_stats and the raw plans
+    """
+    totals = {"queries": len(statements), "rows_scanned": 0, "shared_hit_blocks": 0, "shared_read_blocks": 0}
+    plans = []
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            compiled = statement.compile(dialect=conn.dialect)
+            sql = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + str(compiled)
+            plan = conn.exec_driver_sql(sql, compiled.construct_params(parameters)).scalar()
+            plan = plan[0] if isinstance(plan, list) else json.loads(plan)[0]
+            stats = plan_stats(plan)
+            for key in ("rows_scanned", "shared_hit_blocks", "shared_read_blocks"):
+                totals[key] += stats[key]
+            plans.append({"sql": str(compiled), "plan": plan})
+        conn.rollback()
+    totals["plans"] = plans
+    return totals
+
+def time_runs(fn, repeat: int, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return {
+        "runs": repeat,
+        "p50_ms": percentile_ms(samples, 50),
+        "p95_ms": percentile_ms(samples, 95),
+        "mean_ms": round(float(np.mean(samples)) * 1000.0, 3),
+    }
+
+def seed_upload(db, engine, user, size: int, with_rollups: bool, reseed: bool):
+    """
+    Returns the benchmark upload of `size` orders, generating it server-side
+    (generate_series) unless a complete one already exists.
+    """
+    from sqlalchemy import text
+    from db import models
+    from db.partitions import ensure_upload_partitions
+    from core.rollups import build_upload_rollups, delete_upload_rollups
+    from core.sketch_store import build_upload_sketches
+    from core.upload_deletion import delete_upload_data
+
+    file_name = f"benchmark-{size}.csv"
+    upload = db.query(models.Upload).filter_by(user_id=user.id, file_name=file_name).first()
+    if upload and (reseed or upload.status != "completed" or upload.records_processed != size):
+        delete_upload_data(db, upload.id)
+        db.delete(upload)
+        db.commit()
+        upload = None
+
+    if upload is None:
+        print(f"Seeding {size} orders...")
+        upload = models.Upload(
+            user_id=user.id, file_name=file_name, file_path=f"benchmark://{file_name}",
+            file_size=0, status="processing", total_rows=size,
+        )
+        db.add(upload)
+        db.commit()
+        ensure_upload_partitions(db, upload.id)
+        params = {"user_id": user.id, "upload_id": upload.id, "orders": size, "customers": max(size // 3, 1)}
+        db.execute(text(SEED_ORDERS_SQL), params)
+        db.execute(text(SEED_LINE_ITEMS_SQL), params)
+        upload.status = "completed"
+        upload.records_processed = size
+        db.commit()
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            # Fresh statistics and visibility map, as autovacuum would eventually leave them
+            conn.exec_driver_sql("VACUUM ANALYZE orders")
+            conn.exec_driver_sql("VACUUM ANALYZE line_items")
+
+    if with_rollups:
+        build_upload_rollups(db, user.id, upload.id)
+        build_upload_sketches(db, user.id, upload.id)
+    else:
+        delete_upload_rollups(db, upload.id)
+        db.commit()
+    return upload
+
+def run_benchmark(args) -> dict:
+    # The app's engines read DATABASE_URL at import time
+    os.environ["DATABASE_URL"] = args.database_url
+    from fastapi.testclient import TestClient
+    from sqlalchemy import text
+    from db import models
+    from db.database import SessionLocal, engine
+    from db.async_database import get_async_engine
+    from analytics_service import ANALYTICS_REGISTRY
+    from core.deps import get_current_user
+    from main import app
+
+    if engine.dialect.name != "postgresql":
+        sys.exit("The benchmark needs a Postgres database")
+
+    db = SessionLocal()
+    user = db.query(models.User).filter_by(username="benchmark").first()
+    if not user:
+        user = models.User(username="benchmark", email="benchmark@example.com", hashed_password="!")
+        db.add(user)
+        db.commit()
+
+    recorder = Recorder(engine, get_async_engine().sync_engine)
+    app.dependency_overrides[get_current_user] = lambda: user
+    results = {
+        "generated_at": datetime.datetime.utcnow().isoformat() + "Z",
+        "server_version": db.execute(text("SHOW server_version")).scalar(),
+        "repeat": args.repeat,
+        "rollups": args.rollups,
+        "sizes": {},
+    }
+
+    with ExitStack() as stack:
+        for module in CACHED_MODULES:
+            stack.enter_context(patch(f"{module}.cache_set"))
+        client = stack.enter_context(TestClient(app))
+
+        for size in args.sizes:
+            upload = seed_upload(db, engine, user, size, args.rollups, args.reseed)
+            targets = {}
+
+            for key, info in ANALYTICS_REGISTRY.items():
+                if not info["handler"]:
+                    continue
+
+                def run_handler(handler=info["handler"]):
+                    with SessionLocal() as session:
+                        handler(session, user.id, upload.id)
+
+                print(f"[{size}] handler:{key}")
+                stats = time_runs(run_handler, args.repeat)
+                stats.update(explain(engine, recorder.capture(run_handler)))
+                targets[f"handler:{key}"] = stats
+
+            for path in ENDPOINTS:
+                url = path.format(upload_id=upload.id)
+
+                def call_endpoint(url=url):
+                    response = client.get(url)
+                    if response.status_code != 200:
+                        raise RuntimeError(f"{url} returned {response.status_code}: {response.text[:200]}")
+
+                print(f"[{size}] endpoint:{path}")
+                stats = time_runs(call_endpoint, args.repeat)
+                stats.update(explain(engine, recorder.capture(call_endpoint)))
+                targets[f"endpoint:{path.split('?')[0]}"] = stats
+
+            results["sizes"][str(size)] = {"upload_id": upload.id, "orders": size, "targets": targets}
+
+    db.close()
+    return results
+
+def print_summary(results: dict):
+    for size, run in results["sizes"].items():
+        print(f"\n{size} orders (upload {run['upload_id']})")
+        print(f"  {'target':<48} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8} {'rows scanned':>13}")
+        for target, stats in run["targets"].items():
+            print(
+                f"  {target:<48} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+                f"{stats['queries']:>8} {stats['rows_scanned']:>13}"
+            )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("BENCHMARK_DATABASE_URL"),
+                        help="Migrated scratch Postgres database (default: $BENCHMARK_DATABASE_URL)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="Orders per generated upload")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed runs per target")
+    parser.add_argument("--rollups", action="store_true",
+                        help="Build rollups and sketches first (default: measure the raw-row queries)")
+    parser.add_argument("--reseed", action="store_true", help="Regenerate existing benchmark uploads")
+    parser.add_argument("--output", default="benchmark-results.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="Earlier results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed relative p95 increase over the baseline (default: 0.2)")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0,
+                        help="Ignore p95 increases smaller than this (default: 2 ms)")
+    args = parser.parse_args(argv)
+    if not args.database_url:
+        parser.error("--database-url or BENCHMARK_DATABASE_URL is required")
+
+    results = run_benchmark(args)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, default=str)
+    print_summary(results)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("rollups") != results["rollups"]:
+            print("\nWarning: the baseline was run with a different --rollups setting")
+        regressions = compare_to_baseline(results, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print("\nRegressions against the baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against the baseline")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+# backend/core/basket.py
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+from db import models
+from db.async_database import run_blocking
+
+# Products whose co-occurrence column block is computed at once; bounds the
+# products x block matrix held in memory however many SKUs an upload has
+BASKET_BLOCK_SIZE = 2048
+
+def _line_item_rows(db: Session, user_id: int, upload_id: int):
+    """
+    (order id, product name) of every named line item of an upload.
+    """
+    o = models.Order
+    li = models.LineItem
+    return (
+        db.query(li.order_id, li.lineitem_name)
+        .join(o, and_(li.order_id == o.id, li.upload_id == o.upload_id))
+        .filter(o.user_id == user_id, o.upload_id == upload_id, li.lineitem_name.isnot(None))
+        .all()
+    )
+
+def _incidence_matrix(rows):
+    """
+    Binary orders x products matrix of (order id, product name) rows.
+
+    Returns:
+        (csr_matrix, product names)
+    """
+    frame = pd.DataFrame(rows, columns=["order_id", "product"])
+    order_codes, _ = pd.factorize(frame["order_id"])
+    product_codes, products = pd.factorize(frame["product"])
+    matrix = sparse.csr_matrix(
+        (np.ones(len(frame), dtype=np.int32), (order_codes, product_codes)),
+        shape=(order_codes.max() + 1 if len(frame) else 0, len(products)),
+    )
+    # A product listed twice in an order is still one occurrence
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return matrix, list(products)
+
+def frequently_bought_together(
+    db: Session, user_id: int, upload_id: int, limit: int = 10, min_orders: int = 2
+) -> dict:
+    """
+    Product pairs most often bought in the same order, with support, confidence
+    and lift. Co-occurrence counts are products of the sparse orders x products
+    incidence matrix, computed one block of product columns at a time so memory
+    stays bounded with tens of thousands of SKUs.
+
+    Args:
+        db: SQLAlchemy database session
+        user_id: Owner of the upload
+        upload_id: The upload whose line items are read
+        limit: Number of pairs to return
+        min_orders: Orders a pair must share to be reported
+
+    Returns:
+        dict: orders (orders with line items) and pairs, most shared orders first,
+        each {product_a, product_b, orders, support, confidence_a_to_b,
+        confidence_b_to_a, lift}
+    """
+    # The matrix products are CPU work; off the event loop when called on an AsyncSession
+    return run_blocking(_top_pairs, _line_item_rows(db, user_id, upload_id), limit, min_orders)
+
+def _top_pairs(rows, limit: int, min_orders: int) -> dict:
+    matrix, products = _incidence_matrix(rows)
+    total_orders = matrix.shape[0]
+    result = {"orders": total_orders, "pairs": []}
+    if not total_orders:
+        return result
+
+    # A product in fewer than min_orders orders can't be part of a reported pair
+    product_orders = np.asarray(matrix.sum(axis=0)).ravel()
+    kept = np.flatnonzero(product_orders >= min_orders)
+    matrix = matrix[:, kept].tocsc()
+    product_orders = product_orders[kept]
+    transposed = matrix.T.tocsr()
+
+    def best(a, b, count):
+        # The pairs with most shared orders, then highest lift
+        lift = count * total_orders / (product_orders[a] * product_orders[b])
+        top = np.lexsort((-lift, -count))[:limit]
+        return a[top], b[top], count[top], lift[top]
+
+    best_a, best_b, best_count, lift = (np.empty(0, dtype=np.int64),) * 3 + (np.empty(0),)
+    for start in range(0, len(kept), BASKET_BLOCK_SIZE):
+        end = start + BASKET_BLOCK_SIZE
+        # Rows past the block would only give pairs with a > b
+        block = (transposed[:end] @ matrix[:, start:end]).tocoo()
+        a, b = block.row, block.col + start
+        # Each unordered pair once, and the product with itself never
+        keep = (a < b) & (block.data >= min_orders)
+        best_a, best_b, best_count, lift = best(
+            np.concatenate([best_a, a[keep]]),
+            np.concatenate([best_b, b[keep]]),
+            np.concatenate([best_count, block.data[keep]]),
+        )
+
+    count_a = product_orders[best_a]
+    count_b = product_orders[best_b]
+    for i in range(len(best_count)):
+        result["pairs"].append({
+            "product_a": products[kept[best_a[i]]],
+            "product_b": products[kept[best_b[i]]],
+            "orders": int(best_count[i]),
+            "support": round(float(best_count[i]) / total_orders, 4),
+            "confidence_a_to_b": round(float(best_count[i]) / int(count_a[i]), 4),
+            "confidence_b_to_a": round(float(best_count[i]) / int(count_b[i]), 4),
+            "lift": round(float(lift[i]), 4),
+        })
+    return result
@@ -0,0 +1,136 @@
+# backend/core/cache_codec.py
+
+import json
+import os
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional, JSON is always available
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:  # orjson only speeds up the JSON format
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # without zstandard payloads are stored uncompressed
+    zstandard = None
+
+# Serializer names for CACHE_SERIALIZER
+JSON = "json"
+MSGPACK = "msgpack"
+
+# First byte of a payload: the serializer, with COMPRESSED_FLAG set when the rest
+# is a zstd frame. None of them can start a JSON document, so payloads written
+# before the header existed (plain JSON) are still told apart.
+FORMAT_HEADERS = {JSON: 0x01, MSGPACK: 0x02}
+COMPRESSED_FLAG = 0x80
+
+# "msgpack" or "json"; defaults to msgpack when the msgpack package is installed
+CACHE_SERIALIZER = os.getenv("CACHE_SERIALIZER", MSGPACK if msgpack else JSON).lower()
+
+# Serialized payloads at least this large (in bytes) are zstd-compressed; 0 disables it
+CACHE_COMPRESSION_THRESHOLD = int(os.getenv("CACHE_COMPRESSION_THRESHOLD", 2048))
+CACHE_COMPRESSION_LEVEL = 3
+
+def preferred_serializer():
+    """
+    Returns the serializer new payloads are written with, falling back to JSON
+    when msgpack is requested but not installed.
+    """
+    if CACHE_SERIALIZER == MSGPACK and msgpack is None:
+        return JSON
+    return CACHE_SERIALIZER if CACHE_SERIALIZER in FORMAT_HEADERS else JSON
+
+def _json_dumps(value) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # e.g. integers over 64 bits, which the json module handles
+            pass
+    return json.dumps(value).encode("utf-8")
+
+def _json_loads(data: bytes):
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except ValueError:
+            # NaN and Infinity, which only the json module reads
+            pass
+    return json.loads(data)
+
+def dumps(value) -> bytes:
+    """
+    Serializes a value for the cache: a format header byte followed by the
+    serialized value, zstd-compressed when it's large enough to be worth it.
+
+    Raises:
+        TypeError, ValueError: if the value can't be serialized
+    """
+    serializer = preferred_serializer()
+    data = None
+    if serializer == MSGPACK:
+        try:
+            data = msgpack.packb(value, use_bin_type=True)
+        except (TypeError, ValueError, OverflowError):
+            # Types msgpack has no encoding for may still be valid JSON
+            serializer = JSON
+    if data is None:
+        data = _json_dumps(value)
+
+    header = FORMAT_HEADERS[serializer]
+    if zstandard is not None and CACHE_COMPRESSION_THRESHOLD and len(data) >= CACHE_COMPRESSION_THRESHOLD:
+        compressed = zstandard.ZstdCompressor(level=CACHE_COMPRESSION_LEVEL).compress(data)
+        if len(compressed) < len(data):
+            return bytes([header | COMPRESSED_FLAG]) + compressed
+    return bytes([header]) + data
+
+def _split(raw: bytes):
+    """
+    Returns (serializer, compressed, body) of a payload; serializer is None for a
+    header-less (legacy JSON) payload.
+    """
+    header = raw[0] if raw else 0
+    for serializer, code in FORMAT_HEADERS.items():
+        if header & ~COMPRESSED_FLAG == code:
+            return serializer, bool(header & COMPRESSED_FLAG), raw[1:]
+    return None, False, raw
+
+def loads(raw: bytes):
+    """
+    Deserializes a payload written by dumps, or a plain JSON one.
+
+    Raises:
+        ValueError: if the payload is neither, or is corrupt (whatever the
+        decompressor or deserializer raised is chained)
+    """
+    serializer, compressed, body = _split(raw)
+    if compressed and zstandard is None:
+        raise ValueError("Cached payload is zstd-compressed but zstandard is not installed")
+    if serializer == MSGPACK and msgpack is None:
+        raise ValueError("Cached payload is msgpack but msgpack is not installed")
+    try:
+        if compressed:
+            body = zstandard.ZstdDecompressor().decompress(body)
+        if serializer == MSGPACK:
+            return msgpack.unpackb(body, raw=False, strict_map_key=False)
+        return _json_loads(body)
+    except Exception as e:
+        # zstd errors, msgpack's ExtraData/FormatError/StackError, bad UTF-8,
+        # unhashable map keys...: all mean the payload can't be read back
+        raise ValueError(f"Undecodable cache payload: {e!r}") from e
+
+def payload_size(raw: bytes) -> int:
+    """
+    Size of a payload once decompressed, which tracks the memory its value takes
+    better than the stored size.
+    """
+    serializer, compressed, body = _split(raw)
+    if compressed and zstandard is not None:
+        size = zstandard.frame_content_size(body)
+        if size >= 0:
+            return size
+    return len(raw)
@@ -0,0 +1,305 @@
+# backend/core/cache_flight.py
+
+import asyncio
+import math
+import random
+import time
+import uuid
+from core import redis_client as cache
+from core.redis_client import DEFAULT_CACHE_EXPIRY
+
+# Lock held by the one request computing a key; waiters give up on it (and
+# compute themselves) once it expires
+FLIGHT_LOCK_KEY = "cache:flight:lock:{}"
+FLIGHT_LOCK_TIMEOUT = 120  # seconds
+
+# Seconds between checks of the locks a request waits on: the first check
+# comes after FLIGHT_POLL_INTERVAL, doubling up to FLIGHT_POLL_MAX_INTERVAL.
+# Waiting is a sleep on the event loop, so waiters hold no thread or connection.
+FLIGHT_POLL_INTERVAL = 0.05
+FLIGHT_POLL_MAX_INTERVAL = 0.5
+
+# Longest a request waits on other requests' flights before computing the
+# entries itself
+FLIGHT_WAIT_TIMEOUT = 30  # seconds
+
+# XFetch beta: > 1 refreshes earlier, < 1 later
+XFETCH_BETA = 1.0
+
+# RQ task recomputing stale entries in the background (see tasks.refresh_cache_task),
+# and the marker keeping a stale entry from being queued for refresh more than once
+REFRESH_TASK = "tasks.refresh_cache_task"
+REFRESH_MARKER_KEY = "cache:refresh:queued:{}"
+REFRESH_MARKER_TIMEOUT = 300  # seconds
+
+# Deletes the lock only if it still holds our token
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+def should_refresh_early(metadata: dict) -> bool:
+    """
+    XFetch (probabilistic early expiration): the closer an entry is to expiry,
+    and the longer it took to compute, the likelier a read is picked to refresh
+    it. Expiry then rarely happens at all, and when it nears only one of the
+    concurrent readers tends to be picked.
+    """
+    if not metadata.get("expires_at"):
+        return False
+    # 1 - random() lies in (0, 1], so the log is defined
+    gap = -metadata.get("compute_time", 0.0) * XFETCH_BETA * math.log(1.0 - random.random())
+    return time.time() + gap >= metadata["expires_at"]
+
+def is_stale(metadata: dict) -> bool:
+    """
+    Whether an entry is past its soft expiry (entries written before soft expiry
+    existed never are).
+    """
+    return bool(metadata.get("stale_at")) and time.time() >= metadata["stale_at"]
+
+def _queue_refresh(keys, args):
+    """
+    Queues REFRESH_TASK for stale keys, leaving out the keys a refresh is already
+    queued for. args is a function building the task's arguments from the keys
+    left. Failures are only logged, since the stale values are served either way.
+    """
+    try:
+        pipe = cache.redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.set(REFRESH_MARKER_KEY.format(key), 1, nx=True, ex=REFRESH_MARKER_TIMEOUT)
+        keys = [key for key, marked in zip(keys, pipe.execute()) if marked]
+        if keys:
+            from rq import Queue
+            Queue(connection=cache.redis_client, default_timeout=3600).enqueue(REFRESH_TASK, *args(keys))
+    except Exception as e:
+        print(f"Failed to enqueue cache refresh of {list(keys)}: {e}")
+
+def _acquire(key: str):
+    """
+    Takes the flight lock of a key. Returns the lock's token, or None if another
+    request holds it.
+    """
+    token = uuid.uuid4().hex
+    if cache.redis_client.set(FLIGHT_LOCK_KEY.format(key), token, nx=True, ex=FLIGHT_LOCK_TIMEOUT):
+        return token
+    return None
+
+def _acquire_many(keys):
+    """
+    _acquire for several keys in one round trip; a token or None per key.
+    """
+    if not keys:
+        return []
+    tokens = [uuid.uuid4().hex for _ in keys]
+    pipe = cache.redis_client.pipeline(transaction=False)
+    for key, token in zip(keys, tokens):
+        pipe.set(FLIGHT_LOCK_KEY.format(key), token, nx=True, ex=FLIGHT_LOCK_TIMEOUT)
+    return [token if acquired else None for token, acquired in zip(tokens, pipe.execute())]
+
+def _release(key: str, token: str):
+    cache.redis_client.eval(_RELEASE_SCRIPT, 1, FLIGHT_LOCK_KEY.format(key), token)
+
+def _release_many(locks):
+    """
+    _release for several (key, token) pairs in one round trip.
+    """
+    pipe = cache.redis_client.pipeline(transaction=False)
+    for key, token in locks:
+        pipe.eval(_RELEASE_SCRIPT, 1, FLIGHT_LOCK_KEY.format(key), token)
+    pipe.execute()
+
+def _held_locks(keys):
+    """
+    The keys whose flight lock is still held, checked in one round trip.
+    """
+    pipe = cache.redis_client.pipeline(transaction=False)
+    for key in keys:
+        pipe.exists(FLIGHT_LOCK_KEY.format(key))
+    return [key for key, held in zip(keys, pipe.execute()) if held]
+
+async def _wait_for_flights(keys, timeout: float = FLIGHT_WAIT_TIMEOUT):
+    """
+    Waits until the requests holding the keys' locks are done (or the locks
+    expire, or timeout passes), then returns the cache entry each key was left
+    with, or None where there is none. Between checks the request sleeps on the
+    event loop, so however many requests wait, none of them holds an executor
+    thread that the lock holders' cache writes and releases need.
+    """
+    deadline = time.monotonic() + timeout
+    interval = FLIGHT_POLL_INTERVAL
+    pending = list(keys)
+    while True:
+        pending = await asyncio.to_thread(_held_locks, pending)
+        remaining = deadline - time.monotonic()
+        if not pending or remaining <= 0:
+            break
+        await asyncio.sleep(min(interval, remaining))
+        interval = min(interval * 2, FLIGHT_POLL_MAX_INTERVAL)
+    return await asyncio.to_thread(cache.cache_get_many, list(keys))
+
+async def _compute_and_store(key, compute, expiry, tags, token):
+    start = time.monotonic()
+    try:
+        value = await compute()
+        await asyncio.to_thread(
+            cache.cache_set, key, value, expiry, tags=tags, compute_time=time.monotonic() - start
+        )
+        return value
+    finally:
+        if token:
+            await asyncio.to_thread(_release, key, token)
+
+async def get_or_compute(key, compute, expiry=DEFAULT_CACHE_EXPIRY, tags=(), refresh=False, revalidate=None):
+    """
+    Returns the cached value of a key, computing it at most once however many
+    requests ask for it at the same time (single flight): the first request takes
+    a Redis lock on the key and computes, the others wait for its result. Entries
+    are refreshed ahead of expiry by one XFetch-picked request while the others
+    keep getting the cached value.
+
+    With revalidate, an entry past its soft expiry (CACHE_STALE_AFTER) is still
+    returned at once, and a background job recomputes it (stale-while-revalidate);
+    only a missing entry is computed while the request waits.
+
+    Args:
+        key (str): Cache key (see generate_cache_key)
+        compute: Coroutine function returning the value; exceptions propagate
+            to its caller and nothing is cached (an early refresh that fails
+            returns the cached value instead)
+        expiry (int): Expiration time in seconds
+        tags (iterable): Tag sets of the entry (see cache_tags)
+        refresh (bool): Ignore the cached value (refresh_cache=true)
+        revalidate (tuple): Arguments of tasks.refresh_cache_task recomputing the
+            entry: (key prefix, user_id, upload_id, *further key arguments)
+
+    Returns:
+        The cached or computed value
+    """
+    requested_at = time.time()
+    if not refresh:
+        entry = await asyncio.to_thread(cache.cache_get_entry, key)
+        if entry is not None:
+            value, metadata = entry
+            if revalidate and is_stale(metadata):
+                await asyncio.to_thread(_queue_refresh, [key], lambda queued: revalidate)
+                return value
+            if not should_refresh_early(metadata):
+                return value
+            token = await asyncio.to_thread(_acquire, key)
+            if token is None:
+                # Someone is already refreshing it
+                return value
+            try:
+                return await _compute_and_store(key, compute, expiry, tags, token)
+            except Exception as e:
+                # The cached value is still good until it expires
+                print(f"Early refresh of {key} failed, serving the cached value: {e}")
+                return value
+
+    token = await asyncio.to_thread(_acquire, key)
+    if token is None:
+        entry, = await _wait_for_flights([key])
+        # With refresh, only a value stored after the request came in will do
+        if entry is not None and (not refresh or entry[1].get("created_at", 0) >= requested_at):
+            return entry[0]
+        # The computing request failed (or timed out): compute here
+    return await _compute_and_store(key, compute, expiry, tags, token)
+
+async def get_or_compute_many(keys: dict, compute, expiry=DEFAULT_CACHE_EXPIRY, tags=(), refresh=False,
+                              revalidate=None):
+    """
+    get_or_compute for several entries computed together, e.g. one per metric:
+    the cached ones are read in one MGET and only the missing ones are computed,
+    by one call. Each entry has its own flight lock, so requests asking for
+    overlapping sets compute every entry once between them.
+
+    Args:
+        keys (dict): name -> cache key
+        compute: Coroutine function taking a list of names and returning a dict
+            with a value per name; exceptions propagate and nothing is cached,
+            unless only early refreshes failed (their cached values are returned)
+        expiry (int): Expiration time in seconds
+        tags (iterable): Tag sets of the entries (see cache_tags)
+        refresh (bool): Ignore the cached values (refresh_cache=true)
+        revalidate (tuple): As for get_or_compute; the names of the stale entries
+            are passed to the task as a last argument, and refreshed by one job
+
+    Returns:
+        dict: name -> cached or computed value
+    """
+    requested_at = time.time()
+    values = {}
+    tokens = {}
+    early = {}
+    stale = []
+    if not refresh:
+        entries = await asyncio.to_thread(cache.cache_get_many, list(keys.values()))
+        for name, entry in zip(keys, entries):
+            if entry is None:
+                continue
+            value, metadata = entry
+            if revalidate and is_stale(metadata):
+                stale.append(name)
+            elif should_refresh_early(metadata):
+                token = await asyncio.to_thread(_acquire, keys[name])
+                if token is not None:
+                    tokens[name] = token
+                    early[name] = value
+                    continue
+            values[name] = value
+        if stale:
+            names = {keys[name]: name for name in stale}
+            await asyncio.to_thread(
+                _queue_refresh, list(names), lambda queued: (*revalidate, [names[key] for key in queued])
+            )
+
+    missing = [name for name in keys if name not in values and name not in tokens]
+    waiting = []
+    for name, token in zip(missing, await asyncio.to_thread(_acquire_many, [keys[name] for name in missing])):
+        if token is None:
+            waiting.append(name)
+        else:
+            tokens[name] = token
+
+    async def compute_and_store(names, owned):
+        start = time.monotonic()
+        try:
+            try:
+                computed = await compute(names)
+            except Exception as e:
+                # Entries only refreshed early keep their cached values; a
+                # missing one can't be served, so the error propagates
+                if any(name not in early for name in names):
+                    raise
+                print(f"Early refresh of {names} failed, serving the cached values: {e}")
+                values.update((name, early[name]) for name in names)
+                return
+            await asyncio.to_thread(
+                cache.cache_set_many, {keys[name]: computed[name] for name in names}, expiry,
+                tags=tags, compute_time=time.monotonic() - start
+            )
+            values.update((name, computed[name]) for name in names)
+        finally:
+            if owned:
+                await asyncio.to_thread(_release_many, [(keys[name], tokens[name]) for name in owned])
+
+    if tokens:
+        await compute_and_store(list(tokens), list(tokens))
+
+    # Locks held elsewhere are only waited on once ours are released
+    if waiting:
+        entries = await _wait_for_flights([keys[name] for name in waiting])
+        leftover = []
+        for name, entry in zip(waiting, entries):
+            if entry is not None and (not refresh or entry[1].get("created_at", 0) >= requested_at):
+                values[name] = entry[0]
+            else:
+                leftover.append(name)
+        if leftover:
+            # The computing requests failed (or timed out): compute here
+            await compute_and_store(leftover, [])
+
+    return {name: values[name] for name in keys}
@@ -0,0 +1,137 @@
+# backend/core/cache_warming.py
+
+import asyncio
+import datetime
+import os
+from sqlalchemy.orm import Session
+from analytics_engine import run_metrics, cached_metrics, METRIC_CACHE_PREFIX
+from analytics_service import ANALYTICS_REGISTRY
+from ml import TimeSeriesForecaster, StyleForecaster
+from core.redis_client import generate_cache_key, cache_tags
+from core.cache_flight import get_or_compute
+
+# Parameters the projection endpoints default to, i.e. the forecasts the
+# dashboard asks for first
+WARM_FORECAST_DAYS = 30
+WARM_FORECAST_MODEL = "naive"
+
+class NothingToCache(Exception):
+    """
+    Raised by a warmer when its endpoint would answer with an error instead of
+    caching a value (e.g. an upload without orders).
+    """
+
+def _orders_summary(db: Session, user_id: int, upload_id: int):
+    # Same payload as GET /dashboard/orders-summary
+    metrics = ANALYTICS_REGISTRY["orders_summary"]["handler"](db, user_id, upload_id)
+    if not metrics["total_orders"]:
+        raise NothingToCache()
+    return {
+        "upload_id": upload_id,
+        "total_orders": metrics["total_orders"],
+        "total_revenue": metrics["total_revenue"],
+        "average_order_value": metrics["average_order_value"],
+        "generated_at": datetime.datetime.utcnow().isoformat() + "Z"
+    }
+
+def _forecast(forecaster_class):
+    # Same payload as GET /projections/forecast and /projections/style-forecast
+    def compute(db: Session, user_id: int, upload_id: int, days: int, model: str):
+        forecaster = forecaster_class(db, user_id, upload_id)
+        forecaster.load_data()
+        return {
+            "upload_id": upload_id,
+            "days_forecasted": days,
+            "model": model,
+            "generated_at": datetime.datetime.utcnow().isoformat() + "Z",
+            "forecast": forecaster.forecast(days=days, model=model)
+        }
+    return compute
+
+# Cache key prefix -> function computing the payload its endpoint caches, from a
+# session, the user, the upload and the key's further arguments
+CACHED_PAYLOADS = {
+    "dashboard:orders_summary": _orders_summary,
+    "projections:forecast": _forecast(TimeSeriesForecaster),
+    "projections:style-forecast": _forecast(StyleForecaster),
+}
+
+def cache_entries(db: Session, prefix: str, user_id: int, upload_id: int, *args, refresh: bool = False):
+    """
+    Returns the coroutine filling (or, with refresh, recomputing) the cache
+    entries an endpoint reads. For METRIC_CACHE_PREFIX the one further argument
+    is the list of metrics; otherwise args are the key's further arguments.
+    """
+    if prefix == METRIC_CACHE_PREFIX:
+        async def compute_metrics(missing):
+            return run_metrics(db, user_id, upload_id, missing)
+
+        return cached_metrics(user_id, upload_id, args[0], compute_metrics, refresh=refresh)
+
+    compute_value = CACHED_PAYLOADS[prefix]
+
+    async def compute():
+        return compute_value(db, user_id, upload_id, *args)
+
+    cache_key = generate_cache_key(prefix, user_id, upload_id, *args)
+    return get_or_compute(cache_key, compute, tags=cache_tags(user_id, upload_id), refresh=refresh)
+
+# Warmer name -> the cache entries it fills: key prefix and further arguments
+CACHE_WARMERS = {
+    "analytics_full": (METRIC_CACHE_PREFIX, [key for key, info in ANALYTICS_REGISTRY.items() if info["handler"]]),
+    "orders_summary": ("dashboard:orders_summary",),
+    "forecast": ("projections:forecast", WARM_FORECAST_DAYS, WARM_FORECAST_MODEL),
+    "style_forecast": ("projections:style-forecast", WARM_FORECAST_DAYS, WARM_FORECAST_MODEL),
+}
+
+# Comma-separated warmers run after an upload is processed: all of them by
+# default, "none" (or empty) to turn warming off
+CACHE_WARM_METRICS = os.getenv("CACHE_WARM_METRICS", ",".join(CACHE_WARMERS))
+
+def enabled_warmers():
+    """
+    Returns the names of the configured warmers, ignoring unknown ones.
+    """
+    names = [name.strip() for name in CACHE_WARM_METRICS.split(",")]
+    return [name for name in names if name in CACHE_WARMERS]
+
+def warm_upload_cache(db: Session, user_id: int, upload_id: int, metrics=None) -> dict:
+    """
+    Computes and caches what the dashboard shows first for an upload, under the
+    keys its endpoints read, so the first view after processing is a cache hit.
+    Goes through get_or_compute(_many): a user request already computing a key is
+    waited for instead of repeated, and a key that's already cached is left alone.
+
+    Args:
+        db: SQLAlchemy database session
+        user_id: Owner of the upload
+        upload_id: The processed upload
+        metrics: Warmer names (see CACHE_WARMERS); defaults to CACHE_WARM_METRICS
+
+    Returns:
+        dict: warmer name -> "cached", "skipped" or "failed"
+    """
+    statuses = {}
+    for name in (enabled_warmers() if metrics is None else metrics):
+        try:
+            prefix, *args = CACHE_WARMERS[name]
+            asyncio.run(cache_entries(db, prefix, user_id, upload_id, *args))
+            statuses[name] = "cached"
+        except NothingToCache:
+            statuses[name] = "skipped"
+        except Exception as e:
+            # One failing metric shouldn't keep the others from being warmed
+            db.rollback()
+            print(f"Error warming {name} for user {user_id}, upload {upload_id}: {e}")
+            statuses[name] = "failed"
+    return statuses
+
+def refresh_cache_entries(db: Session, prefix: str, user_id: int, upload_id: int, *args):
+    """
+    Recomputes stale cache entries (see get_or_compute's revalidate); the
+    arguments are those of cache_entries.
+    """
+    try:
+        asyncio.run(cache_entries(db, prefix, user_id, upload_id, *args, refresh=True))
+    except NothingToCache:
+        pass
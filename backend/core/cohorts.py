@@ -0,0 +1,197 @@
+# backend/core/cohorts.py
+
+from collections import Counter, defaultdict
+from datetime import date
+from sqlalchemy import delete, insert, text
+from sqlalchemy.orm import Session
+from db import models
+
+# Emails looked up per round trip while folding an upload into the cohort state
+COHORT_BATCH_SIZE = 1000
+
+# Order rows streamed per round trip
+ORDER_BATCH_SIZE = 10000
+
+# First key of the per-user advisory lock serializing cohort updates (Postgres)
+COHORT_LOCK_NAMESPACE = 40
+
+def _month(ts) -> date:
+    return date(ts.year, ts.month, 1)
+
+def _period(cohort_month: date, month: date) -> int:
+    """
+    Whole months between a cohort month and a later activity month.
+    """
+    return (month.year - cohort_month.year) * 12 + month.month - cohort_month.month
+
+def _lock_user(db: Session, user_id: int):
+    """
+    Two workers ingesting uploads of the same user would otherwise race on the
+    user's cohort rows; the lock is released when the transaction ends.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(:ns, :user_id)"),
+                   {"ns": COHORT_LOCK_NAMESPACE, "user_id": user_id})
+
+def _apply_orders(db: Session, user_id: int, rows) -> int:
+    """
+    Folds (email, created_at) rows into the user's cohort state: new customers
+    get a cohort, customers whose first order moved earlier change cohort (their
+    known months move with them), and every customer-month not seen before adds
+    one to its grid cell. Only the emails in rows are read back.
+
+    Returns:
+        int: Number of customers whose state was added or changed
+    """
+    first_seen = {}
+    months = defaultdict(set)
+    for email, created_at in rows:
+        if email is None or created_at is None:
+            continue
+        if email not in first_seen or created_at < first_seen[email]:
+            first_seen[email] = created_at
+        months[email].add(_month(created_at))
+
+    cc = models.CustomerCohort
+    cam = models.CustomerActiveMonth
+    delta = Counter()
+    changed = 0
+    emails = list(first_seen)
+    for start in range(0, len(emails), COHORT_BATCH_SIZE):
+        batch = emails[start:start + COHORT_BATCH_SIZE]
+        states = {
+            state.email: state
+            for state in db.query(cc).filter(cc.user_id == user_id, cc.email.in_(batch))
+        }
+        known = defaultdict(set)
+        for email, month in db.query(cam.email, cam.month).filter(cam.user_id == user_id, cam.email.in_(batch)):
+            known[email].add(month)
+
+        new_states, new_months = [], []
+        for email in batch:
+            first_order_at = first_seen[email]
+            cohort = _month(first_order_at)
+            state = states.get(email)
+            if state is None:
+                new_states.append({"user_id": user_id, "email": email,
+                                   "first_order_at": first_order_at, "cohort_month": cohort})
+                changed += 1
+            elif first_order_at < state.first_order_at:
+                # An older upload landed late: the customer joins an earlier cohort
+                for month in known[email]:
+                    delta[(state.cohort_month, _period(state.cohort_month, month))] -= 1
+                    delta[(cohort, _period(cohort, month))] += 1
+                state.first_order_at = first_order_at
+                state.cohort_month = cohort
+                changed += 1
+            else:
+                cohort = state.cohort_month
+
+            for month in months[email] - known[email]:
+                delta[(cohort, _period(cohort, month))] += 1
+                new_months.append({"user_id": user_id, "email": email, "month": month})
+
+        if new_states:
+            db.execute(insert(cc), new_states)
+        if new_months:
+            db.execute(insert(cam), new_months)
+
+    _apply_delta(db, user_id, delta)
+    return changed
+
+def _apply_delta(db: Session, user_id: int, delta: Counter):
+    """
+    Adds per-(cohort_month, period) customer deltas to the user's grid.
+    """
+    delta = {cell: change for cell, change in delta.items() if change}
+    if not delta:
+        return
+    c = models.CohortCount
+    cells = {
+        (cell.cohort_month, cell.period): cell
+        for cell in db.query(c).filter(
+            c.user_id == user_id,
+            c.cohort_month.in_({cohort for cohort, _ in delta}),
+        )
+    }
+    for (cohort, period), change in delta.items():
+        cell = cells.get((cohort, period))
+        if cell is None:
+            db.add(c(user_id=user_id, cohort_month=cohort, period=period, customers=change))
+        elif cell.customers + change:
+            cell.customers += change
+        else:
+            db.delete(cell)
+
+def update_cohorts(db: Session, user_id: int, upload_id: int) -> int:
+    """
+    Ingestion stage: folds one upload's orders into the user's cohort state and
+    grid. Reads the upload's orders and the stored state of the customers in it,
+    never the user's other orders, so the cost follows the upload's size.
+    Re-ingesting orders already counted leaves the grid unchanged.
+
+    Args:
+        db: SQLAlchemy database session
+        user_id: Owner of the upload
+        upload_id: The newly ingested upload
+
+    Returns:
+        int: Number of customers whose cohort state was added or changed
+    """
+    _lock_user(db, user_id)
+    o = models.Order
+    rows = db.query(o.email, o.created_at).filter(o.user_id == user_id, o.upload_id == upload_id)
+    changed = _apply_orders(db, user_id, rows.yield_per(ORDER_BATCH_SIZE))
+    db.commit()
+    return changed
+
+def rebuild_cohorts(db: Session, user_id: int) -> int:
+    """
+    Recomputes a user's cohort state and grid from all of their remaining orders.
+    Only needed after an upload is deleted: a customer's months can't be
+    subtracted without knowing which other uploads also hold them.
+
+    Returns:
+        int: Number of customers in the rebuilt state
+    """
+    _lock_user(db, user_id)
+    for model in (models.CustomerCohort, models.CustomerActiveMonth, models.CohortCount):
+        db.execute(delete(model).where(model.user_id == user_id))
+    o = models.Order
+    rows = db.query(o.email, o.created_at).filter(o.user_id == user_id)
+    customers = _apply_orders(db, user_id, rows.yield_per(ORDER_BATCH_SIZE))
+    db.commit()
+    return customers
+
+def cohort_retention(db: Session, user_id: int) -> dict:
+    """
+    The user's cohort grid across all of their uploads, read from cohort_counts.
+
+    Returns:
+        dict: periods (the widest cohort's number of periods) and cohorts, each
+        {cohort, customers, retained, retention_rate} where retained[p] counts the
+        cohort's customers who ordered p months after their first order month
+    """
+    c = models.CohortCount
+    grid = defaultdict(dict)
+    for cohort, period, customers in (
+        db.query(c.cohort_month, c.period, c.customers)
+        .filter(c.user_id == user_id)
+        .order_by(c.cohort_month, c.period)
+    ):
+        grid[cohort][period] = customers
+
+    cohorts = []
+    for cohort, cells in grid.items():
+        size = cells.get(0, 0)
+        retained = [cells.get(period, 0) for period in range(max(cells) + 1)]
+        cohorts.append({
+            "cohort": cohort.strftime("%Y-%m"),
+            "customers": size,
+            "retained": retained,
+            "retention_rate": [round(n / size, 4) if size else 0.0 for n in retained],
+        })
+    return {
+        "periods": max((len(row["retained"]) for row in cohorts), default=0),
+        "cohorts": cohorts,
+    }
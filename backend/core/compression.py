@@ -0,0 +1,114 @@
+# backend/core/compression.py
+
+import gzip
+import io
+import os
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, gzip is always available
+    zstandard = None
+
+# Codec names as recorded on Upload.compression (None means stored uncompressed)
+GZIP = "gzip"
+ZSTD = "zstd"
+
+CODEC_EXTENSIONS = {GZIP: ".gz", ZSTD: ".zst"}
+
+# Magic numbers at the start of a compressed stream
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Text formats worth compressing before they go to storage
+COMPRESSIBLE_EXTENSIONS = {"csv", "json"}
+
+def _configured_codec(value: str):
+    """
+    Validates an UPLOAD_COMPRESSION setting, returning the codec it selects or
+    None for no compression. zstd falls back to gzip when zstandard is not
+    installed; an unknown codec disables compression with a warning, rather
+    than failing every upload.
+    """
+    value = value.strip().lower()
+    if value in ("none", ""):
+        return None
+    if value == ZSTD and zstandard is None:
+        print("UPLOAD_COMPRESSION is zstd but zstandard is not installed; using gzip")
+        return GZIP
+    if value not in CODEC_EXTENSIONS:
+        print(f"Unsupported UPLOAD_COMPRESSION '{value}'; storing uploads uncompressed")
+        return None
+    return value
+
+# "zstd", "gzip" or "none"; defaults to zstd when the zstandard package is installed.
+# Validated once at import: the codec new uploads are stored with, or None.
+UPLOAD_COMPRESSION = _configured_codec(os.getenv("UPLOAD_COMPRESSION", ZSTD if zstandard else GZIP))
+
+def preferred_codec():
+    """
+    Returns the codec new uploads are stored with, or None if compression is disabled.
+    """
+    return UPLOAD_COMPRESSION
+
+def split_codec_extension(filename: str):
+    """
+    Splits a trailing compression extension off a file name.
+
+    Returns:
+        tuple: (base file name, codec or None), e.g. ("orders.csv", "gzip") for "orders.csv.gz"
+    """
+    lowered = filename.lower()
+    for codec, extension in CODEC_EXTENSIONS.items():
+        if lowered.endswith(extension):
+            return filename[:-len(extension)], codec
+    return filename, None
+
+def detect_codec(file_path: str):
+    """
+    Sniffs the codec of a file from its magic number.
+    Storage downloads land in extension-less temp files, so the name can't be trusted.
+    """
+    with open(file_path, "rb") as f:
+        header = f.read(4)
+    if header.startswith(GZIP_MAGIC):
+        return GZIP
+    if header.startswith(ZSTD_MAGIC):
+        return ZSTD
+    return None
+
+def compress_bytes(data: bytes, codec: str) -> bytes:
+    """
+    Compresses an in-memory payload with the given codec.
+    """
+    if codec == GZIP:
+        return gzip.compress(data, compresslevel=6)
+    if codec == ZSTD:
+        if zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    raise ValueError(f"Unsupported compression codec: {codec}")
+
+def open_decompressed(file_path: str, codec: str = None):
+    """
+    Opens a file for binary reading, decompressing on the fly.
+    Nothing is decompressed up front, so large uploads are streamed.
+
+    Args:
+        file_path: Local path of the (possibly compressed) file
+        codec: Known codec, or None to sniff it from the file
+    """
+    if codec is None:
+        codec = detect_codec(file_path)
+    if codec is None:
+        return open(file_path, "rb")
+    if codec == GZIP:
+        return gzip.open(file_path, "rb")
+    if codec == ZSTD:
+        if zstandard is None:
+            raise ValueError("Reading zstd files requires the zstandard package")
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            open(file_path, "rb"), read_across_frames=True, closefd=True
+        )
+        # Buffer it so callers get readline() like the other codecs
+        return io.BufferedReader(reader)
+    raise ValueError(f"Unsupported compression codec: {codec}")
@@ -0,0 +1,79 @@
+# backend/core/local_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+class LocalCache:
+    """
+    In-process LRU cache with per-entry TTLs, bounded by the total size of the
+    entries (the length of their serialized form). Used as the first tier in
+    front of Redis (see core/redis_client.py), which keeps it coherent across
+    processes by calling discard() for keys changed elsewhere.
+
+    Values are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.enabled = False
+        # Bumped by every invalidation, so a fill racing with one is dropped
+        self.version = 0
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns (True, value) for a live entry, else (False, None).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            if entry[2] <= time.monotonic():
+                self._remove(key)
+                return False, None
+            self._entries.move_to_end(key)
+            return True, entry[0]
+
+    def put(self, key, value, size: int, ttl: float = None, version: int = None):
+        """
+        Stores a value read from Redis, evicting least recently used entries to
+        stay within max_bytes. Skipped while disabled, for entries larger than
+        max_bytes / 8, and when an invalidation arrived since `version` was read.
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            if not self.enabled or size > self.max_bytes // 8 or ttl <= 0:
+                return
+            if version is not None and version != self.version:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + ttl)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def discard(self, keys):
+        with self._lock:
+            self.version += 1
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+
+    def set_enabled(self, enabled: bool):
+        """
+        Turns the tier on or off; entries are dropped either way, since
+        invalidations may have been missed while it was off.
+        """
+        with self._lock:
+            self.enabled = enabled
+            self.version += 1
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        self.size -= self._entries.pop(key)[1]
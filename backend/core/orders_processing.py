@@ -5,7 +5,12 @@ import pandas as pd
 from datetime import datetime
 from db import models
 from db.database import SessionLocal
+from db.partitions import ensure_upload_partitions
+from core.rollups import build_upload_rollups
+from core.sketch_store import build_upload_sketches
+from core.cohorts import update_cohorts
 from sqlalchemy.orm import Session
+from core.compression import detect_codec, open_decompressed, split_codec_extension
 
 def safe_float(val, default=None):
     """
@@ -44,25 +49,33 @@ def safe_date(val):
     except Exception:
         return None
 
-def read_order_file(file_path: str) -> pd.DataFrame:
+def read_order_file(file_path: str, compression: str = None) -> pd.DataFrame:
     """
     Reads a CSV or other supported file and returns a DataFrame.
+    gzip/zstd compressed files (stored uploads or .csv.gz/.csv.zst from clients)
+    are decompressed on the fly while parsing, with the codec recorded on the
+    upload; it is sniffed from the file only when none was recorded.
     Adjust for Excel/JSON if needed.
     """
+    codec = compression or detect_codec(file_path)
+
     # Try to detect the file type by reading the first few lines
     try:
-        with open(file_path, 'r') as f:
-            first_line = f.readline().strip()
-            # Check if the first line looks like a CSV header
-            if ',' in first_line and 'Name' in first_line and 'Email' in first_line:
-                print(f"Detected CSV file format for {file_path}")
-                return pd.read_csv(file_path, low_memory=False)
+        with open_decompressed(file_path, codec) as f:
+            first_line = f.readline().decode('utf-8', errors='replace').strip()
+        # Check if the first line looks like a CSV header
+        if ',' in first_line and 'Name' in first_line and 'Email' in first_line:
+            print(f"Detected CSV file format for {file_path} (compression: {codec or 'none'})")
+            with open_decompressed(file_path, codec) as f:
+                return pd.read_csv(f, low_memory=False)
     except Exception as e:
         print(f"Error detecting file type: {e}")
     
     # Fall back to extension-based detection
-    if file_path.lower().endswith(".csv"):
-        return pd.read_csv(file_path, low_memory=False)
+    base_name, _ = split_codec_extension(file_path)
+    if base_name.lower().endswith(".csv"):
+        with open_decompressed(file_path, codec) as f:
+            return pd.read_csv(f, low_memory=False)
     # elif file_path.lower().endswith((".xls", ".xlsx")):
     #     return pd.read_excel(file_path)
     # elif file_path.lower().endswith(".json"):
@@ -83,6 +96,8 @@ def process_shopify_file(file_location: str, user_id: int, upload_id: int):
        Each key has a single "order_data" + multiple "line_items".
     2) Bulk insert all orders, fetch their new primary keys.
     3) Bulk insert line items referencing the correct order PK.
+    4) Build the upload's rollups (see core/rollups.py) and fold it into the
+       user's cohort grid (core/cohorts.py).
 
     Also updates Upload.records_processed so the front-end can show progress.
     """
@@ -99,8 +114,12 @@ def process_shopify_file(file_location: str, user_id: int, upload_id: int):
         upload.status = "processing"
         db.commit()
 
-        # 2) Read file -> DataFrame
-        df = read_order_file(file_location)
+        # Give the upload its own orders/line_items partitions before inserting any rows
+        ensure_upload_partitions(db, upload_id)
+
+        # 2) Read file -> DataFrame (uploads from before Upload.compression
+        #    existed have no codec recorded, and are sniffed)
+        df = read_order_file(file_location, compression=upload.compression)
         total_rows = len(df)
         upload.total_rows = total_rows
         db.commit()
@@ -214,6 +233,7 @@ def process_shopify_file(file_location: str, user_id: int, upload_id: int):
                 "lineitem_fulfillment_status": str(row.get("Lineitem fulfillment status") or ""),
                 "lineitem_discount": lineitem_discount,
                 "variant_id": str(row.get("Lineitem sku") or ""),
+                "upload_id": upload_id,
                 "order_id": None,  # We'll fill in later once we know the DB PK
             }
 
@@ -286,7 +306,14 @@ def process_shopify_file(file_location: str, user_id: int, upload_id: int):
             db.commit()
             start_idx += BATCH_SIZE
 
-        # 5) Mark upload as completed
+        # 5) Rollup stage: per-upload aggregates the analytics handlers read from,
+        #    per-day sketches for queries spanning uploads/date ranges, and the
+        #    user's cohort grid
+        build_upload_rollups(db, user_id, upload_id)
+        build_upload_sketches(db, user_id, upload_id)
+        update_cohorts(db, user_id, upload_id)
+
+        # 6) Mark upload as completed
         upload.records_processed = processed
         upload.status = "completed"
         db.commit()
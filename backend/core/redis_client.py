@@ -1,10 +1,14 @@
 # backend/core/redis_client.py
 import os
 import json
+import threading
+import time
 import redis
 from datetime import timedelta
 from urllib.parse import urlparse
 from dotenv import load_dotenv
+from core.local_cache import LocalCache
+from core import cache_codec
 
 # Load environment variables
 load_dotenv()
@@ -39,8 +43,169 @@ else:
     else:
         redis_client = redis.Redis(host=redis_host, port=redis_port, db=redis_db)
 
-# Default cache expiration time (in seconds)
-DEFAULT_CACHE_EXPIRY = 60 * 60 * 6  # 1 hour
+# Default cache expiration time (in seconds). Keys carry generation counters
+# (see generate_cache_key), so entries are invalidated by bumping a counter and
+# the TTL only bounds how long unreachable entries take up memory
+DEFAULT_CACHE_EXPIRY = 60 * 60 * 24 * 7  # 7 days
+
+# Soft expiry: entries older than this are still served, but callers that can
+# recompute them in the background do so (see core/cache_flight.py)
+CACHE_STALE_AFTER = int(os.getenv("CACHE_STALE_AFTER", 60 * 60))
+
+# Generation counters versioning the cache keys of an upload / of entries spanning
+# a user's uploads. They never expire: a reset counter would make entries of an
+# old generation reachable again
+USER_GENERATION_KEY = "cache:generation:user:{}"
+UPLOAD_GENERATION_KEY = "cache:generation:upload:{}"
+
+# Tag sets listing the cache keys written for a user / one of the user's uploads
+USER_TAG_KEY = "cache:tag:user:{}"
+UPLOAD_TAG_KEY = "cache:tag:upload:{}:{}"
+
+# Keys deleted per pipelined round trip when clearing a tag or pattern
+CACHE_DELETE_BATCH_SIZE = 500
+
+# In-process tier in front of Redis (0 bytes disables it). Entries live at most
+# LOCAL_CACHE_TTL seconds there; changes made by any process are published on
+# CACHE_INVALIDATION_CHANNEL and dropped from every process's tier
+LOCAL_CACHE_MAX_BYTES = int(os.getenv("LOCAL_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+LOCAL_CACHE_TTL = int(os.getenv("LOCAL_CACHE_TTL", 60))
+CACHE_INVALIDATION_CHANNEL = "cache:invalidations"
+
+# Seconds between attempts to resubscribe after the invalidation listener lost Redis
+LISTENER_RETRY_SECONDS = 5
+
+local_cache = LocalCache(LOCAL_CACHE_MAX_BYTES, LOCAL_CACHE_TTL)
+_listener_lock = threading.Lock()
+_listener_pid = None
+
+def _listen_for_invalidations():
+    """
+    Listener thread: drops keys changed by any process from this process's tier.
+    The tier is only used while subscribed; whenever the subscription is lost it
+    is switched off (and emptied) until the listener is back.
+    """
+    while True:
+        try:
+            pubsub = redis_client.pubsub()
+            pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+            for message in pubsub.listen():
+                if message["type"] == "subscribe":
+                    local_cache.set_enabled(True)
+                elif message["type"] == "message":
+                    local_cache.discard(json.loads(message["data"]))
+        except Exception as e:
+            print(f"Cache invalidation listener error: {str(e)}")
+        local_cache.set_enabled(False)
+        time.sleep(LISTENER_RETRY_SECONDS)
+
+def _ensure_listener():
+    """
+    Starts the invalidation listener in this process (once per process, so each
+    forked server worker gets its own). Not in RQ jobs: each runs in a work-horse
+    fork that exits after a few cache reads, so every job would pay for a thread
+    and a subscription the tier never earns back; there it stays disabled and
+    reads go to Redis.
+    """
+    global _listener_pid
+    if not LOCAL_CACHE_MAX_BYTES or _listener_pid == os.getpid():
+        return
+    from rq import get_current_job
+    if get_current_job() is not None:
+        return
+    with _listener_lock:
+        if _listener_pid != os.getpid():
+            local_cache.set_enabled(False)
+            threading.Thread(target=_listen_for_invalidations, name="cache-invalidations", daemon=True).start()
+            _listener_pid = os.getpid()
+
+def _publish_invalidation(keys, pipe=None):
+    """
+    Drops keys from this process's tier and tells the other processes to do the same.
+    When a pipeline is given, the message is queued on it.
+    """
+    keys = [key.decode("utf-8") if isinstance(key, bytes) else key for key in keys]
+    if not keys:
+        return
+    local_cache.discard(keys)
+    (pipe or redis_client).publish(CACHE_INVALIDATION_CHANNEL, json.dumps(keys))
+
+# Key of the metadata stored alongside each value by cache_set
+ENTRY_METADATA = "__cache_entry__"
+
+def _decode_entry(raw):
+    """
+    Splits a stored payload into (value, metadata); entries written before
+    metadata existed (or by other code) have empty metadata. Payloads of any
+    format core.cache_codec reads are accepted, including plain JSON. Returns
+    None for a payload that can't be decoded, which callers treat as a miss
+    (the recomputed value then overwrites it).
+    """
+    try:
+        data = cache_codec.loads(raw)
+    except ValueError as e:
+        print(f"Ignoring undecodable cache entry: {e}")
+        return None
+    if isinstance(data, dict) and ENTRY_METADATA in data:
+        return data["value"], data[ENTRY_METADATA]
+    return data, {}
+
+def cache_get_entry(key):
+    """
+    Get a value from the cache with its metadata: from this process's tier when it
+    holds the key, otherwise from Redis (and then kept in the local tier).
+
+    Args:
+        key (str): The cache key
+
+    Returns:
+        tuple: (value, metadata) where metadata has created_at, stale_at,
+        expires_at (epoch seconds) and compute_time (seconds the value took to
+        compute), or None if the key isn't cached
+    """
+    _ensure_listener()
+    found, entry = local_cache.get(key)
+    if found:
+        return entry
+
+    version = local_cache.version
+    raw = redis_client.get(key)
+    if not raw:
+        return None
+    entry = _decode_entry(raw)
+    if entry is not None:
+        local_cache.put(key, entry, cache_codec.payload_size(raw), version=version)
+    return entry
+
+def cache_get_many(keys):
+    """
+    Get several values with their metadata: the keys this process's tier doesn't
+    hold are read from Redis in one MGET.
+
+    Args:
+        keys (list): The cache keys
+
+    Returns:
+        list: (value, metadata) or None per key, as cache_get_entry returns them
+    """
+    _ensure_listener()
+    entries = []
+    missing = []
+    for i, key in enumerate(keys):
+        found, entry = local_cache.get(key)
+        entries.append(entry if found else None)
+        if not found:
+            missing.append(i)
+    if not missing:
+        return entries
+
+    version = local_cache.version
+    for i, raw in zip(missing, redis_client.mget([keys[i] for i in missing])):
+        entry = _decode_entry(raw) if raw else None
+        if entry is not None:
+            entries[i] = entry
+            local_cache.put(keys[i], entry, cache_codec.payload_size(raw), version=version)
+    return entries
 
 def cache_get(key):
     """
@@ -50,34 +215,68 @@ def cache_get(key):
         key (str): The cache key
         
     Returns:
-        The cached value (deserialized from JSON) or None if not found
+        The cached value (deserialized) or None if not found
     """
-    value = redis_client.get(key)
-    if value:
-        try:
-            return json.loads(value)
-        except json.JSONDecodeError:
-            return value.decode('utf-8')
-    return None
+    entry = cache_get_entry(key)
+    return entry[0] if entry else None
 
-def cache_set(key, value, expiry=DEFAULT_CACHE_EXPIRY):
+def cache_set(key, value, expiry=DEFAULT_CACHE_EXPIRY, tags=(), compute_time=0.0):
     """
     Set a value in the cache.
     
     Args:
         key (str): The cache key
-        value: The value to cache (will be serialized to JSON)
+        value: The value to cache (serialized by core.cache_codec, e.g. msgpack,
+            compressed when large)
         expiry (int): Expiration time in seconds
+        tags (iterable): Tag sets to register the key in (see cache_tags), so
+            cache_clear_tag can find it without scanning the keyspace
+        compute_time (float): Seconds the value took to compute, used to refresh
+            expensive entries early (see core/cache_flight.py)
         
     Returns:
         bool: True if successful, False otherwise
     """
-    try:
-        serialized = json.dumps(value)
-        return redis_client.setex(key, expiry, serialized)
-    except (TypeError, ValueError):
-        # If value can't be JSON serialized, don't cache it
-        return False
+    return cache_set_many({key: value}, expiry, tags=tags, compute_time=compute_time) == 1
+
+def cache_set_many(values, expiry=DEFAULT_CACHE_EXPIRY, tags=(), compute_time=0.0):
+    """
+    Set several values in one round trip; see cache_set for the arguments.
+    Values that can't be serialized are skipped.
+
+    Args:
+        values (dict): Cache key -> value
+
+    Returns:
+        int: Number of values stored
+    """
+    now = time.time()
+    metadata = {
+        "created_at": now,
+        "stale_at": now + min(CACHE_STALE_AFTER, expiry),
+        "expires_at": now + expiry,
+        "compute_time": compute_time,
+    }
+    serialized = {}
+    for key, value in values.items():
+        try:
+            serialized[key] = cache_codec.dumps({ENTRY_METADATA: metadata, "value": value})
+        except (TypeError, ValueError, OverflowError):
+            # If value can't be serialized, don't cache it
+            continue
+    if not serialized:
+        return 0
+
+    pipe = redis_client.pipeline(transaction=False)
+    for key, payload in serialized.items():
+        pipe.setex(key, expiry, payload)
+    for tag in tags:
+        pipe.sadd(tag, *serialized)
+        # A tag set lives as long as the newest entry registered in it
+        pipe.expire(tag, expiry)
+    # Other processes may hold an older value of the keys (refresh_cache rewrites keys)
+    _publish_invalidation(list(serialized), pipe)
+    return sum(1 for stored in pipe.execute()[:len(serialized)] if stored)
 
 def cache_delete(key):
     """
@@ -89,11 +288,75 @@ def cache_delete(key):
     Returns:
         int: Number of keys deleted
     """
-    return redis_client.delete(key)
+    deleted = redis_client.delete(key)
+    _publish_invalidation([key])
+    return deleted
+
+def cache_tag(user_id, upload_id=None):
+    """
+    Tag set of a user's cached entries, or of those computed from one of their
+    uploads. The user is part of the upload tag, so a user can only ever clear
+    their own entries.
+    """
+    if upload_id is None:
+        return USER_TAG_KEY.format(user_id)
+    return UPLOAD_TAG_KEY.format(user_id, upload_id)
+
+def cache_tags(user_id, upload_id=None):
+    """
+    Tag sets to register an entry computed from a user's data (and from one upload) in.
+
+    Returns:
+        list: Tag set keys to pass to cache_set
+    """
+    tags = [cache_tag(user_id)]
+    if upload_id is not None:
+        tags.append(cache_tag(user_id, upload_id))
+    return tags
+
+def _delete_in_batches(keys):
+    """
+    Deletes keys from an iterator in pipelined batches of CACHE_DELETE_BATCH_SIZE,
+    so no single command holds Redis for long. Returns the number deleted.
+    """
+    deleted = 0
+    batch = []
+    pipe = redis_client.pipeline(transaction=False)
+    for key in keys:
+        batch.append(key)
+        if len(batch) >= CACHE_DELETE_BATCH_SIZE:
+            pipe.delete(*batch)
+            _publish_invalidation(batch, pipe)
+            deleted += pipe.execute()[0]
+            batch = []
+    if batch:
+        pipe.delete(*batch)
+        _publish_invalidation(batch, pipe)
+        deleted += pipe.execute()[0]
+    return deleted
+
+def cache_clear_tag(tag):
+    """
+    Delete every key registered in a tag set, and the set itself.
+
+    Args:
+        tag (str): Tag set key (see cache_tag)
+
+    Returns:
+        int: Number of cached entries deleted, or None if the tag set doesn't
+        exist (nothing tagged was cached, or only entries from before tagging)
+    """
+    if not redis_client.exists(tag):
+        return None
+    deleted = _delete_in_batches(redis_client.sscan_iter(tag, count=CACHE_DELETE_BATCH_SIZE))
+    redis_client.delete(tag)
+    return deleted
 
 def cache_clear_pattern(pattern):
     """
-    Delete all keys matching a pattern.
+    Delete all keys matching a pattern. Walks the keyspace with a SCAN cursor
+    instead of KEYS, so Redis keeps serving other clients meanwhile; prefer
+    cache_clear_tag for entries written with tags.
     
     Args:
         pattern (str): Pattern to match (e.g., "user:*:analytics")
@@ -101,20 +364,88 @@ def cache_clear_pattern(pattern):
     Returns:
         int: Number of keys deleted
     """
-    keys = redis_client.keys(pattern)
-    if keys:
-        return redis_client.delete(*keys)
-    return 0
+    return _delete_in_batches(redis_client.scan_iter(match=pattern, count=CACHE_DELETE_BATCH_SIZE))
+
+def get_generations(user_id, upload_id=None):
+    """
+    Current generation counters of a user and an upload (one round trip).
 
-def generate_cache_key(prefix, *args):
+    Returns:
+        tuple: (user generation, upload generation), 0 for counters never bumped
+        (and for the upload's when upload_id is None)
+    """
+    keys = [USER_GENERATION_KEY.format(user_id)]
+    if upload_id is not None:
+        keys.append(UPLOAD_GENERATION_KEY.format(upload_id))
+    _ensure_listener()
+    cached = [local_cache.get(key) for key in keys]
+    if all(found for found, _ in cached):
+        generations = [value for _, value in cached]
+    else:
+        version = local_cache.version
+        generations = [int(value or 0) for value in redis_client.mget(keys)]
+        for key, generation in zip(keys, generations):
+            local_cache.put(key, generation, 8, version=version)
+    if upload_id is None:
+        generations.append(0)
+    return tuple(generations)
+
+def bump_generation(user_id=None, upload_id=None):
+    """
+    Invalidates the cached entries of an upload and/or those spanning a user's
+    uploads in O(1): keys built afterwards carry the new generation, and entries
+    of the old one are never read again (they expire on their own).
+
+    Args:
+        user_id (int): Bump the user's counter (entries computed across the
+            user's uploads, e.g. cohort retention; not the per-upload ones)
+        upload_id (int): Bump the upload's counter (entries of that upload)
     """
-    Generate a cache key from a prefix and arguments.
+    keys = []
+    if user_id is not None:
+        keys.append(USER_GENERATION_KEY.format(user_id))
+    if upload_id is not None:
+        keys.append(UPLOAD_GENERATION_KEY.format(upload_id))
+    pipe = redis_client.pipeline(transaction=False)
+    for key in keys:
+        pipe.incr(key)
+    _publish_invalidation(keys, pipe)
+    pipe.execute()
+
+def _key_generation(user_id, upload_id):
+    """
+    The generation a key carries: the upload's for an entry of one upload, the
+    user's for an entry spanning the user's uploads (upload_id None). Ingesting
+    or deleting an upload then leaves the user's other uploads cached.
+    """
+    user_generation, upload_generation = get_generations(user_id, upload_id)
+    return user_generation if upload_id is None else upload_generation
+
+def generate_cache_key(prefix, user_id, upload_id, *args):
+    """
+    Generate a cache key from a prefix, the user and upload the entry belongs to,
+    and any further arguments. The upload's current generation (the user's, for
+    entries spanning uploads) is appended, so bump_generation invalidates the entry.
     
     Args:
         prefix (str): The prefix for the key
+        user_id (int): Owner of the cached data
+        upload_id (int): Upload the cached data is computed from (None if several)
         *args: Additional arguments to include in the key
         
     Returns:
-        str: The generated cache key
+        str: The generated cache key, e.g. "analytics:full:1:2:g3"
+    """
+    parts = [user_id, upload_id, *args]
+    return f"{prefix}:{':'.join(str(arg) for arg in parts)}:g{_key_generation(user_id, upload_id)}"
+
+def generate_cache_keys(prefix, user_id, upload_id, names):
+    """
+    Keys of several entries differing only in their last argument (e.g. one per
+    metric), built with a single generation lookup.
+
+    Returns:
+        dict: name -> key, as generate_cache_key(prefix, user_id, upload_id, name)
     """
-    return f"{prefix}:{':'.join(str(arg) for arg in args)}"
+    generation = _key_generation(user_id, upload_id)
+    return {name: f"{prefix}:{user_id}:{upload_id}:{name}:g{generation}" for name in names}
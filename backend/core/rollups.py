@@ -0,0 +1,128 @@
+# backend/core/rollups.py
+
+from sqlalchemy import select, insert, delete, literal, func, case, text
+from sqlalchemy.orm import Session
+from db import models
+
+# Sections of the fused analytics query persisted as upload_rollups rows (see analytics_engine.py)
+ROLLUP_DIMENSIONS = {"total", "day", "hour", "dow", "city", "discount_code", "product"}
+
+# Column order matches the fused query's SectionRow, after user_id/upload_id
+UPLOAD_ROLLUP_COLUMNS = (
+    "user_id", "upload_id", "dimension", "key_ts", "key_text", "key_int",
+    "order_count", "revenue", "revenue_rows", "discount_amount", "discount_rows",
+)
+
+def _rollup_cache(db: Session) -> dict:
+    """
+    Per-session memo of which uploads have rollups, so the handlers serving one
+    request don't each look it up again.
+    """
+    return db.info.setdefault("upload_rollups", {})
+
+def has_rollups(db: Session, user_id: int, upload_id: int) -> bool:
+    """
+    True when the upload's rollups were built. Every built upload has a "total" row,
+    even when it holds no orders; uploads ingested before rollups existed have none.
+    """
+    cache = _rollup_cache(db)
+    if (user_id, upload_id) not in cache:
+        cache[(user_id, upload_id)] = bool(db.query(
+            rollup_query(db, user_id, upload_id, "total", models.UploadRollup.id).exists()
+        ).scalar())
+    return cache[(user_id, upload_id)]
+
+def rollup_query(db: Session, user_id: int, upload_id: int, dimension: str, *columns):
+    """
+    Query selecting columns from the rollup rows of one dimension of an upload.
+    """
+    return db.query(*columns).filter(
+        models.UploadRollup.user_id == user_id,
+        models.UploadRollup.upload_id == upload_id,
+        models.UploadRollup.dimension == dimension,
+    )
+
+def customer_counts(db: Session, user_id: int, upload_id: int):
+    """
+    Returns (unique customers, customers with 2+ orders) from customer_rollups.
+    As with count(DISTINCT email), orders without an email belong to no customer,
+    so their group counts neither as a unique nor as a repeat customer.
+    """
+    unique_count, repeat_count = db.query(
+        func.count(models.CustomerRollup.email),
+        func.sum(case((models.CustomerRollup.order_count >= 2, 1), else_=0)),
+    ).filter(
+        models.CustomerRollup.user_id == user_id,
+        models.CustomerRollup.upload_id == upload_id,
+        models.CustomerRollup.email.isnot(None),
+    ).one()
+    return unique_count or 0, int(repeat_count or 0)
+
+def load_section_rows(db: Session, user_id: int, upload_id: int) -> list:
+    """
+    Reads an upload's rollups back as rows of the fused analytics query, so the
+    engine can assemble metrics from them without touching orders/line_items.
+    """
+    r = models.UploadRollup
+    rows = db.query(
+        r.dimension, r.key_ts, r.key_text, r.key_int,
+        r.order_count, r.revenue, r.revenue_rows, r.discount_amount, r.discount_rows,
+    ).filter(r.user_id == user_id, r.upload_id == upload_id).all()
+
+    unique_count, repeat_count = customer_counts(db, user_id, upload_id)
+    rows.append(("customers", None, None, None, unique_count, None, repeat_count, None, None))
+    return rows
+
+def delete_upload_rollups(db: Session, upload_id: int):
+    """
+    Removes an upload's rollups (without committing).
+    """
+    for model in (models.UploadRollup, models.CustomerRollup):
+        db.execute(delete(model).where(model.upload_id == upload_id))
+    _rollup_cache(db).clear()
+
+def build_upload_rollups(db: Session, user_id: int, upload_id: int) -> bool:
+    """
+    Final ingestion stage: aggregates the upload's orders and line items into
+    upload_rollups and customer_rollups, replacing any earlier rollups of the upload.
+
+    The per-customer rollup is plain SQL. The other dimensions reuse the fused
+    analytics query (GROUPING SETS over date_trunc etc.), so they are only built
+    on Postgres; elsewhere the handlers keep reading raw rows.
+
+    Args:
+        db: SQLAlchemy database session
+        user_id: Owner of the upload
+        upload_id: The upload to aggregate
+
+    Returns:
+        bool: True if the order-level rollups were built
+    """
+    delete_upload_rollups(db, upload_id)
+
+    o = models.Order
+    db.execute(
+        insert(models.CustomerRollup).from_select(
+            ["user_id", "upload_id", "email", "order_count", "revenue", "first_order_at", "last_order_at"],
+            select(
+                literal(user_id), literal(upload_id), o.email,
+                func.count(o.id), func.sum(o.total), func.min(o.created_at), func.max(o.created_at),
+            )
+            .where(o.user_id == user_id, o.upload_id == upload_id)
+            .group_by(o.email),
+        )
+    )
+
+    built = db.get_bind().dialect.name == "postgresql"
+    if built:
+        # Imported here: analytics_engine imports the registry, whose handlers import this module
+        from analytics_engine import build_fused_query
+        db.execute(
+            text(
+                f"INSERT INTO upload_rollups ({', '.join(UPLOAD_ROLLUP_COLUMNS)}) "
+                f"SELECT :user_id, :upload_id, f.* FROM ({build_fused_query(ROLLUP_DIMENSIONS)}) AS f"
+            ),
+            {"user_id": user_id, "upload_id": upload_id},
+        )
+    db.commit()
+    return built
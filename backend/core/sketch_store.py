@@ -0,0 +1,278 @@
+# backend/core/sketch_store.py
+
+from collections import Counter, defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional
+from sqlalchemy import and_, delete, func
+from sqlalchemy.orm import Session
+from db import models
+from db.async_database import run_blocking
+from core.sketches import HyperLogLog, TopK, KLL
+
+# Rows streamed per round trip while sketching an upload
+SKETCH_BATCH_SIZE = 10000
+
+# Top-K dimensions served from sketches -> name of their sketches
+TOPK_DIMENSIONS = {
+    "products": "product_quantity",            # units sold
+    "cities": "city_orders",                   # orders shipped to the city
+    "discount_codes": "discount_code_orders",  # orders using the code
+}
+
+# Distributions served from quantile sketches -> name of their sketches
+QUANTILE_DISTRIBUTIONS = {
+    "order_total": "order_total",   # order value
+    "basket_size": "basket_size",   # units per order (orders with line items)
+}
+
+# Quantiles reported for each distribution
+QUANTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+
+def delete_upload_sketches(db: Session, upload_id: int):
+    """
+    Removes an upload's sketches (without committing).
+    """
+    db.execute(delete(models.UploadSketch).where(models.UploadSketch.upload_id == upload_id))
+
+def _valid_text(value) -> bool:
+    """
+    Same rule as the top-N handlers: empty, null and 'nan' values don't count.
+    """
+    return value not in (None, "", "nan")
+
+def build_upload_sketches(db: Session, user_id: int, upload_id: int) -> int:
+    """
+    Ingestion stage run after the rollups: streams the upload's orders and line
+    items once and stores per order day a HyperLogLog of customer emails, top-K
+    summaries of cities, discount codes and product quantities, and KLL sketches
+    of order totals and basket sizes, replacing any earlier sketches of the upload.
+
+    Args:
+        db: SQLAlchemy database session
+        user_id: Owner of the upload
+        upload_id: The upload to sketch
+
+    Returns:
+        int: Number of sketches written
+    """
+    delete_upload_sketches(db, upload_id)
+    o = models.Order
+    li = models.LineItem
+
+    emails_by_day = defaultdict(HyperLogLog)
+    pending = defaultdict(list)
+    counts = {name: defaultdict(Counter) for name in TOPK_DIMENSIONS.values()}
+    totals_by_day = defaultdict(KLL)
+    baskets = {}  # order id -> [day, units]
+
+    orders = (
+        db.query(o.created_at, o.email, o.shipping_city, o.discount_code, o.total)
+        .filter(o.user_id == user_id, o.upload_id == upload_id)
+        .yield_per(SKETCH_BATCH_SIZE)
+    )
+    for created_at, email, city, code, total in orders:
+        day = created_at.date() if created_at else None
+        if total is not None:
+            totals_by_day[day].update((total,))
+        if _valid_text(city):
+            counts["city_orders"][day][city] += 1
+        if _valid_text(code):
+            counts["discount_code_orders"][day][code] += 1
+        if email is None:
+            continue
+        pending[day].append(email)
+        if len(pending[day]) >= SKETCH_BATCH_SIZE:
+            emails_by_day[day].update(pending.pop(day))
+    for day, emails in pending.items():
+        emails_by_day[day].update(emails)
+
+    line_items = (
+        db.query(o.id, o.created_at, li.lineitem_name, li.lineitem_quantity)
+        .join(o, and_(li.order_id == o.id, li.upload_id == o.upload_id))
+        .filter(o.user_id == user_id, o.upload_id == upload_id)
+        .yield_per(SKETCH_BATCH_SIZE)
+    )
+    for order_id, created_at, product, quantity in line_items:
+        day = created_at.date() if created_at else None
+        baskets.setdefault(order_id, [day, 0])[1] += quantity or 0
+        if product is not None and quantity:
+            counts["product_quantity"][day][product] += quantity
+
+    baskets_by_day = defaultdict(list)
+    for day, units in baskets.values():
+        baskets_by_day[day].append(units)
+
+    sketches = [("hll", "customer_email", day, sketch) for day, sketch in emails_by_day.items()]
+    for name, by_day in counts.items():
+        sketches.extend(("topk", name, day, TopK.from_counts(c)) for day, c in by_day.items())
+    sketches.extend(("kll", "order_total", day, sketch) for day, sketch in totals_by_day.items())
+    sketches.extend(("kll", "basket_size", day, KLL().update(units)) for day, units in baskets_by_day.items())
+
+    db.add_all(
+        models.UploadSketch(
+            user_id=user_id, upload_id=upload_id, day=day,
+            kind=kind, name=name, payload=sketch.to_bytes(),
+        )
+        for kind, name, day, sketch in sketches
+    )
+    db.commit()
+    return len(sketches)
+
+def load_sketches(
+    db: Session,
+    user_id: int,
+    name: str,
+    upload_ids: Optional[List[int]] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+) -> list:
+    """
+    Payloads of the user's sketches of `name` within a window. Without a date
+    range, sketches of orders without a date are included too.
+
+    Args:
+        upload_ids: Uploads to include (default: all of the user's uploads)
+        start_date / end_date: Inclusive day range (either end may be open)
+
+    Returns:
+        list of payload bytes
+    """
+    s = models.UploadSketch
+    query = db.query(s.payload).filter(s.user_id == user_id, s.name == name)
+    if upload_ids:
+        query = query.filter(s.upload_id.in_(upload_ids))
+    if start_date:
+        query = query.filter(s.day >= start_date)
+    if end_date:
+        query = query.filter(s.day <= end_date)
+    # A fixed merge order keeps results reproducible
+    return [payload for (payload,) in query.order_by(s.id).all()]
+
+def _merge(sketch_class, payloads):
+    merged = sketch_class()
+    for payload in payloads:
+        merged.merge(sketch_class.from_bytes(payload))
+    return merged
+
+def merge_sketches(sketch_class, payloads):
+    """
+    Merges sketch payloads into one sketch. Merging is CPU work, so it runs off
+    the event loop when called on an AsyncSession.
+    """
+    return run_blocking(_merge, sketch_class, payloads)
+
+def exact_distinct_customers(
+    db: Session,
+    user_id: int,
+    upload_ids: Optional[List[int]] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+) -> int:
+    """
+    count(DISTINCT email) over the raw orders of a window, for callers that need
+    the exact figure.
+    """
+    o = models.Order
+    query = db.query(func.count(func.distinct(o.email))).filter(o.user_id == user_id)
+    if upload_ids:
+        query = query.filter(o.upload_id.in_(upload_ids))
+    if start_date:
+        query = query.filter(o.created_at >= datetime.combine(start_date, time.min))
+    if end_date:
+        query = query.filter(o.created_at < datetime.combine(end_date + timedelta(days=1), time.min))
+    return query.scalar() or 0
+
+def distinct_customers(
+    db: Session,
+    user_id: int,
+    upload_ids: Optional[List[int]] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    exact: bool = False,
+) -> dict:
+    """
+    Distinct customers (emails) over any set of uploads and day range, estimated by
+    merging the per-day sketches, or counted from the raw orders when exact=True.
+
+    Returns:
+        dict: distinct_customers, approximate, and the estimate's relative
+        standard error (0 for exact counts)
+    """
+    if exact:
+        return {
+            "distinct_customers": exact_distinct_customers(db, user_id, upload_ids, start_date, end_date),
+            "approximate": False,
+            "relative_error": 0.0,
+        }
+
+    merged = merge_sketches(
+        HyperLogLog, load_sketches(db, user_id, "customer_email", upload_ids, start_date, end_date)
+    )
+    return {
+        "distinct_customers": int(round(merged.count())),
+        "approximate": True,
+        "relative_error": round(float(merged.relative_error), 4),
+    }
+
+def top_k(
+    db: Session,
+    user_id: int,
+    dimension: str,
+    limit: int = 5,
+    upload_ids: Optional[List[int]] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+) -> dict:
+    """
+    Top items of a TOPK_DIMENSIONS dimension over any set of uploads and day range,
+    by merging the per-day top-K summaries.
+
+    Returns:
+        dict: items as {value, count, error} where the true count lies in
+        [count - error, count], and max_untracked_count bounding any item not listed
+    """
+    merged = merge_sketches(
+        TopK, load_sketches(db, user_id, TOPK_DIMENSIONS[dimension], upload_ids, start_date, end_date)
+    )
+    return {
+        "items": [
+            {"value": value, "count": count, "error": error}
+            for value, count, error in merged.top(limit)
+        ],
+        "max_untracked_count": merged.floor,
+    }
+
+def quantile_summary(
+    db: Session,
+    user_id: int,
+    upload_ids: Optional[List[int]] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    bins: int = 10,
+) -> dict:
+    """
+    Quantiles (QUANTILES) and an equal-width histogram of each QUANTILE_DISTRIBUTIONS
+    distribution over any set of uploads and day range, by merging the per-day KLL
+    sketches. The work depends on the number of sketches merged, not on the number
+    of orders.
+
+    Returns:
+        dict: per distribution {count, min, max, quantiles, histogram}, plus
+        rank_error, the normalized rank error every quantile and bin boundary is
+        within (99% confidence)
+    """
+    result = {}
+    for distribution, name in QUANTILE_DISTRIBUTIONS.items():
+        merged = merge_sketches(KLL, load_sketches(db, user_id, name, upload_ids, start_date, end_date))
+        result[distribution] = {
+            "count": merged.n,
+            "min": merged.min if merged.n else None,
+            "max": merged.max if merged.n else None,
+            "quantiles": dict(zip(QUANTILES, merged.quantiles(QUANTILES.values()))),
+            "histogram": [
+                {"lower": round(lower, 4), "upper": round(upper, 4), "count": count}
+                for lower, upper, count in merged.histogram(bins)
+            ],
+        }
+    result["rank_error"] = round(KLL().rank_error, 4)
+    return result
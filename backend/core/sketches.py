@@ -0,0 +1,324 @@
+# backend/core/sketches.py
+
+import hashlib
+import json
+import math
+import struct
+import zlib
+import numpy as np
+
+# 2**12 registers: 4 KB per sketch before compression, ~1.6% relative standard error
+HLL_PRECISION = 12
+
+# Counters kept per top-K summary; dashboards show the top 5-10 of these
+TOPK_CAPACITY = 100
+
+# KLL accuracy parameter: ~1.65% normalized rank error for k=200 (see KLL.rank_error)
+KLL_K = 200
+# Capacity ratio between consecutive KLL compactors
+KLL_C = 2.0 / 3.0
+
+def hash64(value) -> int:
+    """
+    Stable 64-bit hash of a value's string form. Sketches built months apart must
+    agree on it, so it can't be Python's per-process salted hash().
+    """
+    return int.from_bytes(hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest(), "big")
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct-value counter (Flajolet et al., 2007) over 64-bit hashes.
+
+    Two sketches of the same precision merge by taking the register-wise maximum,
+    giving exactly the sketch of the union of their inputs, so per-day sketches can
+    be combined into any window. The relative standard error of count() is
+    1.04 / sqrt(2**precision).
+    """
+
+    def __init__(self, precision: int = HLL_PRECISION, registers: np.ndarray = None):
+        if not 4 <= precision <= 16:
+            raise ValueError("HyperLogLog precision must be between 4 and 16")
+        self.precision = precision
+        self.registers = registers if registers is not None else np.zeros(1 << precision, dtype=np.uint8)
+
+    @property
+    def relative_error(self) -> float:
+        """
+        Relative standard error of count().
+        """
+        return 1.04 / np.sqrt(len(self.registers))
+
+    def add_hashes(self, hashes: np.ndarray):
+        """
+        Adds 64-bit hashes (numpy uint64). The top `precision` bits select a register;
+        the register keeps the max position of the first 1-bit in the remaining bits.
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if not len(hashes):
+            return self
+        width = 64 - self.precision
+        index = (hashes >> np.uint64(width)).astype(np.intp)
+        rest = hashes & np.uint64((1 << width) - 1)
+        # width <= 60 bits, but frexp needs an exact float: below 2**53 is exact, and a
+        # rounded value above that still has the right exponent except at 2**k - 1,
+        # where the first 1-bit is 53+ positions deep and rank is capped anyway
+        _, bit_length = np.frexp(rest.astype(np.float64))
+        rank = np.where(rest == 0, width + 1, width - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def update(self, values):
+        """
+        Adds values (hashed with hash64).
+        """
+        return self.add_hashes(np.fromiter((hash64(v) for v in values), dtype=np.uint64))
+
+    def merge(self, other: "HyperLogLog"):
+        """
+        Folds another sketch into this one (in place).
+        """
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> float:
+        """
+        Estimated number of distinct values added.
+        """
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction: linear counting is more accurate here
+            return float(m * np.log(m / zeros))
+        return float(estimate)
+
+    def to_bytes(self) -> bytes:
+        """
+        Compact form for storage: the precision, then the zlib-compressed registers.
+        """
+        return bytes([self.precision]) + zlib.compress(self.registers.tobytes())
+
+    @classmethod
+    def from_bytes(cls, payload: bytes) -> "HyperLogLog":
+        registers = np.frombuffer(zlib.decompress(payload[1:]), dtype=np.uint8).copy()
+        return cls(precision=payload[0], registers=registers)
+
+class TopK:
+    """
+    Mergeable Space-Saving heavy-hitter summary (Metwally et al., 2005; merge rule
+    from Agarwal et al., "Mergeable Summaries", 2012).
+
+    Keeps at most `capacity` items with an upper-bound count and an error: an item's
+    true count lies in [count - error, count]. `floor` bounds the true count of any
+    item that isn't tracked.
+    """
+
+    def __init__(self, capacity: int = TOPK_CAPACITY, counts: dict = None, floor: float = 0):
+        self.capacity = capacity
+        self.counts = counts or {}  # item -> [count, error]
+        self.floor = floor
+
+    @classmethod
+    def from_counts(cls, counts: dict, capacity: int = TOPK_CAPACITY) -> "TopK":
+        """
+        Summary of exact counts (e.g. one upload-day's Counter): the top `capacity`
+        items with no error, the largest dropped count as the floor.
+        """
+        ranked = sorted(counts.items(), key=lambda kv: kv[1], reverse=True)
+        floor = ranked[capacity][1] if len(ranked) > capacity else 0
+        return cls(capacity, {item: [count, 0] for item, count in ranked[:capacity]}, floor)
+
+    def merge(self, other: "TopK"):
+        """
+        Folds another summary into this one (in place). An item missing from one side
+        may have occurred there up to that side's floor, so the floor is added to
+        both its count and its error.
+        """
+        merged = {}
+        for item in self.counts.keys() | other.counts.keys():
+            count, error = self.counts.get(item, [self.floor, self.floor])
+            other_count, other_error = other.counts.get(item, [other.floor, other.floor])
+            merged[item] = [count + other_count, error + other_error]
+
+        ranked = sorted(merged.items(), key=lambda kv: kv[1][0], reverse=True)
+        floor = self.floor + other.floor
+        if len(ranked) > self.capacity:
+            floor = max(floor, ranked[self.capacity][1][0])
+        self.counts = dict(ranked[:self.capacity])
+        self.floor = floor
+        return self
+
+    def top(self, n: int) -> list:
+        """
+        The n items with the largest counts, as (item, count, error) tuples.
+        """
+        ranked = sorted(self.counts.items(), key=lambda kv: kv[1][0], reverse=True)
+        return [(item, count, error) for item, (count, error) in ranked[:n]]
+
+    def to_bytes(self) -> bytes:
+        payload = {"capacity": self.capacity, "floor": self.floor, "counts": self.counts}
+        return zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+
+    @classmethod
+    def from_bytes(cls, payload: bytes) -> "TopK":
+        data = json.loads(zlib.decompress(payload))
+        return cls(data["capacity"], data["counts"], data["floor"])
+
+class KLL:
+    """
+    KLL quantile sketch (Karnin, Lang & Liberty, 2016), after Liberty's reference
+    implementation.
+
+    Values are kept in a hierarchy of compactors; an item at level h stands for 2**h
+    inputs. When the sketch is full a level is sorted and every other item promoted,
+    so the size stays O(k) however many values are added. Sketches of any size merge
+    by concatenating levels and compacting again. Up to k values the sketch is exact.
+    """
+
+    HEADER = struct.Struct(">HQddH")  # k, n, min, max, number of levels
+
+    def __init__(self, k: int = KLL_K, compactors: list = None, n: int = 0,
+                 min_value: float = math.nan, max_value: float = math.nan):
+        self.k = k
+        self.compactors = compactors or [[]]
+        self.n = n
+        self.min = min_value
+        self.max = max_value
+        self._update_size()
+
+    @property
+    def rank_error(self) -> float:
+        """
+        Normalized rank error of quantile() and histogram() at 99% confidence: a
+        returned p90 lies between the true p88.35 and p91.65 for k=200. This is the
+        empirical bound Apache DataSketches publishes for KLL (2.446 / k^0.9433).
+        """
+        return 2.446 / self.k ** 0.9433
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.compactors) - level - 1
+        return int(math.ceil(KLL_C ** depth * self.k)) + 1
+
+    def _update_size(self):
+        self.size = sum(len(items) for items in self.compactors)
+        self.max_size = sum(self._capacity(level) for level in range(len(self.compactors)))
+
+    def _compress(self):
+        for level in range(len(self.compactors)):
+            if len(self.compactors[level]) < self._capacity(level):
+                continue
+            if level + 1 == len(self.compactors):
+                self.compactors.append([])
+            items = sorted(self.compactors[level])
+            # An odd item out stays behind; of each remaining pair one is promoted, chosen
+            # by a coin derived from the sketch state so equal inputs give equal sketches
+            coin = hash64(f"{self.n}:{level}:{len(items)}") & 1
+            self.compactors[level] = items[:len(items) % 2]
+            self.compactors[level + 1].extend(items[len(items) % 2 + coin::2])
+            self._update_size()
+            if self.size < self.max_size:
+                break
+
+    def update(self, values):
+        """
+        Adds values (None is skipped).
+        """
+        for value in values:
+            if value is None:
+                continue
+            value = float(value)
+            self.compactors[0].append(value)
+            self.n += 1
+            # min/max start as NaN, which every comparison fails
+            self.min = value if not value >= self.min else self.min
+            self.max = value if not value <= self.max else self.max
+            self.size += 1
+            if self.size >= self.max_size:
+                self._compress()
+        return self
+
+    def merge(self, other: "KLL"):
+        """
+        Folds another sketch into this one (in place).
+        """
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for level, items in enumerate(other.compactors):
+            self.compactors[level].extend(items)
+        if other.n:
+            self.min = other.min if not self.n else min(self.min, other.min)
+            self.max = other.max if not self.n else max(self.max, other.max)
+        self.n += other.n
+        self._update_size()
+        while self.size >= self.max_size:
+            self._compress()
+        return self
+
+    def _weighted(self):
+        """
+        Sorted values with the number of inputs each stands for.
+        """
+        values = np.concatenate([np.asarray(items, dtype=np.float64) for items in self.compactors])
+        weights = np.concatenate([np.full(len(items), 2 ** level) for level, items in enumerate(self.compactors)])
+        order = np.argsort(values, kind="stable")
+        return values[order], weights[order]
+
+    def quantiles(self, fractions) -> list:
+        """
+        Estimated values at the given fractions (0.5 for the median); None when empty.
+        """
+        if not self.n:
+            return [None for _ in fractions]
+        values, weights = self._weighted()
+        cumulative = np.cumsum(weights)
+        result = []
+        for fraction in fractions:
+            if fraction <= 0:
+                result.append(self.min)
+            elif fraction >= 1:
+                result.append(self.max)
+            else:
+                index = int(np.searchsorted(cumulative, fraction * cumulative[-1]))
+                result.append(float(values[min(index, len(values) - 1)]))
+        return result
+
+    def histogram(self, bins: int) -> list:
+        """
+        Estimated counts in `bins` equal-width bins between min and max, as
+        (lower, upper, count) tuples; the last bin includes max.
+        """
+        if not self.n:
+            return []
+        values, weights = self._weighted()
+        edges = np.linspace(self.min, self.max, bins + 1) if self.max > self.min else np.array([self.min, self.max])
+        counts, _ = np.histogram(values, bins=edges, weights=weights)
+        return [
+            (float(lower), float(upper), int(round(count)))
+            for lower, upper, count in zip(edges[:-1], edges[1:], counts)
+        ]
+
+    def to_bytes(self) -> bytes:
+        """
+        Compact form for storage: a header, each level's length, then the values
+        as float64, zlib-compressed.
+        """
+        header = self.HEADER.pack(self.k, self.n, self.min, self.max, len(self.compactors))
+        lengths = struct.pack(f">{len(self.compactors)}I", *(len(items) for items in self.compactors))
+        values = np.concatenate([np.asarray(items, dtype=np.float64) for items in self.compactors]).astype(">f8").tobytes()
+        return zlib.compress(header + lengths + values)
+
+    @classmethod
+    def from_bytes(cls, payload: bytes) -> "KLL":
+        data = zlib.decompress(payload)
+        k, n, min_value, max_value, levels = cls.HEADER.unpack_from(data)
+        offset = cls.HEADER.size
+        lengths = struct.unpack_from(f">{levels}I", data, offset)
+        values = np.frombuffer(data, dtype=">f8", offset=offset + 4 * levels).tolist()
+        compactors, start = [], 0
+        for length in lengths:
+            compactors.append(values[start:start + length])
+            start += length
+        return cls(k, compactors, n, min_value, max_value)
@@ -9,6 +9,11 @@ SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
 SUPABASE_SERVICE_ROLE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
 BUCKET_NAME = os.environ.get("BUCKET_NAME", "uploads")
 
+# Signed download URLs are cached until this many seconds before they expire
+SIGNED_URL_EXPIRY_MARGIN = 300
+# Keep listing endpoints responsive even when storage is slow
+SIGNED_URL_TIMEOUT = float(os.environ.get("SIGNED_URL_TIMEOUT", 2))
+
 # Headers for Supabase API requests (using anon key by default)
 headers = {
     "apikey": SUPABASE_KEY,
@@ -205,6 +210,85 @@ def get_file_url(file_path, expires_in=3600, use_admin=False):
         # Fallback to public URL if signed URL fails
         return f"{SUPABASE_URL}/storage/v1/object/public/{BUCKET_NAME}/{file_path}"
 
+def _signed_url_cache_key(file_path):
+    return f"signed_url:{BUCKET_NAME}:{file_path}"
+
+def get_file_urls(file_paths, expires_in=3600, use_admin=False, timeout=SIGNED_URL_TIMEOUT):
+    """Generate signed URLs for many files with a single storage request
+
+    URLs are cached in Redis until shortly before they expire, so only paths
+    that are not cached yet are sent to Supabase, in one batched call.
+
+    Args:
+        file_paths: The paths of the files in storage
+        expires_in: The expiration time in seconds
+        use_admin: Whether to use admin permissions (service role key)
+        timeout: Seconds to wait for the storage API before falling back
+
+    Returns:
+        dict: Mapping of file path to URL
+    """
+    # Imported here so the storage helpers stay usable without a Redis server
+    from core.redis_client import redis_client
+
+    file_paths = list(dict.fromkeys(file_paths))
+    urls = {}
+    if not file_paths:
+        return urls
+
+    # 1) Serve whatever we can from the cache in one round trip
+    try:
+        cached = redis_client.mget([_signed_url_cache_key(p) for p in file_paths])
+    except Exception as e:
+        print(f"Signed URL cache lookup failed: {str(e)}")
+        cached = [None] * len(file_paths)
+
+    missing = []
+    for path, value in zip(file_paths, cached):
+        if value:
+            urls[path] = value.decode("utf-8") if isinstance(value, bytes) else value
+        else:
+            missing.append(path)
+
+    if not missing:
+        return urls
+
+    # 2) Sign every missing path with one batched request
+    signed = {}
+    try:
+        request_headers = admin_headers if use_admin else headers
+        response = requests.post(
+            f"{SUPABASE_URL}/storage/v1/object/sign/{BUCKET_NAME}",
+            headers=request_headers,
+            json={"expiresIn": expires_in, "paths": missing},
+            timeout=timeout
+        )
+        if response.status_code == 200:
+            for item in response.json():
+                if item.get("signedURL") and not item.get("error"):
+                    signed[item["path"]] = item["signedURL"]
+        else:
+            print(f"Batch signing failed with status {response.status_code}: {response.text}")
+    except Exception as e:
+        print(f"Error in get_file_urls: {str(e)}")
+
+    # 3) Cache the fresh URLs, expiring them before Supabase does
+    cache_ttl = expires_in - SIGNED_URL_EXPIRY_MARGIN
+    if signed and cache_ttl > 0:
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for path, url in signed.items():
+                pipe.setex(_signed_url_cache_key(path), cache_ttl, url)
+            pipe.execute()
+        except Exception as e:
+            print(f"Signed URL cache write failed: {str(e)}")
+
+    for path in missing:
+        # Fallback to public URL, same as get_file_url (never cached)
+        urls[path] = signed.get(path, f"{SUPABASE_URL}/storage/v1/object/public/{BUCKET_NAME}/{path}")
+
+    return urls
+
 def delete_file_from_storage(file_path, use_admin=False):
     """Delete a file from Supabase Storage using REST API
     
@@ -0,0 +1,89 @@
+# backend/core/upload_deletion.py
+
+from sqlalchemy import select, delete
+from sqlalchemy.orm import Session
+from db import models
+from db.partitions import drop_upload_partitions
+from core.rollups import delete_upload_rollups
+from core.sketch_store import delete_upload_sketches
+
+# Rows removed per statement; each batch commits on its own so locks stay short
+DELETE_BATCH_SIZE = 5000
+
+def _delete_in_batches(db: Session, model, id_query, batch_size: int, on_batch=None) -> int:
+    """
+    Repeatedly deletes up to batch_size rows of model whose id is returned by id_query,
+    committing after every batch. Returns the total number of rows deleted.
+    """
+    total = 0
+    while True:
+        batch_ids = id_query.limit(batch_size).scalar_subquery()
+        result = db.execute(
+            delete(model)
+            .where(model.id.in_(batch_ids))
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        if not result.rowcount:
+            return total
+        total += result.rowcount
+        if on_batch:
+            on_batch(total)
+
+def delete_upload_data(db: Session, upload_id: int, batch_size: int = DELETE_BATCH_SIZE, progress=None) -> dict:
+    """
+    Deletes every line item, order, rollup and sketch row belonging to an upload.
+
+    When orders/line_items are partitioned by upload, the upload's partitions
+    are detached and dropped. Otherwise rows are deleted in bounded batches.
+
+    Line items are removed explicitly first: the ORM cascade on Order.line_items
+    does not exist at the database level, so a bulk DELETE on orders would
+    otherwise leave orphans (or fail on the foreign key).
+
+    Args:
+        db: SQLAlchemy database session
+        upload_id: The upload whose rows are removed
+        batch_size: Maximum rows per DELETE statement
+        progress: Optional callback(stats_dict) invoked after every batch
+
+    Returns:
+        dict with the number of deleted line_items and orders,
+        or {"partitions_dropped": True}
+    """
+    # Rollups and sketches are small (one row per group/day); drop them up front
+    delete_upload_rollups(db, upload_id)
+    delete_upload_sketches(db, upload_id)
+    db.commit()
+
+    # Partitioned databases drop the upload's partitions instead of deleting rows
+    if drop_upload_partitions(db, upload_id):
+        stats = {"partitions_dropped": True}
+        if progress:
+            progress(dict(stats))
+        return stats
+
+    stats = {"line_items_deleted": 0, "orders_deleted": 0}
+
+    def report(key):
+        def on_batch(total):
+            stats[key] = total
+            if progress:
+                progress(dict(stats))
+        return on_batch
+
+    upload_order_ids = select(models.Order.id).where(models.Order.upload_id == upload_id)
+
+    # 1) Line items first, so no batch ever references a deleted order
+    _delete_in_batches(
+        db,
+        models.LineItem,
+        select(models.LineItem.id).where(models.LineItem.order_id.in_(upload_order_ids)),
+        batch_size,
+        report("line_items_deleted"),
+    )
+
+    # 2) Then the orders themselves
+    _delete_in_batches(db, models.Order, upload_order_ids, batch_size, report("orders_deleted"))
+
+    return stats
@@ -0,0 +1,82 @@
+# backend/db/async_database.py
+
+import asyncio
+import os
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.util.concurrency import in_greenlet, await_only
+from .database import DATABASE_URL
+
+# Async drivers for the sync URLs in DATABASE_URL
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def to_async_url(url: str):
+    """
+    Converts a sync database URL (postgresql://, postgresql+psycopg2://, ...) to its
+    async driver. asyncpg has no sslmode parameter, so sslmode is turned into
+    the equivalent connect argument.
+
+    Returns:
+        tuple: (async URL, connect_args for create_async_engine)
+    """
+    sa_url = make_url(url)
+    backend = sa_url.get_backend_name()
+    connect_args = {}
+    if backend == "postgresql":
+        sslmode = sa_url.query.get("sslmode")
+        if sslmode:
+            sa_url = sa_url.difference_update_query(["sslmode"])
+            if sslmode != "disable":
+                connect_args["ssl"] = sslmode
+    return sa_url.set(drivername=ASYNC_DRIVERS.get(backend, sa_url.drivername)), connect_args
+
+def pool_options(url) -> dict:
+    """
+    Pool sizing for create_async_engine. Only the Postgres engine gets a sized
+    queue pool; SQLite's pools don't accept pool_size/max_overflow.
+    """
+    if make_url(url).get_backend_name() != "postgresql":
+        return {}
+    return {
+        "pool_size": int(os.getenv("ASYNC_DB_POOL_SIZE", 10)),
+        "max_overflow": int(os.getenv("ASYNC_DB_MAX_OVERFLOW", 20)),
+    }
+
+ASYNC_DATABASE_URL, _connect_args = to_async_url(os.getenv("ASYNC_DATABASE_URL", DATABASE_URL))
+
+_async_engine = None
+
+def get_async_engine():
+    """
+    Returns the async engine, creating it on first use. Read-only analytics and
+    dashboard endpoints run on it, so a request waiting on the database holds a
+    coroutine instead of a threadpool worker. It is created lazily so that
+    importing the app (RQ workers, scripts, tests) doesn't need the async
+    driver of DATABASE_URL installed.
+    """
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            connect_args=_connect_args,
+            pool_pre_ping=True,
+            **pool_options(ASYNC_DATABASE_URL),
+        )
+    return _async_engine
+
+# Bound per session to get_async_engine(), see core.deps.get_async_db
+AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False)
+
+def run_blocking(fn, *args, **kwargs):
+    """
+    Runs the CPU-bound part of a handler (numpy, pandas, sketch merges). Handlers
+    called through AsyncSession.run_sync run on the event loop, so there the work
+    is moved to a thread and the loop keeps serving other requests meanwhile;
+    with a sync Session it just runs in the calling thread.
+    """
+    if in_greenlet():
+        return await_only(asyncio.to_thread(fn, *args, **kwargs))
+    return fn(*args, **kwargs)
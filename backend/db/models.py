@@ -1,6 +1,6 @@
 # backend/db/models.py
 
-from sqlalchemy import Column, Integer, String, DateTime, func, ForeignKey, BigInteger, Numeric, Index
+from sqlalchemy import Column, Integer, String, DateTime, Date, LargeBinary, func, ForeignKey, BigInteger, Numeric, Index
 from sqlalchemy.orm import relationship
 from .base import Base
 
@@ -13,6 +13,8 @@ class Upload(Base):
     file_size = Column(BigInteger, nullable=False)
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     status = Column(String, default="pending", nullable=False)
+    # Codec the stored object is compressed with ("gzip", "zstd"); None means uncompressed
+    compression = Column(String, nullable=True)
 
     # Columns to track upload progress
     total_rows = Column(Integer, default=0)
@@ -25,6 +27,11 @@ class Upload(Base):
     # Define the job_id as an optional field since it is for background processing
     job_id = Column(String, nullable=True)
 
+    # Keyset pagination of a user's upload history (newest first)
+    __table_args__ = (
+        Index("idx_uploads_user_id_id", "user_id", "id"),
+    )
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
@@ -41,6 +48,8 @@ class Order(Base):
     __tablename__ = "orders"
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # Partition key in Postgres: orders is LIST-partitioned with one partition per upload
+    # (see db/partitions.py); the database primary key there is (id, upload_id)
     upload_id = Column(Integer, ForeignKey("uploads.id"), nullable=True)
     order_id = Column(String, index=True)   # Shopify order ID
     name = Column(String, nullable=False)
@@ -108,15 +117,19 @@ class Order(Base):
     upload = relationship("Upload", back_populates="orders")
     line_items = relationship("LineItem", back_populates="order", cascade="all, delete-orphan")
 
-    # Example index for queries that filter by user + created_at
     __table_args__ = (
+        # Queries that filter by user + created_at
         Index("idx_orders_user_created", "user_id", "created_at"),
+        # Date-range queries across uploads; orders arrive roughly in created_at order
+        Index("idx_orders_created_at_brin", "created_at", postgresql_using="brin"),
     )
 
 class LineItem(Base):
     __tablename__ = "line_items"
     id = Column(Integer, primary_key=True, index=True)
     order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
+    # Denormalized from the order: line_items is partitioned by upload_id in Postgres
+    upload_id = Column(Integer, nullable=True)
     lineitem_quantity = Column(Integer)
     lineitem_name = Column(String)
     lineitem_price = Column(Numeric(12, 2))  # Changed from String to Numeric
@@ -129,3 +142,120 @@ class LineItem(Base):
     variant_id = Column(String)
 
     order = relationship("Order", back_populates="line_items")
+
+    __table_args__ = (
+        # Joined to orders by every product metric
+        Index("idx_line_items_order_id", "order_id"),
+    )
+
+class UploadRollup(Base):
+    """
+    Per-upload aggregates written once at the end of ingestion (see core/rollups.py).
+    One row per group of a dimension: the whole upload ("total"), a day, an hour,
+    a day of week, a city, a discount code or a product.
+    """
+    __tablename__ = "upload_rollups"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    upload_id = Column(Integer, ForeignKey("uploads.id"), nullable=False)
+    dimension = Column(String, nullable=False)
+
+    # Group key; only the column matching the dimension is set
+    key_ts = Column(DateTime)      # day / hour
+    key_text = Column(String)      # city / discount_code / product name
+    key_int = Column(Integer)      # dow (0=Sunday)
+
+    order_count = Column(BigInteger)              # units sold for product rows
+    revenue = Column(Numeric(14, 2))              # sum of non-zero order totals (line revenue for products)
+    revenue_rows = Column(Integer)                # rows that contributed to revenue
+    discount_amount = Column(Numeric(14, 2))      # sum of positive discount amounts
+    discount_rows = Column(Integer)               # orders that contributed to discount_amount
+
+    __table_args__ = (
+        Index("idx_upload_rollups_upload_dimension", "upload_id", "dimension"),
+    )
+
+class CustomerRollup(Base):
+    """
+    Per-upload, per-customer (email) order aggregates written at the end of ingestion.
+    """
+    __tablename__ = "customer_rollups"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    upload_id = Column(Integer, ForeignKey("uploads.id"), nullable=False)
+    email = Column(String)
+    order_count = Column(Integer, nullable=False)
+    revenue = Column(Numeric(14, 2))
+    first_order_at = Column(DateTime)
+    last_order_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("idx_customer_rollups_upload_email", "upload_id", "email"),
+    )
+
+class UploadSketch(Base):
+    """
+    Mergeable sketches of an upload's orders, one per day (core/sketch_store.py).
+    Merging the sketches of any set of uploads and days answers approximate
+    queries over that window without reading orders.
+    """
+    __tablename__ = "upload_sketches"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    upload_id = Column(Integer, ForeignKey("uploads.id"), nullable=False)
+    day = Column(Date)                       # NULL for orders without created_at
+    kind = Column(String, nullable=False)    # sketch type, e.g. "hll"
+    name = Column(String, nullable=False)    # what was sketched, e.g. "customer_email"
+    payload = Column(LargeBinary, nullable=False)
+
+    __table_args__ = (
+        Index("idx_upload_sketches_user_name_day", "user_id", "name", "day"),
+        Index("idx_upload_sketches_upload", "upload_id"),
+    )
+
+class CustomerCohort(Base):
+    """
+    A customer's (email's) first order across all of a user's uploads, which fixes
+    their cohort month. Maintained incrementally as uploads land (core/cohorts.py).
+    """
+    __tablename__ = "customer_cohorts"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    email = Column(String, nullable=False)
+    first_order_at = Column(DateTime, nullable=False)
+    cohort_month = Column(Date, nullable=False)      # first day of the first order's month
+
+    __table_args__ = (
+        Index("idx_customer_cohorts_user_email", "user_id", "email", unique=True),
+    )
+
+class CustomerActiveMonth(Base):
+    """
+    A month in which a customer placed at least one order, so a month seen again
+    in a later upload isn't counted twice in the cohort grid.
+    """
+    __tablename__ = "customer_active_months"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    email = Column(String, nullable=False)
+    month = Column(Date, nullable=False)             # first day of the month
+
+    __table_args__ = (
+        Index("idx_customer_active_months_user_email_month", "user_id", "email", "month", unique=True),
+    )
+
+class CohortCount(Base):
+    """
+    One cell of a user's cohort grid: customers of a cohort month who ordered
+    `period` months after it (period 0 is the cohort's size).
+    """
+    __tablename__ = "cohort_counts"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    cohort_month = Column(Date, nullable=False)
+    period = Column(Integer, nullable=False)
+    customers = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("idx_cohort_counts_user_cohort_period", "user_id", "cohort_month", "period", unique=True),
+    )
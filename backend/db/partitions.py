@@ -0,0 +1,112 @@
+# backend/db/partitions.py
+
+import time
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+# Tables that are LIST-partitioned by upload_id (see migration c5e93b7d1a08).
+# Order matters: line_items references orders, so it is created after and dropped before.
+PARTITIONED_TABLES = ("orders", "line_items")
+
+# Dropping a detached partition drops its foreign keys, which takes a brief
+# ACCESS EXCLUSIVE lock on the tables they reference (orders, uploads, users).
+# Queued behind a long-running query, that request would stall every later
+# query of those tables, so each attempt gives up after DROP_LOCK_TIMEOUT_MS
+# and is retried.
+DROP_LOCK_TIMEOUT_MS = 200
+DROP_ATTEMPTS = 30
+DROP_RETRY_SECONDS = 1.0
+
+# SQLSTATE of lock_not_available, raised when lock_timeout expires
+LOCK_NOT_AVAILABLE = "55P03"
+
+def partition_name(table: str, upload_id: int) -> str:
+    """
+    Name of the partition holding one upload's rows, e.g. orders_upload_42.
+    """
+    return f"{table}_upload_{int(upload_id)}"
+
+def uses_upload_partitions(db: Session) -> bool:
+    """
+    True when orders is a partitioned table in this database.
+    SQLite test databases and un-migrated databases use plain tables.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return bool(db.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('orders'))"
+    )).scalar())
+
+def ensure_upload_partitions(db: Session, upload_id: int) -> bool:
+    """
+    Creates the orders/line_items partitions for an upload if they don't exist.
+    Must run before any row of the upload is inserted.
+
+    Returns:
+        bool: True if the database is partitioned, False if nothing had to be done
+    """
+    if not uses_upload_partitions(db):
+        return False
+    for table in PARTITIONED_TABLES:
+        db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(table, upload_id)} "
+            f"PARTITION OF {table} FOR VALUES IN ({int(upload_id)})"
+        ))
+    db.commit()
+    return True
+
+def _drop_detached(conn, name: str):
+    """
+    Drops a detached partition, retrying while the locks it needs are taken.
+    """
+    conn.execute(text(f"SET lock_timeout = {DROP_LOCK_TIMEOUT_MS}"))
+    try:
+        for attempt in range(DROP_ATTEMPTS):
+            try:
+                conn.execute(text(f"DROP TABLE {name}"))
+                return
+            except OperationalError as e:
+                if getattr(e.orig, "pgcode", None) != LOCK_NOT_AVAILABLE or attempt == DROP_ATTEMPTS - 1:
+                    raise
+                time.sleep(DROP_RETRY_SECONDS)
+    finally:
+        conn.execute(text("RESET lock_timeout"))
+
+def drop_upload_partitions(db: Session, upload_id: int) -> bool:
+    """
+    Removes all of an upload's orders and line items by detaching and dropping
+    its partitions. This is a catalog-only operation, independent of row count.
+
+    A plain DETACH PARTITION takes an ACCESS EXCLUSIVE lock on the parent, which
+    blocks every other upload's analytics until queries already running on the
+    parent finish. DETACH PARTITION CONCURRENTLY (Postgres 14+) only takes SHARE
+    UPDATE EXCLUSIVE, so other uploads stay readable and writable throughout.
+    It can't run inside a transaction block: the session's transaction is
+    committed (the detach would otherwise wait on it) and the partitions are
+    detached on an autocommit connection. A detach or drop interrupted half-way
+    is completed by the next attempt.
+
+    Returns:
+        bool: True if the partitions were dropped, False if the database isn't
+        partitioned (callers then fall back to batched DELETEs)
+    """
+    if not uses_upload_partitions(db):
+        return False
+    db.commit()
+    with db.get_bind().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in reversed(PARTITIONED_TABLES):
+            name = partition_name(table, upload_id)
+            exists, detach_pending = conn.execute(text(
+                "SELECT to_regclass(:name) IS NOT NULL, "
+                "(SELECT inhdetachpending FROM pg_inherits WHERE inhrelid = to_regclass(:name))"
+            ), {"name": name}).one()
+            if not exists:
+                continue
+            if detach_pending:
+                conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name} FINALIZE"))
+            elif detach_pending is not None:
+                conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name} CONCURRENTLY"))
+            # (neither: detached by an earlier attempt that failed before the drop)
+            _drop_detached(conn, name)
+    return True
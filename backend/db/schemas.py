@@ -45,6 +45,7 @@ class UploadOut(UploadBase):
     file_size: int
     uploaded_at: datetime
     status: str
+    compression: Optional[str] = None  # Storage codec ("gzip", "zstd") or None
     job_id: Optional[str] = None  # Redis job ID (Optional)
     upload_id: int  # Mapping to the primary `id` of the upload record (Database ID)
 
@@ -0,0 +1,166 @@
+"""partition orders and line_items by upload
+
+Revision ID: c5e93b7d1a08
+Revises: 9a4e1c7b2f60
+Create Date: 2026-10-19 11:47:03.662190
+
+Turns orders and line_items into LIST-partitioned tables keyed on upload_id,
+with one partition per upload (orders_upload_<id>, line_items_upload_<id>).
+Analytics filter on upload_id, so the planner prunes every other upload, and
+deleting an upload becomes DETACH + DROP of its partitions.
+
+line_items gains a denormalized upload_id (the partition key), backfilled from
+orders. Primary keys become (id, upload_id), as Postgres requires the partition
+key in every unique constraint, and line_items references orders on
+(order_id, upload_id).
+
+Rows whose order has no upload_id (data imported before uploads were tracked)
+can't be placed in a partition and are never reachable through analytics; they
+are kept in orders_legacy / line_items_legacy, which are dropped when empty.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e93b7d1a08'
+down_revision: Union[str, None] = '9a4e1c7b2f60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _rename_with_indexes(table: str, new_name: str) -> None:
+    """
+    Renames a table and every index on it, primary key included (index names
+    are schema-wide, and the table replacing it reuses them). The names are
+    read from the database, since databases created by create_all rather than
+    by these migrations may name them differently.
+    """
+    inspector = sa.inspect(op.get_bind())
+    names = [inspector.get_pk_constraint(table)["name"]]
+    names += [index["name"] for index in inspector.get_indexes(table)]
+    op.execute(f"ALTER TABLE {table} RENAME TO {new_name}")
+    for name in dict.fromkeys(filter(None, names)):
+        renamed = name.replace(table, new_name, 1) if table in name else f"{name}_{new_name}"
+        op.execute(f"ALTER INDEX {name} RENAME TO {renamed}")
+
+
+def _drop_foreign_keys(table: str, referred_table: str) -> None:
+    """
+    Drops the foreign keys of a table that reference another, by their names in
+    the database.
+    """
+    for foreign_key in sa.inspect(op.get_bind()).get_foreign_keys(table):
+        if foreign_key["referred_table"] == referred_table and foreign_key["name"]:
+            op.execute(f"ALTER TABLE {table} DROP CONSTRAINT {foreign_key['name']}")
+
+
+def upgrade() -> None:
+    # 1) line_items gets the partition key, copied from its order
+    op.add_column('line_items', sa.Column('upload_id', sa.Integer(), nullable=True))
+    op.execute("""
+        UPDATE line_items li
+        SET upload_id = o.upload_id
+        FROM orders o
+        WHERE li.order_id = o.id
+    """)
+
+    # 2) Move the heap tables aside (index names are schema-wide, so rename those too)
+    _drop_foreign_keys('line_items', 'orders')
+    _rename_with_indexes('orders', 'orders_legacy')
+    _rename_with_indexes('line_items', 'line_items_legacy')
+
+    # 3) Partitioned parents with the same columns (and id sequences)
+    op.execute("CREATE TABLE orders (LIKE orders_legacy INCLUDING DEFAULTS) PARTITION BY LIST (upload_id)")
+    op.execute("ALTER TABLE orders ALTER COLUMN upload_id SET NOT NULL")
+    op.execute("ALTER TABLE orders ADD CONSTRAINT orders_pkey PRIMARY KEY (id, upload_id)")
+    op.execute("ALTER TABLE orders ADD CONSTRAINT orders_user_id_fkey FOREIGN KEY (user_id) REFERENCES users (id)")
+    op.execute("ALTER TABLE orders ADD CONSTRAINT orders_upload_id_fkey FOREIGN KEY (upload_id) REFERENCES uploads (id)")
+    op.create_index('ix_orders_id', 'orders', ['id'], unique=False)
+    op.create_index('ix_orders_order_id', 'orders', ['order_id'], unique=False)
+    op.create_index('idx_orders_user_created', 'orders', ['user_id', 'created_at'], unique=False)
+    op.execute("ALTER SEQUENCE orders_id_seq OWNED BY orders.id")
+
+    op.execute("CREATE TABLE line_items (LIKE line_items_legacy INCLUDING DEFAULTS) PARTITION BY LIST (upload_id)")
+    op.execute("ALTER TABLE line_items ALTER COLUMN upload_id SET NOT NULL")
+    op.execute("ALTER TABLE line_items ADD CONSTRAINT line_items_pkey PRIMARY KEY (id, upload_id)")
+    op.execute("""
+        ALTER TABLE line_items ADD CONSTRAINT line_items_order_id_fkey
+        FOREIGN KEY (order_id, upload_id) REFERENCES orders (id, upload_id)
+    """)
+    op.create_index('ix_line_items_id', 'line_items', ['id'], unique=False)
+    op.execute("ALTER SEQUENCE line_items_id_seq OWNED BY line_items.id")
+
+    # 4) One partition per existing upload, then move the rows over
+    op.execute("""
+        DO $$
+        DECLARE
+            uid integer;
+        BEGIN
+            FOR uid IN SELECT DISTINCT upload_id FROM orders_legacy WHERE upload_id IS NOT NULL LOOP
+                EXECUTE format('CREATE TABLE orders_upload_%s PARTITION OF orders FOR VALUES IN (%s)', uid, uid);
+                EXECUTE format('CREATE TABLE line_items_upload_%s PARTITION OF line_items FOR VALUES IN (%s)', uid, uid);
+            END LOOP;
+        END $$;
+    """)
+    op.execute("INSERT INTO orders SELECT * FROM orders_legacy WHERE upload_id IS NOT NULL")
+    op.execute("INSERT INTO line_items SELECT * FROM line_items_legacy WHERE upload_id IS NOT NULL")
+    op.execute("DELETE FROM line_items_legacy WHERE upload_id IS NOT NULL")
+    op.execute("DELETE FROM orders_legacy WHERE upload_id IS NOT NULL")
+
+    # 5) Drop the legacy tables unless they still hold upload-less rows
+    op.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM orders_legacy) AND NOT EXISTS (SELECT 1 FROM line_items_legacy) THEN
+                DROP TABLE line_items_legacy;
+                DROP TABLE orders_legacy;
+            END IF;
+        END $$;
+    """)
+
+
+def downgrade() -> None:
+    # Recreate plain heap tables and copy every partition's rows back
+    _rename_with_indexes('line_items', 'line_items_partitioned')
+    _rename_with_indexes('orders', 'orders_partitioned')
+
+    op.execute("CREATE TABLE orders (LIKE orders_partitioned INCLUDING DEFAULTS)")
+    op.execute("ALTER TABLE orders ALTER COLUMN upload_id DROP NOT NULL")
+    op.execute("INSERT INTO orders SELECT * FROM orders_partitioned")
+    op.execute("CREATE TABLE line_items (LIKE line_items_partitioned INCLUDING DEFAULTS)")
+    op.execute("ALTER TABLE line_items ALTER COLUMN upload_id DROP NOT NULL")
+    op.execute("INSERT INTO line_items SELECT * FROM line_items_partitioned")
+
+    # Fold back any upload-less rows that were kept aside
+    op.execute("""
+        DO $$
+        BEGIN
+            IF to_regclass('orders_legacy') IS NOT NULL THEN
+                INSERT INTO orders SELECT * FROM orders_legacy;
+                INSERT INTO line_items SELECT * FROM line_items_legacy;
+                DROP TABLE line_items_legacy;
+                DROP TABLE orders_legacy;
+            END IF;
+        END $$;
+    """)
+
+    op.execute("ALTER SEQUENCE orders_id_seq OWNED BY orders.id")
+    op.execute("ALTER SEQUENCE line_items_id_seq OWNED BY line_items.id")
+    op.execute("DROP TABLE line_items_partitioned")
+    op.execute("DROP TABLE orders_partitioned")
+
+    op.execute("ALTER TABLE orders ADD CONSTRAINT orders_pkey PRIMARY KEY (id)")
+    op.execute("ALTER TABLE orders ADD CONSTRAINT orders_user_id_fkey FOREIGN KEY (user_id) REFERENCES users (id)")
+    op.execute("ALTER TABLE orders ADD CONSTRAINT orders_upload_id_fkey FOREIGN KEY (upload_id) REFERENCES uploads (id)")
+    op.create_index('ix_orders_id', 'orders', ['id'], unique=False)
+    op.create_index('ix_orders_order_id', 'orders', ['order_id'], unique=False)
+    op.create_index('idx_orders_user_created', 'orders', ['user_id', 'created_at'], unique=False)
+
+    op.execute("ALTER TABLE line_items ADD CONSTRAINT line_items_pkey PRIMARY KEY (id)")
+    op.execute("ALTER TABLE line_items ADD CONSTRAINT line_items_order_id_fkey FOREIGN KEY (order_id) REFERENCES orders (id)")
+    op.create_index('ix_line_items_id', 'line_items', ['id'], unique=False)
+    op.drop_column('line_items', 'upload_id')
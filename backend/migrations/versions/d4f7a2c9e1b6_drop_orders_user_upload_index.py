@@ -0,0 +1,35 @@
+"""drop orders user upload index
+
+Revision ID: d4f7a2c9e1b6
+Revises: 9c2e5a7b3d41
+Create Date: 2026-10-19 21:04:18.530771
+
+orders is partitioned per upload and every upload belongs to one user, so on
+each partition user_id and upload_id are constant and the covering
+(user_id, upload_id) index is a second, narrower copy of the partition. The
+planner prunes to the upload's partition and reads it sequentially instead;
+the index only added to every ingestion's writes.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f7a2c9e1b6'
+down_revision: Union[str, None] = '9c2e5a7b3d41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.drop_index('idx_orders_user_upload', table_name='orders')
+
+
+def downgrade() -> None:
+    op.create_index(
+        'idx_orders_user_upload', 'orders', ['user_id', 'upload_id'], unique=False,
+        postgresql_include=['id', 'created_at', 'total', 'discount_amount', 'email', 'shipping_city', 'discount_code'],
+    )
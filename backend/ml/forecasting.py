@@ -1,10 +1,12 @@
 # backend/ml/forecasting.py
 
+import asyncio
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from db import models
 
 class TimeSeriesForecaster:
@@ -35,12 +37,36 @@ class TimeSeriesForecaster:
         Returns:
             DataFrame with date index and order metrics
         """
-        # Query orders for this user and upload
-        orders = self.db.query(models.Order).filter(
+        return self._build_daily_data(self._query_orders(self.db))
+    
+    async def load_data_async(self, adb: AsyncSession) -> pd.DataFrame:
+        """
+        Async variant of load_data that reads through an AsyncSession.
+        
+        Returns:
+            DataFrame with date index and order metrics
+        """
+        rows = await adb.run_sync(self._query_orders)
+        # The pandas aggregation is CPU work; keep it off the event loop
+        return await asyncio.to_thread(self._build_daily_data, rows)
+    
+    def _query_orders(self, db: Session) -> list:
+        """
+        Fetch the id, created_at and total of every order of this user and upload.
+        """
+        return db.query(
+            models.Order.id,
+            models.Order.created_at,
+            models.Order.total
+        ).filter(
             models.Order.user_id == self.user_id,
             models.Order.upload_id == self.upload_id
         ).all()
-        
+    
+    def _build_daily_data(self, orders: list) -> pd.DataFrame:
+        """
+        Aggregate order rows into a continuous daily time series.
+        """
         # Convert to DataFrame
         data = []
         for order in orders:
@@ -54,7 +80,9 @@ class TimeSeriesForecaster:
         # Create DataFrame and aggregate by date
         df = pd.DataFrame(data)
         if df.empty:
-            return pd.DataFrame()
+            # Keep the empty frame so prepare_data doesn't try to load again
+            self.data = pd.DataFrame()
+            return self.data
         
         # Group by date and calculate metrics
         daily_data = df.groupby('date').agg(
@@ -92,7 +120,8 @@ class TimeSeriesForecaster:
             self.load_data()
         
         if self.data.empty:
-            return pd.DataFrame()
+            self.prepared_data = pd.DataFrame()
+            return self.prepared_data
         
         # Copy data to avoid modifying original
         df = self.data.copy()
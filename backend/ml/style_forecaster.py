@@ -1,11 +1,13 @@
 # backend/ml/style_forecaster.py
 
+import asyncio
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, and_
 from db import models
 
 class StyleForecaster:
@@ -60,23 +62,47 @@ class StyleForecaster:
         Returns:
             DataFrame with date and style information
         """
-        # Query line items for this user and upload
+        return self._build_style_data(self._query_line_items(self.db))
+    
+    async def load_data_async(self, adb: AsyncSession) -> pd.DataFrame:
+        """
+        Async variant of load_data that reads through an AsyncSession.
+        
+        Returns:
+            DataFrame with date and style information
+        """
+        rows = await adb.run_sync(self._query_line_items)
+        # The pandas aggregation is CPU work; keep it off the event loop
+        return await asyncio.to_thread(self._build_style_data, rows)
+    
+    def _query_line_items(self, db: Session) -> list:
+        """
+        Fetch created_at, name, quantity and price of every line item of this user and upload.
+        """
         query = (
-            self.db.query(
+            db.query(
                 models.Order.created_at,
                 models.LineItem.lineitem_name,
                 models.LineItem.lineitem_quantity,
                 models.LineItem.lineitem_price
             )
-            .join(models.LineItem, models.Order.id == models.LineItem.order_id)
+            .join(models.LineItem, and_(
+                models.Order.id == models.LineItem.order_id,
+                models.Order.upload_id == models.LineItem.upload_id
+            ))
             .filter(
                 models.Order.user_id == self.user_id,
                 models.Order.upload_id == self.upload_id
             )
         )
         
-        # Execute query and convert to DataFrame
-        rows = query.all()
+        return query.all()
+    
+    def _build_style_data(self, rows: list) -> pd.DataFrame:
+        """
+        Aggregate line item rows by date and style.
+        """
+        # Convert to DataFrame
         data = []
         for row in rows:
             if row.created_at and row.lineitem_name and row.lineitem_quantity is not None:
@@ -97,7 +123,9 @@ class StyleForecaster:
         # Create DataFrame
         df = pd.DataFrame(data)
         if df.empty:
-            return pd.DataFrame()
+            # Keep the empty frame so prepare_data doesn't try to load again
+            self.data = pd.DataFrame()
+            return self.data
         
         # Group by date and style
         daily_style_data = df.groupby(['date', 'style']).agg(
@@ -121,7 +149,8 @@ class StyleForecaster:
             self.load_data()
         
         if self.data.empty:
-            return pd.DataFrame()
+            self.prepared_data = pd.DataFrame()
+            return self.prepared_data
         
         # Copy data to avoid modifying original
         df = self.data.copy()
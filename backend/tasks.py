@@ -6,6 +6,7 @@ import traceback
 import time
 from core.orders_processing import process_shopify_file
 from core.supabase_client import download_file_from_storage, BUCKET_NAME
+from core.redis_client import bump_generation, cache_tag, cache_clear_tag
 
 def process_test_task(test_data: str):
     """
@@ -61,6 +62,21 @@ def process_shopify_file_task(storage_path: str, user_id: int, upload_id: int):
                 print(f"Upload status updated to 'completed' for upload_id: {upload_id}")
         finally:
             db.close()
+
+        # Entries cached while the upload was processing (or from an earlier run of it)
+        # are out of date now; the user's other uploads keep theirs
+        bump_generation(upload_id=upload_id)
+        # The upload was folded into the user's cohort grid, so are the entries
+        # computed across the user's uploads (cohort retention)
+        bump_generation(user_id=user_id)
+
+        # Compute the dashboard's first view ahead of the user asking for it
+        try:
+            from rq import Queue
+            from core.redis_client import redis_client
+            Queue(connection=redis_client, default_timeout=3600).enqueue(warm_upload_cache_task, user_id, upload_id)
+        except Exception as queue_error:
+            print(f"Failed to enqueue cache warming for upload {upload_id}: {str(queue_error)}")
             
     except Exception as e:
         print(f"Error processing file {storage_path} for user {user_id}, upload {upload_id}: {e}")
@@ -78,7 +94,130 @@ def process_shopify_file_task(storage_path: str, user_id: int, upload_id: int):
                 print(f"Upload status updated to 'failed' for upload_id: {upload_id}")
         finally:
             db.close()
+
+        # Part of the upload may have been written before the failure
+        bump_generation(upload_id=upload_id)
         
         # Clean up temporary file in case of error
         if os.path.exists(temp_path):
             os.remove(temp_path)
+
+def warm_upload_cache_task(user_id: int, upload_id: int):
+    """
+    RQ Task: Cache the analytics, dashboard summary and default forecasts of a
+    freshly processed upload (see core.cache_warming for the configuration).
+    """
+    from db.database import SessionLocal
+    from core.cache_warming import warm_upload_cache
+
+    db = SessionLocal()
+    try:
+        statuses = warm_upload_cache(db, user_id, upload_id)
+        print(f"Cache warmed for upload {upload_id}: {statuses}")
+        return statuses
+    finally:
+        db.close()
+
+def refresh_cache_task(prefix: str, user_id: int, upload_id: int, *args):
+    """
+    RQ Task: Recompute cache entries served past their soft expiry
+    (stale-while-revalidate, see core.cache_flight).
+    """
+    from db.database import SessionLocal
+    from core.cache_warming import refresh_cache_entries
+
+    db = SessionLocal()
+    try:
+        refresh_cache_entries(db, prefix, user_id, upload_id, *args)
+        print(f"Cache refreshed: {prefix} for user {user_id}, upload {upload_id} {list(args)}")
+    finally:
+        db.close()
+
+def delete_upload_task(upload_id: int, user_id: int):
+    """
+    RQ Task: Delete an upload, its stored file and all of its orders/line items.
+    Rows are removed in bounded batches (see core.upload_deletion) so table locks
+    stay short; progress is published on the job's meta.
+    """
+    from rq import get_current_job
+    from db.database import SessionLocal
+    from db import models
+    from core.upload_deletion import delete_upload_data
+    from core.cohorts import rebuild_cohorts
+    from core.supabase_client import delete_file_from_storage
+
+    job = get_current_job()
+
+    def report_progress(stats):
+        print(f"Deleting upload {upload_id}: {stats}")
+        if job:
+            job.meta.update(stats)
+            job.save_meta()
+
+    db = SessionLocal()
+    try:
+        upload = db.query(models.Upload).filter(
+            models.Upload.id == upload_id,
+            models.Upload.user_id == user_id
+        ).first()
+        if not upload:
+            print(f"No matching Upload record for upload_id={upload_id}, user_id={user_id}")
+            return None
+
+        # Try to delete the file from storage if it's in Supabase
+        if upload.file_path and upload.file_path.startswith(f"supabase://{BUCKET_NAME}/"):
+            storage_path = upload.file_path.replace(f"supabase://{BUCKET_NAME}/", "")
+            try:
+                delete_file_from_storage(storage_path, use_admin=True)
+            except Exception as storage_error:
+                # Log the error but continue with database deletion
+                print(f"Error deleting file from storage: {str(storage_error)}")
+
+        stats = delete_upload_data(db, upload_id, progress=report_progress)
+
+        # Finally remove the upload record itself
+        db.delete(upload)
+        db.commit()
+
+        # The upload is gone: stop serving its cached results before anything
+        # else can fail
+        try:
+            bump_generation(upload_id=upload_id)
+            # Unreachable now; free their memory instead of waiting for the TTL
+            cache_clear_tag(cache_tag(user_id, upload_id))
+        except Exception as cache_error:
+            # Deletion runs inline when Redis is down, and then nothing was cached either
+            print(f"Error invalidating cached results: {str(cache_error)}")
+
+        # The deleted orders may have been the only ones behind some grid cells.
+        # The upload is deleted either way, so a failure here is only logged
+        # (the grid keeps counting those orders until the next rebuild) rather
+        # than marking the upload delete_failed.
+        try:
+            rebuild_cohorts(db, user_id)
+        except Exception as cohort_error:
+            db.rollback()
+            print(f"Error rebuilding cohorts for user {user_id}: {str(cohort_error)}")
+            traceback.print_exc()
+        else:
+            # Entries computed across the user's uploads (cohort retention) are
+            # out of date once the grid no longer counts the upload
+            try:
+                bump_generation(user_id=user_id)
+            except Exception as cache_error:
+                print(f"Error invalidating cached results: {str(cache_error)}")
+        print(f"Upload {upload_id} deleted: {stats}")
+        return stats
+    except Exception as e:
+        db.rollback()
+        print(f"Error deleting upload {upload_id} for user {user_id}: {e}")
+        traceback.print_exc()
+
+        # Leave the upload visible as failed so the user can retry the delete
+        upload = db.query(models.Upload).filter(models.Upload.id == upload_id).first()
+        if upload:
+            upload.status = "delete_failed"
+            db.commit()
+        raise
+    finally:
+        db.close()
@@ -0,0 +1,137 @@
+# backend/tests/test_analytics_engine.py
+
+import datetime
+import threading
+import time
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from analytics_engine import (
+    build_fused_query, assemble_metrics, handler_jobs, run_concurrently, METRIC_SECTIONS, MetricsDeadlineExceeded
+)
+from analytics_service import ANALYTICS_REGISTRY, INTERMEDIATES
+
+
+def test_every_registry_metric_has_a_fused_section():
+    # Except the metrics served from sketches/cohort tables or computed in NumPy/SciPy
+    assert set(ANALYTICS_REGISTRY) - set(METRIC_SECTIONS) == {
+        "order_value_quantiles", "rfm_segments", "cohort_retention", "frequently_bought_together"
+    }
+
+
+def test_build_fused_query_only_compiles_requested_sections():
+    sql = build_fused_query({"total", "city"})
+    assert "GROUPING SETS ((), (shipping_city))" in sql
+    assert "line_items" not in sql
+    assert "customers" not in sql
+
+    sql = build_fused_query({"product", "customers"})
+    assert "GROUPING SETS" not in sql
+    assert "FROM line_items li" in sql
+    # orders is still read exactly once, through the materialized CTE
+    assert sql.count("FROM orders") == 1
+
+
+def test_assemble_metrics_matches_handler_shapes():
+    day = datetime.datetime(2024, 3, 1)
+    rows = [
+        # section, key_ts, key_text, key_int, n, amount, amount_rows, discount, discount_rows
+        ("total", None, None, None, 4, Decimal("100.00"), 3, Decimal("5.00"), 1),
+        ("day", day, None, None, 4, Decimal("100.00"), 3, None, 0),
+        ("city", None, "Paris", None, 1, Decimal("70.00"), 1, None, 0),
+        ("city", None, "Lyon", None, 2, Decimal("30.00"), 2, None, 0),
+        ("city", None, "nan", None, 1, None, 0, None, 0),
+        ("discount_code", None, "SPRING", None, 1, Decimal("40.00"), 1, Decimal("5.00"), 1),
+        ("customers", None, None, None, 3, None, 1, None, None),
+        ("product", None, None, None, 6, Decimal("12.00"), 2, None, None),
+    ]
+    keys = ["orders_summary", "time_series", "top_cities_by_orders", "top_cities_by_revenue",
+            "top_discount_codes_by_savings", "repeat_customers", "top_products_by_revenue",
+            "orders_by_hour"]
+
+    result = assemble_metrics(rows, keys)
+
+    assert result["orders_summary"] == {"total_orders": 4, "total_revenue": 100.0, "average_order_value": 25.0}
+    assert result["time_series"] == [{"date": "2024-03-01", "orderCount": 4}]
+    assert result["top_cities_by_orders"] == [{"city": "Lyon", "order_count": 2}, {"city": "Paris", "order_count": 1}]
+    assert result["top_cities_by_revenue"][0] == {"city": "Paris", "revenue": 70.0}
+    assert result["top_discount_codes_by_savings"] == [{"discount_code": "SPRING", "total_discount": 5.0}]
+    assert result["repeat_customers"] == {"unique_count": 3, "repeat_count": 1, "repeat_rate_percent": 1.0 / 3.0 * 100.0}
+    assert result["top_products_by_revenue"] == [{"product_name": "Unnamed Product", "product_revenue": 12.0}]
+    # Sections without rows produce empty results rather than errors
+    assert result["orders_by_hour"] == []
+
+
+def _pooled_db():
+    """A session stand-in whose bind isn't SQLite, so jobs go to the metrics pool."""
+    db = MagicMock()
+    db.get_bind.return_value.dialect.name = "postgresql+test"
+    return db
+
+
+def test_run_concurrently_caps_jobs_per_request():
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def job(i):
+        def run(session):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            return {f"metric_{i}": i}
+        return run
+
+    results = run_concurrently(_pooled_db(), [job(i) for i in range(6)], 2, time.monotonic() + 5)
+
+    assert results == {f"metric_{i}": i for i in range(6)}
+    assert peak[0] == 2
+
+
+def test_run_concurrently_enforces_deadline():
+    slow = lambda session: time.sleep(0.5) or {}
+    with pytest.raises(MetricsDeadlineExceeded):
+        run_concurrently(_pooled_db(), [slow, slow], 2, time.monotonic() + 0.1)
+
+
+def test_run_concurrently_applies_statement_timeout_to_serial_jobs():
+    # A single job runs on the caller's session, still bounded by the deadline on Postgres
+    db = MagicMock()
+    db.get_bind.return_value.dialect.name = "postgresql"
+    results = run_concurrently(db, [lambda session: {"metric": 1}], 4, time.monotonic() + 5)
+
+    assert results == {"metric": 1}
+    statements = [str(call.args[0]) for call in db.execute.call_args_list]
+    assert statements[0].startswith("SET LOCAL statement_timeout = ")
+    assert statements[-1] == "SET LOCAL statement_timeout TO DEFAULT"
+
+
+def test_handler_jobs_share_intermediates_within_a_request():
+    calls = []
+
+    def daily_series(db, user_id, upload_id):
+        calls.append("daily_series")
+        return [(datetime.datetime(2024, 3, 1), 2, Decimal("30.00")), (datetime.datetime(2024, 3, 4), 1, Decimal("5.00"))]
+
+    keys = ["orders_summary", "top_discount_codes", "time_series", "orders_by_day_of_week"]
+    jobs = handler_jobs(1, 1, keys)
+    # The three daily-series metrics form one job; top_discount_codes runs on its own
+    assert len(jobs) == 2
+
+    db = MagicMock()
+    db.info = {"upload_rollups": {(1, 1): False}}
+    with patch.dict(INTERMEDIATES, {"daily_series": daily_series}), \
+         patch.dict(ANALYTICS_REGISTRY["top_discount_codes"], {"handler": lambda db, u, up: []}):
+        results = {}
+        for job in jobs:
+            results.update(job(db))
+
+    assert calls == ["daily_series"]
+    assert results["orders_summary"] == {"total_orders": 3, "total_revenue": 35.0, "average_order_value": 35.0 / 3}
+    assert results["time_series"] == [{"date": "2024-03-01", "orderCount": 2}, {"date": "2024-03-04", "orderCount": 1}]
+    # 2024-03-01 was a Friday, 2024-03-04 a Monday
+    assert results["orders_by_day_of_week"] == [{"dow": 1, "count_orders": 1}, {"dow": 5, "count_orders": 2}]
@@ -0,0 +1,84 @@
+# backend/tests/test_basket.py
+
+import datetime
+import random
+from collections import Counter
+from decimal import Decimal
+from itertools import combinations
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from db.database import Base
+from db import models
+from core import basket
+from core.basket import frequently_bought_together
+
+engine = create_engine(
+    "sqlite:///:memory:",
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = TestingSessionLocal()
+    session.add(models.User(id=1, username="owner", email="owner@example.com", hashed_password="x"))
+    session.add(models.Upload(id=1, user_id=1, file_name="orders.csv",
+                              file_path="supabase://uploads/1/orders.csv", file_size=1))
+    rng = random.Random(11)
+    for i in range(300):
+        order = models.Order(user_id=1, upload_id=1, name=f"#{i}", email=f"c{i}@example.com",
+                             total=Decimal("10.00"), created_at=datetime.datetime(2024, 3, 1))
+        # Skewed product popularity; an order may list the same product twice
+        for product in rng.choices(range(40), weights=[1 / (p + 1) for p in range(40)], k=rng.randint(1, 5)):
+            order.line_items.append(models.LineItem(upload_id=1, lineitem_name=f"P{product}", lineitem_quantity=1))
+        session.add(order)
+    session.commit()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+
+def expected_pairs(db):
+    baskets = {}
+    for order_id, name in db.query(models.LineItem.order_id, models.LineItem.lineitem_name):
+        baskets.setdefault(order_id, set()).add(name)
+    products = Counter(p for items in baskets.values() for p in items)
+    pairs = Counter(pair for items in baskets.values() for pair in combinations(sorted(items), 2))
+    return len(baskets), products, pairs
+
+
+def test_pairs_match_brute_force_counts(db, monkeypatch):
+    # Several column blocks even for a small catalogue
+    monkeypatch.setattr(basket, "BASKET_BLOCK_SIZE", 7)
+    total, products, pairs = expected_pairs(db)
+
+    result = frequently_bought_together(db, 1, 1, limit=10)
+    assert result["orders"] == total
+    assert len(result["pairs"]) == 10
+    assert [p["orders"] for p in result["pairs"]] == sorted((n for n in pairs.values()), reverse=True)[:10]
+    for pair in result["pairs"]:
+        a, b = pair["product_a"], pair["product_b"]
+        count = pairs[tuple(sorted((a, b)))]
+        assert pair["orders"] == count
+        assert pair["support"] == round(count / total, 4)
+        assert pair["confidence_a_to_b"] == round(count / products[a], 4)
+        assert pair["confidence_b_to_a"] == round(count / products[b], 4)
+        assert pair["lift"] == pytest.approx(count * total / (products[a] * products[b]), abs=1e-4)
+
+    # Block size doesn't change the answer
+    monkeypatch.setattr(basket, "BASKET_BLOCK_SIZE", 2048)
+    assert frequently_bought_together(db, 1, 1, limit=10) == result
+
+
+def test_min_orders_and_empty_upload(db):
+    _, _, pairs = expected_pairs(db)
+    result = frequently_bought_together(db, 1, 1, limit=1000, min_orders=5)
+    assert len(result["pairs"]) == sum(1 for n in pairs.values() if n >= 5)
+    assert frequently_bought_together(db, 1, 2) == {"orders": 0, "pairs": []}
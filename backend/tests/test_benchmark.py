@@ -0,0 +1,35 @@
+# backend/tests/test_benchmark.py
+
+from benchmarks.analytics_benchmark import plan_stats, compare_to_baseline
+
+
+def test_plan_stats_counts_rows_read_by_scans():
+    plan = {
+        "Execution Time": 1.5,
+        "Plan": {
+            "Node Type": "Hash Join", "Shared Hit Blocks": 12, "Shared Read Blocks": 3,
+            "Plans": [
+                {"Node Type": "Seq Scan", "Actual Rows": 100, "Rows Removed by Filter": 900, "Actual Loops": 1},
+                {"Node Type": "Hash", "Plans": [
+                    {"Node Type": "Index Only Scan", "Actual Rows": 5, "Actual Loops": 4},
+                ]},
+            ],
+        },
+    }
+    assert plan_stats(plan) == {
+        "rows_scanned": 1000 + 20,
+        "shared_hit_blocks": 12,
+        "shared_read_blocks": 3,
+        "execution_ms": 1.5,
+    }
+
+
+def test_compare_to_baseline_flags_slower_and_wider_targets():
+    def run(p95, rows):
+        return {"sizes": {"10000": {"targets": {"handler:time_series": {"p95_ms": p95, "rows_scanned": rows}}}}}
+
+    assert compare_to_baseline(run(11.0, 100), run(10.0, 100), threshold=0.2, min_delta_ms=2.0) == []
+    # 50% slower but below the noise floor
+    assert compare_to_baseline(run(3.0, 100), run(2.0, 100), threshold=0.2, min_delta_ms=2.0) == []
+    regressions = compare_to_baseline(run(20.0, 500), run(10.0, 100), threshold=0.2, min_delta_ms=2.0)
+    assert len(regressions) == 2
@@ -0,0 +1,56 @@
+# backend/tests/test_cache_codec.py
+
+import json
+
+import pytest
+
+from core import cache_codec
+from core import redis_client
+
+VALUE = {"orders_by_hour": [{"hour": h, "orders": h * 3, "share": h / 24} for h in range(24)] * 20,
+         "label": "ünïcode", "missing": None, 7: "int key"}
+
+
+@pytest.mark.parametrize("serializer", [cache_codec.JSON, cache_codec.MSGPACK])
+def test_round_trip_with_and_without_compression(monkeypatch, serializer):
+    if serializer == cache_codec.MSGPACK:
+        pytest.importorskip("msgpack")
+    monkeypatch.setattr(cache_codec, "CACHE_SERIALIZER", serializer)
+
+    payload = cache_codec.dumps(VALUE)
+    header = cache_codec.FORMAT_HEADERS[serializer]
+    if cache_codec.zstandard is not None:
+        # Far above the threshold and very repetitive
+        assert payload[0] == header | cache_codec.COMPRESSED_FLAG
+        assert len(payload) < len(json.dumps(VALUE)) / 5
+        assert cache_codec.payload_size(payload) > len(payload)
+    decoded = cache_codec.loads(payload)
+    assert decoded["orders_by_hour"] == VALUE["orders_by_hour"]
+    assert decoded["label"] == "ünïcode" and decoded["missing"] is None
+
+    small = cache_codec.dumps([1, 2])
+    assert small[0] == header and cache_codec.loads(small) == [1, 2]
+
+
+def test_plain_json_entries_are_still_read(monkeypatch):
+    monkeypatch.setattr(cache_codec, "msgpack", None)
+    assert cache_codec.preferred_serializer() == cache_codec.JSON
+
+    legacy = json.dumps({redis_client.ENTRY_METADATA: {"created_at": 1.0}, "value": {"a": float("nan")}}).encode()
+    value, metadata = redis_client._decode_entry(legacy)
+    assert metadata == {"created_at": 1.0} and list(value) == ["a"]
+    assert redis_client._decode_entry(json.dumps([1, 2]).encode()) == ([1, 2], {})
+    assert redis_client._decode_entry(b"not json") is None
+
+
+def test_undecodable_payloads_are_misses():
+    for raw in (
+        b"\x02\x93\x01",          # truncated msgpack array
+        b"\x02\x01\x02",          # msgpack with extra data
+        b"\x02\xa2\xff\xfe",      # msgpack string that isn't UTF-8
+        b"\x82garbage",           # not a zstd frame
+        b"\x01\xff",              # JSON that isn't UTF-8
+    ):
+        with pytest.raises(ValueError):
+            cache_codec.loads(raw)
+        assert redis_client._decode_entry(raw) is None
@@ -0,0 +1,157 @@
+# backend/tests/test_cache_flight.py
+
+import asyncio
+import time
+from unittest.mock import patch
+
+from core import cache_flight
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def counting_compute(calls):
+    async def compute():
+        calls.append(1)
+        return {"fresh": True}
+    return compute
+
+
+def test_xfetch_refreshes_only_near_expiry():
+    now = time.time()
+    with patch('core.cache_flight.random.random', return_value=0.5):
+        # -ln(0.5) * 2s compute time is ~1.4s ahead of expiry
+        assert not cache_flight.should_refresh_early({"expires_at": now + 60, "compute_time": 2.0})
+        assert cache_flight.should_refresh_early({"expires_at": now + 1, "compute_time": 2.0})
+    assert not cache_flight.should_refresh_early({})
+
+
+def test_hit_miss_and_waiting_for_another_flight():
+    calls = []
+    with patch('core.cache_flight.cache') as cache, \
+         patch('core.cache_flight._acquire') as acquire, \
+         patch('core.cache_flight._release') as release, \
+         patch('core.cache_flight._wait_for_flights') as wait:
+        # Fresh hit: nothing computed, no lock taken
+        cache.cache_get_entry.return_value = ({"cached": True}, {"expires_at": time.time() + 3600})
+        assert run(cache_flight.get_or_compute("k", counting_compute(calls))) == {"cached": True}
+        acquire.assert_not_called()
+
+        # Miss while another request computes: its result is used
+        cache.cache_get_entry.return_value = None
+        acquire.return_value = None
+        wait.return_value = [({"theirs": True}, {"created_at": time.time()})]
+        assert run(cache_flight.get_or_compute("k", counting_compute(calls))) == {"theirs": True}
+        assert calls == []
+
+        # Miss with the lock: computed once, stored, lock released
+        acquire.return_value = "token"
+        assert run(cache_flight.get_or_compute("k", counting_compute(calls), tags=["t"])) == {"fresh": True}
+        assert calls == [1]
+        assert cache.cache_set.call_args.args[:2] == ("k", {"fresh": True})
+        release.assert_called_once_with("k", "token")
+
+
+def test_failed_flight_releases_the_lock():
+    async def failing():
+        raise ValueError("boom")
+
+    with patch('core.cache_flight.cache') as cache, \
+         patch('core.cache_flight._acquire', return_value="token"), \
+         patch('core.cache_flight._release') as release:
+        cache.cache_get_entry.return_value = None
+        try:
+            run(cache_flight.get_or_compute("k", failing))
+        except ValueError:
+            pass
+        release.assert_called_once_with("k", "token")
+        cache.cache_set.assert_not_called()
+
+
+def test_failed_early_refresh_serves_the_cached_value():
+    async def failing(*args):
+        raise ValueError("boom")
+
+    near_expiry = {"expires_at": time.time() + 1}
+    with patch('core.cache_flight.cache') as cache, \
+         patch('core.cache_flight.should_refresh_early', return_value=True), \
+         patch('core.cache_flight._acquire', return_value="token"), \
+         patch('core.cache_flight._release') as release, \
+         patch('core.cache_flight._release_many'):
+        cache.cache_get_entry.return_value = ("cached", near_expiry)
+        assert run(cache_flight.get_or_compute("k", failing)) == "cached"
+        release.assert_called_once_with("k", "token")
+
+        cache.cache_get_many.return_value = [("cached", near_expiry)]
+        assert run(cache_flight.get_or_compute_many({"a": "k:a"}, failing)) == {"a": "cached"}
+        cache.cache_set.assert_not_called()
+        cache.cache_set_many.assert_not_called()
+
+
+def test_many_reads_once_and_computes_only_what_is_missing():
+    computed = []
+
+    async def compute(names):
+        computed.append(names)
+        return {name: name.upper() for name in names}
+
+    keys = {"a": "k:a", "b": "k:b", "c": "k:c"}
+    with patch('core.cache_flight.cache') as cache, \
+         patch('core.cache_flight._acquire_many', return_value=["token", None]) as acquire, \
+         patch('core.cache_flight._release_many') as release, \
+         patch('core.cache_flight._wait_for_flights', return_value=[("C", {"created_at": time.time()})]) as wait:
+        cache.cache_get_many.return_value = [("cached", {"expires_at": time.time() + 3600}), None, None]
+
+        assert run(cache_flight.get_or_compute_many(keys, compute)) == {"a": "cached", "b": "B", "c": "C"}
+
+        cache.cache_get_many.assert_called_once_with(["k:a", "k:b", "k:c"])
+        # "c" was being computed by another request
+        assert computed == [["b"]]
+        assert cache.cache_set_many.call_args.args[0] == {"k:b": "B"}
+        acquire.assert_called_once_with(["k:b", "k:c"])
+        release.assert_called_once_with([("k:b", "token")])
+        wait.assert_called_once_with(["k:c"])
+
+
+def test_stale_entries_are_served_and_refreshed_in_the_background():
+    calls = []
+    stale = ({"cached": True}, {"stale_at": time.time() - 1, "expires_at": time.time() + 3600})
+    with patch('core.cache_flight.cache') as cache, \
+         patch('core.cache_flight._acquire') as acquire, \
+         patch('rq.Queue') as queue:
+        cache.redis_client.pipeline.return_value.execute.return_value = [True]
+        cache.cache_get_entry.return_value = stale
+        revalidate = ("projections:forecast", 1, 2, 30, "naive")
+
+        value = run(cache_flight.get_or_compute("k", counting_compute(calls), revalidate=revalidate))
+        assert value == {"cached": True} and calls == []
+        acquire.assert_not_called()
+        queue.return_value.enqueue.assert_called_once_with(cache_flight.REFRESH_TASK, *revalidate)
+
+        # A refresh is already queued for the key: nothing more is enqueued
+        cache.redis_client.pipeline.return_value.execute.return_value = [None]
+        assert run(cache_flight.get_or_compute("k", counting_compute(calls), revalidate=revalidate)) == {"cached": True}
+        assert queue.return_value.enqueue.call_count == 1
+
+        # Without revalidate a stale entry is served until it expires, as before
+        assert run(cache_flight.get_or_compute("k", counting_compute(calls))) == {"cached": True}
+        assert queue.return_value.enqueue.call_count == 1 and calls == []
+
+
+def test_stale_metrics_are_refreshed_by_one_job():
+    fresh = {"stale_at": time.time() + 3600}
+    old = {"stale_at": time.time() - 1}
+
+    async def compute(names):
+        raise AssertionError("nothing is missing")
+
+    with patch('core.cache_flight.cache') as cache, patch('rq.Queue') as queue:
+        cache.cache_get_many.return_value = [("A", old), ("B", fresh), ("C", old)]
+        # A refresh of "c" is already queued
+        cache.redis_client.pipeline.return_value.execute.return_value = [True, None]
+        keys = {"a": "k:a", "b": "k:b", "c": "k:c"}
+        values = run(cache_flight.get_or_compute_many(keys, compute, revalidate=("analytics:metric", 1, 2)))
+
+        assert values == {"a": "A", "b": "B", "c": "C"}
+        queue.return_value.enqueue.assert_called_once_with(cache_flight.REFRESH_TASK, "analytics:metric", 1, 2, ["a"])
@@ -0,0 +1,45 @@
+# backend/tests/test_cache_warming.py
+
+from unittest.mock import MagicMock, patch
+
+from core import cache_warming
+
+
+async def fake_get_or_compute(key, compute, **kwargs):
+    return await compute()
+
+
+def test_enabled_warmers_follow_the_configuration(monkeypatch):
+    monkeypatch.setattr(cache_warming, "CACHE_WARM_METRICS", " forecast, unknown ,orders_summary")
+    assert cache_warming.enabled_warmers() == ["forecast", "orders_summary"]
+    monkeypatch.setattr(cache_warming, "CACHE_WARM_METRICS", "none")
+    assert cache_warming.enabled_warmers() == []
+
+
+def test_each_warmer_is_cached_skipped_or_failed_on_its_own(monkeypatch):
+    def empty(db, user_id, upload_id):
+        raise cache_warming.NothingToCache()
+
+    def broken(db, user_id, upload_id, days):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(cache_warming, "CACHED_PAYLOADS", {
+        "test:ok": lambda db, user_id, upload_id: {"upload_id": upload_id},
+        "test:empty": empty,
+        "test:broken": broken,
+    })
+    monkeypatch.setattr(cache_warming, "CACHE_WARMERS", {
+        "ok": ("test:ok",),
+        "empty": ("test:empty",),
+        "broken": ("test:broken", 30),
+    })
+    db = MagicMock()
+    with patch("core.cache_warming.get_or_compute", side_effect=fake_get_or_compute) as get_or_compute, \
+         patch("core.cache_warming.generate_cache_key", side_effect=lambda *args: ":".join(map(str, args))), \
+         patch("core.cache_warming.cache_tags", return_value=["tag"]):
+        statuses = cache_warming.warm_upload_cache(db, 1, 2, metrics=["broken", "empty", "ok"])
+
+    assert statuses == {"broken": "failed", "empty": "skipped", "ok": "cached"}
+    # Same keys the endpoints would build
+    assert [c.args[0] for c in get_or_compute.call_args_list] == ["test:broken:1:2:30", "test:empty:1:2", "test:ok:1:2"]
+    db.rollback.assert_called_once()
@@ -0,0 +1,93 @@
+# backend/tests/test_cohorts.py
+
+import datetime
+import random
+from collections import defaultdict
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from db.database import Base
+from db import models
+from core.cohorts import update_cohorts, rebuild_cohorts, cohort_retention
+
+engine = create_engine(
+    "sqlite:///:memory:",
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = TestingSessionLocal()
+    session.add(models.User(id=1, username="owner", email="owner@example.com", hashed_password="x"))
+    rng = random.Random(7)
+    # Upload 1: Jan-Mar 2024, upload 2: Mar-Jun 2024, upload 3: Nov-Dec 2023
+    # (an older export that lands last and moves customers to earlier cohorts)
+    for upload_id, months in ((1, [(2024, 1), (2024, 2), (2024, 3)]),
+                              (2, [(2024, 3), (2024, 4), (2024, 5), (2024, 6)]),
+                              (3, [(2023, 11), (2023, 12)])):
+        session.add(models.Upload(id=upload_id, user_id=1, file_name="orders.csv",
+                                  file_path=f"supabase://uploads/{upload_id}/orders.csv", file_size=1))
+        for i in range(150):
+            year, month = rng.choice(months)
+            session.add(models.Order(user_id=1, upload_id=upload_id, name=f"#{upload_id}-{i}",
+                                     email=f"c{rng.randrange(60)}@example.com", total=Decimal("10.00"),
+                                     created_at=datetime.datetime(year, month, rng.randint(1, 28)) if i % 10 else None))
+    session.commit()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+
+def expected_grid(db):
+    """
+    The cohort grid computed straight from every order.
+    """
+    months = defaultdict(set)
+    for email, created_at in db.query(models.Order.email, models.Order.created_at):
+        if created_at is not None:
+            months[email].add((created_at.year, created_at.month))
+    grid = defaultdict(lambda: defaultdict(int))
+    for active in months.values():
+        first = min(active)
+        for year, month in active:
+            grid[f"{first[0]}-{first[1]:02d}"][(year - first[0]) * 12 + month - first[1]] += 1
+    return {
+        cohort: [cells.get(p, 0) for p in range(max(cells) + 1)]
+        for cohort, cells in sorted(grid.items())
+    }
+
+
+def grid_of(result):
+    return {row["cohort"]: row["retained"] for row in result["cohorts"]}
+
+
+def test_incremental_updates_match_a_full_computation(db):
+    for upload_id in (1, 2, 3):
+        update_cohorts(db, 1, upload_id)
+    result = cohort_retention(db, 1)
+    assert grid_of(result) == expected_grid(db)
+    assert result["cohorts"][0]["cohort"] == "2023-11"
+    assert all(row["retention_rate"][0] == 1.0 for row in result["cohorts"])
+
+    # Re-ingesting an upload that was already counted changes nothing
+    update_cohorts(db, 1, 2)
+    assert cohort_retention(db, 1) == result
+
+
+def test_rebuild_after_deleting_an_upload(db):
+    for upload_id in (1, 2, 3):
+        update_cohorts(db, 1, upload_id)
+    db.query(models.Order).filter(models.Order.upload_id == 3).delete()
+    db.commit()
+
+    rebuild_cohorts(db, 1)
+    assert grid_of(cohort_retention(db, 1)) == expected_grid(db)
+    assert "2023-11" not in grid_of(cohort_retention(db, 1))
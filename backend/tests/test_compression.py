@@ -0,0 +1,58 @@
+# backend/tests/test_compression.py
+
+import gzip
+
+import pytest
+
+from core import compression
+from core.orders_processing import read_order_file
+
+CSV_CONTENT = b"Name,Email,Total\n#1001,a@example.com,10.00\n#1002,b@example.com,20.50\n"
+
+
+@pytest.mark.parametrize("codec", [compression.GZIP, compression.ZSTD])
+def test_read_order_file_decompresses_stored_uploads(tmp_path, codec):
+    """Worker temp files have no extension, so the codec is sniffed from the bytes."""
+    if codec == compression.ZSTD and compression.zstandard is None:
+        pytest.skip("zstandard is not installed")
+    path = tmp_path / "download"
+    path.write_bytes(compression.compress_bytes(CSV_CONTENT, codec))
+
+    assert compression.detect_codec(str(path)) == codec
+    df = read_order_file(str(path))
+    assert list(df["Name"]) == ["#1001", "#1002"]
+    assert list(df["Total"]) == [10.0, 20.5]
+
+
+def test_read_order_file_uses_recorded_codec(tmp_path, monkeypatch):
+    """The codec recorded on the upload is used as is; only legacy uploads are sniffed."""
+    path = tmp_path / "download"
+    path.write_bytes(gzip.compress(CSV_CONTENT))
+
+    def detect_codec(file_path):
+        raise AssertionError("codec sniffed although one was recorded")
+
+    monkeypatch.setattr("core.orders_processing.detect_codec", detect_codec)
+    df = read_order_file(str(path), compression=compression.GZIP)
+    assert list(df["Name"]) == ["#1001", "#1002"]
+
+
+def test_read_order_file_accepts_client_compressed_csv(tmp_path):
+    """.csv.gz uploads are read as CSV once the codec suffix is stripped."""
+    path = tmp_path / "orders.csv.gz"
+    path.write_bytes(gzip.compress(b"Id,Total\n1,5\n2,6\n"))
+
+    df = read_order_file(str(path))
+    assert list(df["Total"]) == [5, 6]
+
+
+def test_split_codec_extension():
+    assert compression.split_codec_extension("orders.csv.gz") == ("orders.csv", compression.GZIP)
+    assert compression.split_codec_extension("Orders.CSV.ZST") == ("Orders.CSV", compression.ZSTD)
+    assert compression.split_codec_extension("orders.csv") == ("orders.csv", None)
+
+
+def test_invalid_upload_compression_falls_back_to_none():
+    assert compression._configured_codec(" GZIP ") == compression.GZIP
+    assert compression._configured_codec("none") is None
+    assert compression._configured_codec("brotli") is None
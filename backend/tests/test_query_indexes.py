@@ -0,0 +1,181 @@
+# backend/tests/test_query_indexes.py
+#
+# EXPLAINs every query the registry handlers send against orders/line_items on
+# Postgres and asserts each one is pruned to the queried upload's partitions and
+# reads them sequentially or through the indexes added for the analytics mix.
+# Set TEST_POSTGRES_URL to an empty scratch database to run it; the planner's
+# choices on any other database say nothing about production.
+
+import datetime
+import os
+import re
+from decimal import Decimal
+
+import pytest
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, event, insert, text
+from sqlalchemy.orm import sessionmaker
+
+from db.database import Base
+from db import models
+from db.partitions import ensure_upload_partitions, partition_name
+from analytics_service import ANALYTICS_REGISTRY
+
+pytestmark = pytest.mark.skipif(
+    not os.getenv("TEST_POSTGRES_URL"), reason="set TEST_POSTGRES_URL to check the Postgres plans"
+)
+
+# Indexes the plans may read each table through (see migrations 4b8e1d6f2a57 and
+# d4f7a2c9e1b6), by their names on the partitioned parents
+EXPECTED_INDEXES = {
+    "orders": {"idx_orders_user_created", "idx_orders_created_at_brin"},
+    "line_items": {"idx_line_items_order_id"},
+}
+
+ALEMBIC_INI = os.path.join(os.path.dirname(__file__), "..", "alembic.ini")
+
+# Enough users and uploads that the one queried is a small slice of the tables,
+# as in production, so the planner picks the indexes on its own statistics
+USERS = 10
+UPLOADS_PER_USER = 4
+ORDERS_PER_UPLOAD = 1000
+
+
+def upgrade_to_head(engine):
+    """
+    Builds the schema with the migrations rather than create_all, so orders and
+    line_items are partitioned per upload and indexed as in production.
+    """
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("script_location", os.path.join(os.path.dirname(ALEMBIC_INI), "migrations"))
+    script = ScriptDirectory.from_config(config)
+    with engine.begin() as conn:
+        context = MigrationContext.configure(
+            conn, opts={"script": script, "fn": lambda revision, _: script._upgrade_revs("head", revision)}
+        )
+        with Operations.context(context):
+            context.run_migrations()
+
+
+@pytest.fixture(scope="module")
+def db():
+    engine = create_engine(os.environ["TEST_POSTGRES_URL"])
+    upgrade_to_head(engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+    users, uploads, orders, line_items = [], [], [], []
+    for user_id in range(1, USERS + 1):
+        users.append({"id": user_id, "username": f"user{user_id}", "email": f"user{user_id}@example.com",
+                      "hashed_password": "x"})
+        for n in range(UPLOADS_PER_USER):
+            upload_id = (user_id - 1) * UPLOADS_PER_USER + n + 1
+            uploads.append({"id": upload_id, "user_id": user_id, "file_name": "orders.csv",
+                            "file_path": f"supabase://uploads/{upload_id}/orders.csv", "file_size": 1})
+            for i in range(ORDERS_PER_UPLOAD):
+                order_id = len(orders) + 1
+                orders.append({"id": order_id, "user_id": user_id, "upload_id": upload_id, "name": f"#{order_id}",
+                               "email": f"c{i % 300}@example.com", "total": Decimal("10.00"),
+                               "shipping_city": f"City {i % 40}", "discount_code": f"SAVE{i % 5}",
+                               "discount_amount": Decimal("1.00"),
+                               "created_at": datetime.datetime(2024, 1, 1) + datetime.timedelta(hours=7 * i)})
+                line_items.append({"order_id": order_id, "upload_id": upload_id, "lineitem_name": f"Hat {i % 50}",
+                                   "lineitem_quantity": 1, "lineitem_price": Decimal("10.00")})
+    session.execute(insert(models.User), users)
+    session.execute(insert(models.Upload), uploads)
+    for upload in uploads:
+        ensure_upload_partitions(session, upload["id"])
+    session.execute(insert(models.Order), orders)
+    session.execute(insert(models.LineItem), line_items)
+    session.commit()
+    session.execute(text("ANALYZE"))
+    session.commit()
+
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE alembic_version"))
+    engine.dispose()
+
+
+def capture_selects(db, handler):
+    statements = []
+    engine = db.get_bind()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        handler(db, 1, 1)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return statements
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def parent_index(conn, name):
+    """
+    Name of the partitioned index a partition's index belongs to. Postgres
+    names the indexes it creates on each partition itself.
+    """
+    return conn.execute(text(
+        "SELECT coalesce((SELECT parent.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "WHERE pg_inherits.inhrelid = to_regclass(:name)), :name)"
+    ), {"name": name}).scalar()
+
+
+def table_reads(conn, statement, parameters):
+    """
+    (table, partition, node type, parent index name or None) of every plan
+    node reading orders/line_items or one of their partitions.
+    """
+    (plan,), = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters)
+    reads = []
+    for node in plan_nodes(plan[0]["Plan"]):
+        if node.get("Node Type") == "Bitmap Heap Scan":
+            # The index is named on the Bitmap Index Scan below it
+            index = next(
+                (child["Index Name"] for child in plan_nodes(node) if child.get("Node Type") == "Bitmap Index Scan"),
+                None,
+            )
+        else:
+            index = node.get("Index Name")
+        relation = node.get("Relation Name", "")
+        table = re.sub(r"_upload_\d+$", "", relation)
+        if table in EXPECTED_INDEXES:
+            reads.append((table, relation, node["Node Type"], index and parent_index(conn, index)))
+    return reads
+
+
+@pytest.mark.parametrize("metric_key", [key for key, info in ANALYTICS_REGISTRY.items() if info["handler"]])
+def test_registry_queries_use_indexes(db, metric_key):
+    # No rollups were built, so the handlers query the raw rows
+    statements = capture_selects(db, ANALYTICS_REGISTRY[metric_key]["handler"])
+    db.rollback()
+
+    table_statements = [(s, p) for s, p in statements if re.search(r"\b(orders|line_items)\b", s)]
+    if not table_statements:
+        pytest.skip(f"{metric_key} doesn't read orders/line_items")
+
+    conn = db.connection()
+    for statement, parameters in table_statements:
+        for table, relation, node_type, index in table_reads(conn, statement, parameters):
+            # Pruned to upload 1: a sequential read of its partition is the whole upload
+            assert relation == partition_name(table, 1), (
+                f"{metric_key} reads {relation}, not only the queried upload's partition\n{statement}"
+            )
+            assert node_type == "Seq Scan" or index in EXPECTED_INDEXES[table], (
+                f"{metric_key} reads {relation} with a {node_type} "
+                f"(index {index}, expected one of {sorted(EXPECTED_INDEXES[table])})\n{statement}"
+            )
@@ -0,0 +1,127 @@
+# backend/tests/test_redis_client.py
+
+from unittest.mock import patch
+
+from core import redis_client
+from core.local_cache import LocalCache
+
+
+def test_cache_keys_carry_their_scopes_generation():
+    with patch('core.redis_client.redis_client') as mock_redis:
+        mock_redis.mget.return_value = [b"3", b"5"]
+
+        key = redis_client.generate_cache_key("projections:forecast", 1, 2, 30, "naive")
+
+        assert key == "projections:forecast:1:2:30:naive:g5"
+        mock_redis.mget.assert_called_once_with(["cache:generation:user:1", "cache:generation:upload:2"])
+
+        # Entries spanning the user's uploads follow the user's generation
+        mock_redis.mget.return_value = [b"3"]
+        assert redis_client.generate_cache_key("analytics:metric", 4, None, "cohort_retention") == (
+            "analytics:metric:4:None:cohort_retention:g3"
+        )
+        mock_redis.mget.assert_called_with(["cache:generation:user:4"])
+
+
+def test_bump_generation_changes_the_key():
+    counters = {}
+    with patch('core.redis_client.redis_client') as mock_redis:
+        mock_redis.mget.side_effect = lambda keys: [counters.get(k) for k in keys]
+        mock_redis.pipeline.return_value.incr.side_effect = (
+            lambda k: counters.__setitem__(k, counters.get(k, 0) + 1)
+        )
+        before = redis_client.generate_cache_key("analytics:full", 1, 2)
+
+        redis_client.bump_generation(upload_id=2)
+        after_upload = redis_client.generate_cache_key("analytics:full", 1, 2)
+        # Other uploads of the user keep their entries
+        assert redis_client.generate_cache_key("analytics:full", 1, 3) == "analytics:full:1:3:g0"
+
+        # The user's generation only versions entries spanning uploads
+        user_before = redis_client.generate_cache_key("analytics:full", 1, None)
+        redis_client.bump_generation(user_id=1)
+        assert redis_client.generate_cache_key("analytics:full", 1, 3) == "analytics:full:1:3:g0"
+        user_after = redis_client.generate_cache_key("analytics:full", 1, None)
+
+    assert (before, after_upload, user_before, user_after) == (
+        "analytics:full:1:2:g0", "analytics:full:1:2:g1", "analytics:full:1:None:g0", "analytics:full:1:None:g1"
+    )
+
+
+def test_cache_set_registers_the_key_in_its_tag_sets():
+    with patch('core.redis_client.redis_client') as mock_redis:
+        pipe = mock_redis.pipeline.return_value
+        pipe.execute.return_value = [True, 1, True, 1, True]
+
+        assert redis_client.cache_set("analytics:full:1:2:g0", {"a": 1}, tags=redis_client.cache_tags(1, 2))
+
+        key, expiry, payload = pipe.setex.call_args.args
+        assert (key, expiry) == ("analytics:full:1:2:g0", redis_client.DEFAULT_CACHE_EXPIRY)
+        value, metadata = redis_client._decode_entry(payload)
+        assert value == {"a": 1}
+        assert metadata["expires_at"] - metadata["created_at"] == redis_client.DEFAULT_CACHE_EXPIRY
+        assert [call.args for call in pipe.sadd.call_args_list] == [
+            ("cache:tag:user:1", "analytics:full:1:2:g0"),
+            ("cache:tag:upload:1:2", "analytics:full:1:2:g0"),
+        ]
+
+
+def test_clearing_a_tag_deletes_in_batches_without_keys():
+    keys = [f"analytics:full:1:{i}:g0" for i in range(1200)]
+    with patch('core.redis_client.redis_client') as mock_redis:
+        mock_redis.exists.return_value = 1
+        mock_redis.sscan_iter.return_value = iter(keys)
+        pipe = mock_redis.pipeline.return_value
+        pipe.execute.side_effect = lambda: [len(pipe.delete.call_args.args)]
+
+        assert redis_client.cache_clear_tag("cache:tag:user:1") == 1200
+
+        batches = [len(call.args) for call in pipe.delete.call_args_list]
+        assert batches == [500, 500, 200]
+        mock_redis.delete.assert_called_once_with("cache:tag:user:1")
+        mock_redis.keys.assert_not_called()
+
+        # Without a tag set the caller falls back to a SCAN over a pattern
+        mock_redis.exists.return_value = 0
+        assert redis_client.cache_clear_tag("cache:tag:user:2") is None
+        mock_redis.scan_iter.return_value = iter(keys[:3])
+        assert redis_client.cache_clear_pattern("analytics:*:1:*") == 3
+        mock_redis.scan_iter.assert_called_once_with(match="analytics:*:1:*", count=500)
+        mock_redis.keys.assert_not_called()
+
+
+def test_local_cache_is_size_bounded_lru_and_drops_racing_fills():
+    cache = LocalCache(max_bytes=800, ttl=60)
+    cache.put("a", 1, 10)
+    assert cache.get("a") == (False, None)  # disabled until the listener subscribes
+
+    cache.set_enabled(True)
+    for key in "abcd":
+        cache.put(key, key.upper(), 100)
+    cache.get("a")
+    cache.put("e", "E", 100)
+    cache.put("f", "F", 100)
+    cache.put("g", "G", 100)
+    cache.put("h", "H", 100)
+    cache.put("i", "I", 100)
+    # "b" was least recently used; "a" was read after it
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, "A")
+    assert cache.size <= 800
+
+    # Entries over an eighth of the budget, expired entries and fills that raced
+    # with an invalidation are not kept
+    cache.put("big", "x", 101)
+    cache.put("old", "x", 10, ttl=0)
+    version = cache.version
+    cache.discard(["a"])
+    cache.put("raced", "x", 10, version=version)
+    assert [cache.get(k)[0] for k in ("big", "old", "raced", "a")] == [False] * 4
+
+
+def test_no_invalidation_listener_in_rq_jobs():
+    with patch('rq.get_current_job', return_value=object()), \
+         patch('core.redis_client._listener_pid', None), \
+         patch('core.redis_client.threading.Thread') as thread:
+        redis_client._ensure_listener()
+    thread.assert_not_called()
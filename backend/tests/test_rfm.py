@@ -0,0 +1,69 @@
+# backend/tests/test_rfm.py
+
+import datetime
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from db.database import Base
+from db import models
+from core.rollups import build_upload_rollups
+from analytics_service import _quintile_scores, get_rfm_segments
+
+engine = create_engine(
+    "sqlite:///:memory:",
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = TestingSessionLocal()
+    session.add(models.User(id=1, username="owner", email="owner@example.com", hashed_password="x"))
+    session.add(models.Upload(id=1, user_id=1, file_name="orders.csv",
+                              file_path="supabase://uploads/1/orders.csv", file_size=1))
+    # Customer i places i % 4 + 1 orders of i + 1 each, the last one 49 - i days before June 30
+    for i in range(50):
+        for n in range(i % 4 + 1):
+            session.add(models.Order(user_id=1, upload_id=1, name=f"#{i}-{n}", email=f"c{i}@example.com",
+                                     total=Decimal(i + 1),
+                                     created_at=datetime.datetime(2024, 6, 30) - datetime.timedelta(days=49 - i + 7 * n)))
+    session.commit()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+
+def test_quintile_scores_match_rank_quintiles():
+    rng = np.random.default_rng(3)
+    for values in (rng.normal(size=1001), rng.integers(0, 4, size=500).astype(float), np.array([7.0])):
+        # Brute force: 1 + floor(5 * (number of smaller values) / n)
+        expected = [1 + (values < v).sum() * 5 // len(values) for v in values]
+        assert list(_quintile_scores(values)) == expected
+
+
+def test_rfm_segments_from_raw_orders_and_rollups(db):
+    raw = get_rfm_segments(db, 1, 1)
+    assert raw["reference_date"] == "2024-06-30"
+    assert raw["customers"] == 50
+    segments = {row["segment"]: row for row in raw["segments"]}
+    assert sum(row["customers"] for row in raw["segments"]) == 50
+    assert sum(row["revenue"] for row in raw["segments"]) == sum((i + 1) * (i % 4 + 1) for i in range(50))
+    # The 20 most recent customers score r>=4; only the 4-order customers score f>=4
+    assert segments["champions"]["customers"] == 5
+    assert segments["champions"]["avg_recency_days"] < segments["lost"]["avg_recency_days"]
+
+    # customer_rollups hold the same per-customer aggregate
+    build_upload_rollups(db, user_id=1, upload_id=1)
+    assert get_rfm_segments(db, 1, 1) == raw
+
+
+def test_rfm_segments_without_customers(db):
+    assert get_rfm_segments(db, 1, 2) == {"reference_date": None, "customers": 0, "segments": []}
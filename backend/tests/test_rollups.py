@@ -0,0 +1,118 @@
+# backend/tests/test_rollups.py
+
+import datetime
+import os
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from db.database import Base
+from db import models
+from core.rollups import build_upload_rollups, has_rollups, customer_counts
+from analytics_engine import fused_metrics
+from analytics_service import (
+    get_orders_summary, get_orders_time_series, get_top_cities_by_revenue, get_repeat_customer_metrics
+)
+
+engine = create_engine(
+    "sqlite:///:memory:",
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = TestingSessionLocal()
+    session.add(models.User(id=1, username="owner", email="owner@example.com", hashed_password="x"))
+    session.add(models.Upload(id=1, user_id=1, file_name="orders.csv",
+                              file_path="supabase://uploads/1/orders.csv", file_size=1))
+    for i, email in enumerate(["a@example.com", "a@example.com", "b@example.com"]):
+        session.add(models.Order(user_id=1, upload_id=1, name=f"#{1000 + i}", email=email,
+                                 total=Decimal("10.00"), created_at=datetime.datetime(2024, 3, 1 + i)))
+    session.commit()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+
+def add_rollup(db, dimension, **values):
+    db.add(models.UploadRollup(user_id=1, upload_id=1, dimension=dimension, **values))
+
+
+def test_build_upload_rollups_aggregates_customers(db):
+    # Order-level rollups need Postgres; the per-customer rollup is built everywhere
+    assert build_upload_rollups(db, user_id=1, upload_id=1) is False
+    assert not has_rollups(db, 1, 1)
+
+    customers = {c.email: c for c in db.query(models.CustomerRollup).all()}
+    assert customers["a@example.com"].order_count == 2
+    assert customers["a@example.com"].revenue == Decimal("20.00")
+    assert customers["a@example.com"].first_order_at == datetime.datetime(2024, 3, 1)
+    assert customers["b@example.com"].last_order_at == datetime.datetime(2024, 3, 3)
+
+
+def test_handlers_read_rollups(db):
+    build_upload_rollups(db, user_id=1, upload_id=1)
+    # Rollup values deliberately differ from the raw orders, to prove which one is read
+    add_rollup(db, "total", order_count=40, revenue=Decimal("400.00"), revenue_rows=40)
+    add_rollup(db, "day", key_ts=datetime.datetime(2024, 3, 2), order_count=15)
+    add_rollup(db, "day", key_ts=datetime.datetime(2024, 3, 1), order_count=25)
+    add_rollup(db, "city", key_text="Paris", order_count=3, revenue=Decimal("90.00"), revenue_rows=3)
+    add_rollup(db, "city", key_text="nan", order_count=9, revenue=Decimal("900.00"), revenue_rows=9)
+    add_rollup(db, "city", key_text="Lyon", order_count=1, revenue=None, revenue_rows=0)
+    db.commit()
+
+    assert get_orders_summary(db, 1, 1) == {"total_orders": 40, "total_revenue": 400.0, "average_order_value": 10.0}
+    assert get_orders_time_series(db, 1, 1) == [
+        {"date": "2024-03-01", "orderCount": 25},
+        {"date": "2024-03-02", "orderCount": 15},
+    ]
+    assert get_top_cities_by_revenue(db, 1, 1) == [{"city": "Paris", "revenue": 90.0}]
+    assert get_repeat_customer_metrics(db, 1, 1) == {
+        "unique_count": 2, "repeat_count": 1, "repeat_rate_percent": 50.0
+    }
+
+
+@pytest.mark.parametrize("backend", ["sqlite"] + (["postgresql"] if os.getenv("TEST_POSTGRES_URL") else []))
+def test_orders_without_email_are_no_customer_on_every_path(backend, monkeypatch):
+    # TEST_POSTGRES_URL: an empty scratch database, where the fused SQL runs too
+    test_engine = create_engine(os.environ["TEST_POSTGRES_URL"]) if backend == "postgresql" else engine
+    # Ingestion stores a placeholder for a missing email, but customer_rollups.email
+    # is nullable and every path filters NULL emails; check they agree on them
+    monkeypatch.setattr(models.Order.__table__.c.email, "nullable", True)
+    Base.metadata.create_all(bind=test_engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=test_engine)
+    db = Session()
+    try:
+        db.add(models.User(id=1, username="owner", email="owner@example.com", hashed_password="x"))
+        db.add(models.Upload(id=1, user_id=1, file_name="orders.csv",
+                             file_path="supabase://uploads/1/orders.csv", file_size=1))
+        # a@ is a repeat customer, b@ isn't; the three orders without an email are nobody's
+        for i, email in enumerate(["a@example.com", "a@example.com", "b@example.com", None, None, None]):
+            db.add(models.Order(user_id=1, upload_id=1, name=f"#{1000 + i}", email=email,
+                                total=Decimal("10.00"), created_at=datetime.datetime(2024, 3, 1 + i)))
+        db.commit()
+
+        expected = {"unique_count": 2, "repeat_count": 1, "repeat_rate_percent": 50.0}
+        assert get_repeat_customer_metrics(db, 1, 1) == expected
+        if backend == "postgresql":
+            assert fused_metrics(db, 1, 1, ["repeat_customers"]) == {"repeat_customers": expected}
+
+        build_upload_rollups(db, user_id=1, upload_id=1)
+        db.commit()
+        assert customer_counts(db, 1, 1) == (2, 1)
+        if backend == "postgresql":
+            # A fresh session, so nothing computed before the rollups is reused
+            with Session() as rollup_db:
+                assert has_rollups(rollup_db, 1, 1)
+                assert get_repeat_customer_metrics(rollup_db, 1, 1) == expected
+                assert fused_metrics(rollup_db, 1, 1, ["repeat_customers"]) == {"repeat_customers": expected}
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=test_engine)
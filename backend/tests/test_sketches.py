@@ -0,0 +1,135 @@
+# backend/tests/test_sketches.py
+
+import datetime
+from collections import Counter
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from db.database import Base
+from db import models
+import numpy as np
+
+from core.sketches import HyperLogLog, TopK, KLL
+from core.sketch_store import build_upload_sketches, distinct_customers, top_k, quantile_summary
+
+engine = create_engine(
+    "sqlite:///:memory:",
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = TestingSessionLocal()
+    session.add(models.User(id=1, username="owner", email="owner@example.com", hashed_password="x"))
+    for upload_id in (1, 2):
+        session.add(models.Upload(id=upload_id, user_id=1, file_name="orders.csv",
+                                  file_path=f"supabase://uploads/{upload_id}/orders.csv", file_size=1))
+    # Upload 1: customers 0-199 over March 1-4; upload 2: customers 100-299 on March 5
+    for i in range(200):
+        session.add(models.Order(user_id=1, upload_id=1, name=f"#{i}", email=f"c{i}@example.com",
+                                 total=Decimal("10.00"), created_at=datetime.datetime(2024, 3, 1 + i % 4),
+                                 shipping_city=["Leeds", "York", "Hull", "nan"][i % 4]))
+        session.add(models.Order(user_id=1, upload_id=2, name=f"#{i}", email=f"c{i + 100}@example.com",
+                                 total=Decimal(i + 1), created_at=datetime.datetime(2024, 3, 5),
+                                 shipping_city="York" if i % 2 else "Bath"))
+    session.commit()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+
+def test_hyperloglog_estimate_merge_and_roundtrip():
+    left = HyperLogLog().update(f"user{i}" for i in range(30000))
+    right = HyperLogLog().update(f"user{i}" for i in range(20000, 50000))
+    assert abs(left.count() - 30000) / 30000 < 4 * left.relative_error
+
+    # Merging is exactly the sketch of the union
+    union = HyperLogLog().update(f"user{i}" for i in range(50000))
+    merged = HyperLogLog.from_bytes(left.to_bytes()).merge(right)
+    assert (merged.registers == union.registers).all()
+    assert abs(merged.count() - 50000) / 50000 < 4 * merged.relative_error
+
+
+def test_distinct_customers_over_uploads_and_days(db):
+    assert build_upload_sketches(db, user_id=1, upload_id=1) == 4 + 3 + 4  # email HLLs, city top-Ks (the 'nan' day has none), order totals
+    assert build_upload_sketches(db, user_id=1, upload_id=2) == 1 + 1 + 1
+
+    windows = [
+        {},
+        {"upload_ids": [2]},
+        {"start_date": datetime.date(2024, 3, 2), "end_date": datetime.date(2024, 3, 3)},
+        {"start_date": datetime.date(2024, 3, 4)},
+    ]
+    for window in windows:
+        exact = distinct_customers(db, 1, exact=True, **window)
+        approximate = distinct_customers(db, 1, **window)
+        assert approximate["approximate"] and not exact["approximate"]
+        # Small counts are in HyperLogLog's linear-counting range, which is near exact
+        assert abs(approximate["distinct_customers"] - exact["distinct_customers"]) <= 3
+
+    assert distinct_customers(db, 1, exact=True)["distinct_customers"] == 300
+    assert distinct_customers(db, 1, exact=True, start_date=datetime.date(2024, 3, 4))["distinct_customers"] == 225
+
+
+def test_topk_merge_bounds_true_counts():
+    days = [
+        Counter({f"item{j}": (j * 7 + day) % 23 + 1 for j in range(40)})
+        for day in range(10)
+    ]
+    merged = TopK(capacity=15)
+    for counts in days:
+        merged.merge(TopK.from_bytes(TopK.from_counts(counts, capacity=15).to_bytes()))
+
+    truth = sum(days, Counter())
+    for item, count, error in merged.top(15):
+        assert count - error <= truth[item] <= count
+    assert all(truth[item] <= merged.floor for item in set(truth) - set(merged.counts))
+
+
+def test_top_cities_over_uploads_and_days(db):
+    build_upload_sketches(db, user_id=1, upload_id=1)
+    build_upload_sketches(db, user_id=1, upload_id=2)
+
+    result = top_k(db, 1, "cities", limit=2)
+    assert [(item["value"], item["count"], item["error"]) for item in result["items"]] == [
+        ("York", 150, 0), ("Bath", 100, 0)
+    ]
+    result = top_k(db, 1, "cities", limit=5, upload_ids=[1], end_date=datetime.date(2024, 3, 2))
+    assert {item["value"]: item["count"] for item in result["items"]} == {"Leeds": 50, "York": 50}
+
+
+def test_kll_merged_quantiles_within_rank_error():
+    values = np.random.default_rng(7).lognormal(4, 0.7, 100000)
+    merged = KLL()
+    for day in np.array_split(values, 120):
+        merged.merge(KLL.from_bytes(KLL().update(day).to_bytes()))
+
+    assert merged.n == len(values) and merged.size < 2000
+    assert (merged.min, merged.max) == (values.min(), values.max())
+    for fraction, estimate in zip((0.5, 0.9, 0.99), merged.quantiles((0.5, 0.9, 0.99))):
+        assert abs((values <= estimate).mean() - fraction) <= merged.rank_error
+    assert sum(count for _, _, count in merged.histogram(10)) == len(values)
+
+
+def test_order_value_quantiles_over_a_window(db):
+    build_upload_sketches(db, user_id=1, upload_id=1)
+    build_upload_sketches(db, user_id=1, upload_id=2)
+
+    # Upload 2's totals are 1..200, few enough to be kept exactly
+    result = quantile_summary(db, 1, upload_ids=[2], bins=4)
+    assert result["order_total"]["count"] == 200
+    assert result["order_total"]["quantiles"] == {"p50": 100.0, "p90": 180.0, "p99": 198.0}
+    assert [bin["count"] for bin in result["order_total"]["histogram"]] == [50, 50, 50, 50]
+    assert result["basket_size"]["count"] == 0 and result["basket_size"]["quantiles"]["p50"] is None
+
+    everything = quantile_summary(db, 1)
+    assert everything["order_total"]["count"] == 400
+    assert everything["order_total"]["min"] == 1.0
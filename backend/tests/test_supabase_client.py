@@ -0,0 +1,64 @@
+# backend/tests/test_supabase_client.py
+
+from unittest.mock import patch, MagicMock
+
+from core import supabase_client
+
+
+def _mock_response(status_code, payload):
+    response = MagicMock()
+    response.status_code = status_code
+    response.json.return_value = payload
+    response.text = str(payload)
+    return response
+
+
+def test_get_file_urls_batches_cache_misses():
+    """Only uncached paths are signed, and all of them in a single request."""
+    with patch('core.redis_client.redis_client') as mock_redis, \
+         patch('core.supabase_client.requests.post') as mock_post:
+        mock_redis.mget.return_value = [b"/object/sign/uploads/1/a.csv?token=cached", None, None]
+        mock_post.return_value = _mock_response(200, [
+            {"path": "1/b.csv", "signedURL": "/object/sign/uploads/1/b.csv?token=b", "error": None},
+            {"path": "1/c.csv", "signedURL": "/object/sign/uploads/1/c.csv?token=c", "error": None},
+        ])
+
+        urls = supabase_client.get_file_urls(["1/a.csv", "1/b.csv", "1/c.csv"], use_admin=True)
+
+        assert urls == {
+            "1/a.csv": "/object/sign/uploads/1/a.csv?token=cached",
+            "1/b.csv": "/object/sign/uploads/1/b.csv?token=b",
+            "1/c.csv": "/object/sign/uploads/1/c.csv?token=c",
+        }
+        assert mock_post.call_count == 1
+        assert mock_post.call_args.kwargs["json"]["paths"] == ["1/b.csv", "1/c.csv"]
+
+        # Fresh URLs are cached until shortly before they expire
+        pipe = mock_redis.pipeline.return_value
+        ttls = [call.args[1] for call in pipe.setex.call_args_list]
+        assert ttls == [3600 - supabase_client.SIGNED_URL_EXPIRY_MARGIN] * 2
+
+
+def test_get_file_urls_all_cached_skips_storage():
+    """A fully cached page never touches the storage API."""
+    with patch('core.redis_client.redis_client') as mock_redis, \
+         patch('core.supabase_client.requests.post') as mock_post:
+        mock_redis.mget.return_value = [b"url-a"]
+
+        urls = supabase_client.get_file_urls(["1/a.csv"])
+
+        assert urls == {"1/a.csv": "url-a"}
+        mock_post.assert_not_called()
+
+
+def test_get_file_urls_storage_failure_falls_back():
+    """Storage errors fall back to public URLs, which are never cached."""
+    with patch('core.redis_client.redis_client') as mock_redis, \
+         patch('core.supabase_client.requests.post') as mock_post:
+        mock_redis.mget.return_value = [None]
+        mock_post.side_effect = Exception("timeout")
+
+        urls = supabase_client.get_file_urls(["1/a.csv"])
+
+        assert urls["1/a.csv"].endswith(f"/storage/v1/object/public/{supabase_client.BUCKET_NAME}/1/a.csv")
+        mock_redis.pipeline.assert_not_called()
@@ -0,0 +1,57 @@
+# backend/tests/test_upload_deletion.py
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from db.database import Base
+from db import models
+from core.upload_deletion import delete_upload_data
+
+engine = create_engine(
+    "sqlite:///:memory:",
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = TestingSessionLocal()
+    session.add(models.User(id=1, username="owner", email="owner@example.com", hashed_password="x"))
+    for upload_id in (1, 2):
+        session.add(models.Upload(id=upload_id, user_id=1, file_name="orders.csv",
+                                  file_path="supabase://uploads/1/orders.csv", file_size=1))
+    session.flush()
+    # Upload 1: 7 orders x 2 line items; upload 2: 3 orders x 2 line items
+    for i in range(10):
+        order = models.Order(id=i + 1, user_id=1, upload_id=1 if i < 7 else 2,
+                             name=f"#{1000 + i}", email="customer@example.com")
+        session.add(order)
+        session.flush()
+        for _ in range(2):
+            session.add(models.LineItem(order_id=order.id, lineitem_name="Widget", lineitem_quantity=1))
+    session.commit()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+
+def test_delete_upload_data_removes_rows_in_batches(db):
+    progress = []
+
+    stats = delete_upload_data(db, upload_id=1, batch_size=3, progress=progress.append)
+
+    assert stats == {"line_items_deleted": 14, "orders_deleted": 7}
+    # Every batch reports cumulative progress
+    assert [p["line_items_deleted"] for p in progress[:5]] == [3, 6, 9, 12, 14]
+    assert progress[-1] == stats
+
+    # No orphaned line items remain, and the other upload is untouched
+    assert db.query(models.Order).filter(models.Order.upload_id == 1).count() == 0
+    order_ids = {o.id for o in db.query(models.Order).all()}
+    assert all(li.order_id in order_ids for li in db.query(models.LineItem).all())
+    assert db.query(models.LineItem).count() == 6
@@ -16,8 +16,20 @@ const fallbackUploads = [
 
 const fetchHistoricalUploads = (queryClient) => async () => {
   try {
-    const response = await api.get("/uploads/history");
-    return Array.isArray(response.data) ? response.data : response.data.uploads;
+    // The history endpoint is keyset-paginated; follow next_cursor until exhausted
+    const uploads = [];
+    let beforeId = null;
+    do {
+      const response = await api.get("/uploads/history", {
+        params: beforeId ? { before_id: beforeId } : {},
+      });
+      if (Array.isArray(response.data)) {
+        return response.data;
+      }
+      uploads.push(...response.data.uploads);
+      beforeId = response.data.next_cursor;
+    } while (beforeId);
+    return uploads;
   } catch (error) {
     console.error("Error fetching historical uploads:", error);
     
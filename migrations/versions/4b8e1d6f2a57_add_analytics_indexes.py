@@ -0,0 +1,38 @@
+"""add analytics indexes
+
+Revision ID: 4b8e1d6f2a57
+Revises: 7f3c2a9d4e18
+Create Date: 2026-10-19 16:40:52.118306
+
+Indexes for the analytics query mix: a covering (user_id, upload_id) index
+on orders, line_items(order_id) for the product joins, and a BRIN index on
+orders.created_at for date ranges spanning uploads. On the partitioned
+tables each index is created on every partition.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b8e1d6f2a57'
+down_revision: Union[str, None] = '7f3c2a9d4e18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'idx_orders_user_upload', 'orders', ['user_id', 'upload_id'], unique=False,
+        postgresql_include=['id', 'created_at', 'total', 'discount_amount', 'email', 'shipping_city', 'discount_code'],
+    )
+    op.create_index('idx_orders_created_at_brin', 'orders', ['created_at'], unique=False, postgresql_using='brin')
+    op.create_index('idx_line_items_order_id', 'line_items', ['order_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_line_items_order_id', table_name='line_items')
+    op.drop_index('idx_orders_created_at_brin', table_name='orders')
+    op.drop_index('idx_orders_user_upload', table_name='orders')
@@ -0,0 +1,27 @@
+"""add uploads user_id id index for history pagination
+
+Revision ID: 6d2f8a41c9b3
+Revises: 0880a600c33b
+Create Date: 2026-10-19 09:12:41.508213
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6d2f8a41c9b3'
+down_revision: Union[str, None] = '0880a600c33b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Supports keyset pagination of GET /uploads/history (user_id = ? AND id < ? ORDER BY id DESC)
+    op.create_index('idx_uploads_user_id_id', 'uploads', ['user_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_uploads_user_id_id', table_name='uploads')